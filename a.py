@@ -1,67 +1,66 @@
 import datetime
-import random
-import os
-import ast
+import sys
+from core import Bank, AuthenticationError, InsufficientFundsError, MIN_OPENING_DEPOSIT
+from interest import rate_for
+from money import parse_amount, format_money
+from scheduler import Scheduler, PERIODS
 
 class BankingSystem:
-    def __init__(self, data_file="bank_data.txt"):
+    # Interactive console client. All banking logic lives in core.Bank; this
+    # class only prompts, calls the core and prints the outcome.
+    def __init__(self, data_file="bank_data.txt", snapshot_every=10000, lazy_history=True):
         self.data_file = data_file
-        self.accounts = {}
-        self.transactions = []
+        # Transaction history loads in the background, so the menu is up as
+        # soon as accounts and balances are; a history view opened before it
+        # finishes waits for it.
+        self.bank = Bank(data_file, snapshot_every=snapshot_every, load=False, lazy_history=lazy_history)
         self.logged_in_account = None
         self.load_data()
+        self.scheduler = Scheduler(self.bank)
+        self.run_scheduled_payments()
+    
+    @property
+    def accounts(self):
+        return self.bank.accounts
+    
+    @property
+    def transactions(self):
+        return self.bank.transactions
     
     def load_data(self):
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    content = f.read().strip()
-                    if content:
-                        data = ast.literal_eval(content)
-                        self.accounts = data.get('accounts', {})
-                        self.transactions = data.get('transactions', [])
-                        
-                        for account in self.accounts.values():
-                            if 'created_date' in account and isinstance(account['created_date'], str):
-                                account['created_date'] = datetime.datetime.fromisoformat(account['created_date'])
-                        
-                        for transaction in self.transactions:
-                            if 'timestamp' in transaction and isinstance(transaction['timestamp'], str):
-                                transaction['timestamp'] = datetime.datetime.fromisoformat(transaction['timestamp'])
-                
+            status = self.bank.load_data()
+            if status['migrated_to']:
+                print(f"Converted data file to format v{status['migrated_to']} (original kept as {self.data_file}.legacy).")
+                print(f"⚠️ {self.data_file}.legacy still holds plaintext passwords; run 'python a.py migrate-passwords' to hash them.")
+            if status['snapshot']:
                 print("Previous data loaded successfully!")
             else:
                 print("No existing data found. Starting fresh.")
+            if status['replayed']:
+                print(f"Recovered {status['replayed']} operations from the journal.")
+            if status['history_pending']:
+                print(f"Accounts ready in {self.bank.load_timings['ready_seconds']:.2f}s; "
+                      "transaction history is still loading in the background.")
         except Exception as e:
             print(f"Error loading data: {e}")
             print("Starting with fresh data.")
-            self.accounts = {}
-            self.transactions = []
+            self.bank.reset()
+    
+    def run_scheduled_payments(self):
+        # Standing orders fall due at any time; the console pays whatever is
+        # due each time it shows a menu.
+        try:
+            result = self.scheduler.run_due()
+            if result['paid'] or result['failed']:
+                print(f"Made {result['paid']} scheduled payments"
+                      + (f", {result['failed']} refused." if result['failed'] else "."))
+        except Exception as e:
+            print(f"Error making scheduled payments: {e}")
     
     def save_data(self):
         try:
-            data_to_save = {
-                'accounts': {},
-                'transactions': []
-            }
-            
-            for acc_num, account in self.accounts.items():
-                data_to_save['accounts'][acc_num] = account.copy()
-                if 'created_date' in data_to_save['accounts'][acc_num]:
-                    data_to_save['accounts'][acc_num]['created_date'] = data_to_save['accounts'][acc_num]['created_date'].isoformat()
-            
-            for transaction in self.transactions:
-                transaction_copy = transaction.copy()
-                if 'timestamp' in transaction_copy:
-                    transaction_copy['timestamp'] = transaction_copy['timestamp'].isoformat()
-                data_to_save['transactions'].append(transaction_copy)
-            
-            with open(self.data_file, 'w') as f:
-                f.write("{\n")
-                f.write(f"  'accounts': {data_to_save['accounts']},\n")
-                f.write(f"  'transactions': {data_to_save['transactions']}\n")
-                f.write("}\n")
-            
+            self.bank.save_data()
             print("Data saved successfully!")
         except Exception as e:
             print(f"Error saving data: {e}")
@@ -69,6 +68,7 @@ class BankingSystem:
     def main_menu(self):
         try:
             while True:
+                self.run_scheduled_payments()
                 print("\n=== Welcome to Python Bank ===")
                 print("1. Create New Account")
                 print("2. Login to Existing Account")
@@ -100,12 +100,6 @@ class BankingSystem:
             self.save_data()
             print("Goodbye!")
     
-    def generate_account_number(self):
-        while True:
-            account_number = str(random.randint(100000, 999999))
-            if account_number not in self.accounts:
-                return account_number
-    
     def create_account(self):
         try:
             print("\n=== Let's Create Your Account ===")
@@ -118,7 +112,7 @@ class BankingSystem:
                 print("Name is required to create an account!")
                 return
             
-            account_number = self.generate_account_number()
+            account_number = self.bank.generate_account_number()
             print(f"Your new account number is: {account_number}")
             
             while True:
@@ -126,11 +120,11 @@ class BankingSystem:
                 if initial_deposit.lower() == 'exit':
                     return
                 try:
-                    initial_deposit = float(initial_deposit)
+                    initial_deposit = parse_amount(initial_deposit)
                     if initial_deposit < 0:
                         print("Deposit amount cannot be negative!")
                         continue
-                    elif initial_deposit < 500:
+                    elif initial_deposit < MIN_OPENING_DEPOSIT:
                         print("Minimum deposit should be $500!")
                         continue
                     break
@@ -158,27 +152,12 @@ class BankingSystem:
                     continue
                 break
             
-            self.accounts[account_number] = {
-                'name': name,
-                'balance': initial_deposit,
-                'account_type': account_type,
-                'password': password,
-                'created_date': datetime.datetime.now()
-            }
-            
-            self.transactions.append({
-                'type': 'account_creation',
-                'account_number': account_number,
-                'amount': initial_deposit,
-                'balance_after': initial_deposit,
-                'timestamp': datetime.datetime.now(),
-                'description': f'Account opened with initial deposit of ${initial_deposit:.2f}'
-            })
+            self.bank.open_account(name, initial_deposit, account_type, password, account_number=account_number)
             
             print(f"\n🎉 Congratulations {name}!")
             print(f"Your account has been created successfully!")
             print(f"Account Number: {account_number}")
-            print(f"Current Balance: ${initial_deposit:.2f}")
+            print(f"Current Balance: ${format_money(initial_deposit)}")
             
         except KeyboardInterrupt:
             print("\nAccount creation cancelled.")
@@ -195,20 +174,25 @@ class BankingSystem:
             if account_number.lower() == 'exit':
                 return
             
-            if account_number not in self.accounts:
-                print("Account not found. Please check your account number.")
+            if not self.bank.account_exists(account_number):
+                if self.bank.allocator.is_mistyped(account_number):
+                    print("That is not a valid account number. Please check it for a typo.")
+                else:
+                    print("Account not found. Please check your account number.")
                 return
             
             password = input("Enter your password: ").strip()
             if password.lower() == 'exit':
                 return
             
-            if self.accounts[account_number]['password'] != password:
+            try:
+                account = self.bank.authenticate(account_number, password)
+            except AuthenticationError:
                 print("Incorrect password. Please try again.")
                 return
             
             self.logged_in_account = account_number
-            print(f"\nWelcome back, {self.accounts[account_number]['name']}!")
+            print(f"\nWelcome back, {account['name']}!")
             self.account_menu()
             
         except KeyboardInterrupt:
@@ -220,11 +204,12 @@ class BankingSystem:
     def account_menu(self):
         while True:
             try:
-                account_data = self.accounts[self.logged_in_account]
+                self.run_scheduled_payments()
+                account_data = self.bank.get_account(self.logged_in_account)
                 print(f"\n=== {account_data['name']}'s Account ===")
                 print(f"Account #: {self.logged_in_account}")
                 print(f"Account Type: {account_data['account_type'].title()}")
-                print(f"Current Balance: ${account_data['balance']:.2f}")
+                print(f"Current Balance: ${format_money(account_data['balance'])}")
                 print("\nWhat would you like to do today?")
                 print("1. Deposit Money")
                 print("2. Withdraw Money")
@@ -232,11 +217,12 @@ class BankingSystem:
                 print("4. View Transaction History")
                 print("5. Calculate Interest")
                 print("6. Update Account Information")
-                print("7. Logout")
+                print("7. Standing Orders")
+                print("8. Logout")
                 
                 choice = input("Please select an option: ").strip()
                 
-                if choice.lower() == 'exit' or choice == '7':
+                if choice.lower() == 'exit' or choice == '8':
                     self.logged_in_account = None
                     print("You have been logged out. See you soon!")
                     break
@@ -252,6 +238,8 @@ class BankingSystem:
                     self.calculate_interest()
                 elif choice == '6':
                     self.modify_account()
+                elif choice == '7':
+                    self.standing_orders()
                 else:
                     print("Invalid option. Please try again.")
                     
@@ -274,7 +262,7 @@ class BankingSystem:
                     return
                 
                 try:
-                    amount = float(amount_str)
+                    amount = parse_amount(amount_str)
                     if amount <= 0:
                         print("Please enter a positive amount!")
                         continue
@@ -285,21 +273,11 @@ class BankingSystem:
                     print(f"Error processing deposit amount: {e}")
                     print("Please try again.")
             
-            old_balance = self.accounts[self.logged_in_account]['balance']
-            self.accounts[self.logged_in_account]['balance'] += amount
-            
-            self.transactions.append({
-                'type': 'deposit',
-                'account_number': self.logged_in_account,
-                'amount': amount,
-                'balance_after': self.accounts[self.logged_in_account]['balance'],
-                'timestamp': datetime.datetime.now(),
-                'description': f'Deposited ${amount:.2f}'
-            })
+            result = self.bank.deposit(self.logged_in_account, amount)
             
             print(f"✅ Deposit successful!")
-            print(f"Previous Balance: ${old_balance:.2f}")
-            print(f"New Balance: ${self.accounts[self.logged_in_account]['balance']:.2f}")
+            print(f"Previous Balance: ${format_money(result['previous_balance'])}")
+            print(f"New Balance: ${format_money(result['balance'])}")
             
         except KeyboardInterrupt:
             print("\nDeposit cancelled.")
@@ -318,7 +296,7 @@ class BankingSystem:
                     return
                 
                 try:
-                    amount = float(amount_str)
+                    amount = parse_amount(amount_str)
                     if amount <= 0:
                         print("Please enter a positive amount!")
                         continue
@@ -329,27 +307,16 @@ class BankingSystem:
                     print(f"Error processing withdrawal amount: {e}")
                     print("Please try again.")
             
-            account_data = self.accounts[self.logged_in_account]
-            if account_data['balance'] < amount:
+            try:
+                result = self.bank.withdraw(self.logged_in_account, amount)
+            except InsufficientFundsError as e:
                 print("❌ Sorry, you don't have enough funds for this transaction.")
-                print(f"Your current balance is ${account_data['balance']:.2f}")
+                print(f"Your current balance is ${format_money(e.balance)}")
                 return
             
-            old_balance = account_data['balance']
-            self.accounts[self.logged_in_account]['balance'] -= amount
-            
-            self.transactions.append({
-                'type': 'withdrawal',
-                'account_number': self.logged_in_account,
-                'amount': amount,
-                'balance_after': self.accounts[self.logged_in_account]['balance'],
-                'timestamp': datetime.datetime.now(),
-                'description': f'Withdrew ${amount:.2f}'
-            })
-            
             print(f"✅ Withdrawal successful!")
-            print(f"Previous Balance: ${old_balance:.2f}")
-            print(f"New Balance: ${self.accounts[self.logged_in_account]['balance']:.2f}")
+            print(f"Previous Balance: ${format_money(result['previous_balance'])}")
+            print(f"New Balance: ${format_money(result['balance'])}")
             
         except KeyboardInterrupt:
             print("\nWithdrawal cancelled.")
@@ -366,8 +333,11 @@ class BankingSystem:
             if target_account.lower() == 'exit':
                 return
             
-            if target_account not in self.accounts:
-                print("Recipient account not found. Please check the account number.")
+            if not self.bank.account_exists(target_account):
+                if self.bank.allocator.is_mistyped(target_account):
+                    print("That is not a valid account number. Please check it for a typo.")
+                else:
+                    print("Recipient account not found. Please check the account number.")
                 return
             
             if target_account == self.logged_in_account:
@@ -380,7 +350,7 @@ class BankingSystem:
                     return
                 
                 try:
-                    amount = float(amount_str)
+                    amount = parse_amount(amount_str)
                     if amount <= 0:
                         print("Please enter a positive amount!")
                         continue
@@ -391,38 +361,16 @@ class BankingSystem:
                     print(f"Error processing transfer amount: {e}")
                     print("Please try again.")
             
-            sender_data = self.accounts[self.logged_in_account]
-            if sender_data['balance'] < amount:
+            try:
+                result = self.bank.transfer(self.logged_in_account, target_account, amount)
+            except InsufficientFundsError as e:
                 print("❌ Sorry, you don't have enough funds for this transfer.")
-                print(f"Your current balance is ${sender_data['balance']:.2f}")
+                print(f"Your current balance is ${format_money(e.balance)}")
                 return
             
-            self.accounts[self.logged_in_account]['balance'] -= amount
-            self.accounts[target_account]['balance'] += amount
-            
-            self.transactions.append({
-                'type': 'transfer_out',
-                'account_number': self.logged_in_account,
-                'target_account': target_account,
-                'amount': amount,
-                'balance_after': self.accounts[self.logged_in_account]['balance'],
-                'timestamp': datetime.datetime.now(),
-                'description': f'Transferred ${amount:.2f} to account {target_account}'
-            })
-            
-            self.transactions.append({
-                'type': 'transfer_in',
-                'account_number': target_account,
-                'source_account': self.logged_in_account,
-                'amount': amount,
-                'balance_after': self.accounts[target_account]['balance'],
-                'timestamp': datetime.datetime.now(),
-                'description': f'Received ${amount:.2f} from account {self.logged_in_account}'
-            })
-            
             print(f"✅ Transfer successful!")
-            print(f"Your new balance: ${self.accounts[self.logged_in_account]['balance']:.2f}")
-            print(f"Recipient's new balance: ${self.accounts[target_account]['balance']:.2f}")
+            print(f"Your new balance: ${format_money(result['balance'])}")
+            print(f"Recipient's new balance: ${format_money(result['target_balance'])}")
             
         except KeyboardInterrupt:
             print("\nTransfer cancelled.")
@@ -433,24 +381,28 @@ class BankingSystem:
     def view_transaction_history(self):
         try:
             print("\n=== Transaction History ===")
-            account_transactions = [
-                t for t in self.transactions 
-                if t['account_number'] == self.logged_in_account
-            ]
+            if not self.bank.history_loaded:
+                print("Loading transaction history, one moment...")
+            total = self.bank.transaction_count(self.logged_in_account)
             
-            if not account_transactions:
+            if not total:
                 print("No transactions found for your account.")
                 return
             
-            print(f"Showing {len(account_transactions)} transactions:")
+            print(f"Showing {total} transactions:")
             print("-" * 50)
             
-            for transaction in reversed(account_transactions):
+            page_size = 20
+            for shown, transaction in enumerate(self.bank.iter_account_transactions(self.logged_in_account)):
+                if shown and shown % page_size == 0:
+                    more = input(f"Shown {shown} of {total}. Press Enter for more or type 'exit': ").strip()
+                    if more.lower() == 'exit':
+                        return
                 try:
                     timestamp = transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
                     print(f"📅 {timestamp}")
                     print(f"   {transaction['description']}")
-                    print(f"   Balance: ${transaction['balance_after']:.2f}")
+                    print(f"   Balance: ${format_money(transaction['balance_after'])}")
                     if 'target_account' in transaction:
                         print(f"   To: {transaction['target_account']}")
                     if 'source_account' in transaction:
@@ -469,23 +421,23 @@ class BankingSystem:
     def calculate_interest(self):
         try:
             print("\n=== Interest Calculator ===")
-            account_data = self.accounts[self.logged_in_account]
+            account_data = self.bank.get_account(self.logged_in_account)
             
             if account_data['account_type'] != 'savings':
                 print("Interest calculation is only available for savings accounts.")
                 print("Consider upgrading to a savings account for better benefits!")
                 return
             
-            annual_rate = 0.03
+            annual_rate = rate_for(account_data['balance'])
             monthly_rate = annual_rate / 12
             
-            interest = account_data['balance'] * monthly_rate
+            interest = round(account_data['balance'] * monthly_rate)
             
             print(f"Account Type: {account_data['account_type'].title()}")
-            print(f"Current Balance: ${account_data['balance']:.2f}")
+            print(f"Current Balance: ${format_money(account_data['balance'])}")
             print(f"Monthly Interest Rate: {annual_rate*100/12:.2f}%")
-            print(f"Estimated Monthly Interest: ${interest:.2f}")
-            print(f"Balance after one month: ${account_data['balance'] + interest:.2f}")
+            print(f"Estimated Monthly Interest: ${format_money(interest)}")
+            print(f"Balance after one month: ${format_money(account_data['balance'] + interest)}")
             
         except KeyboardInterrupt:
             print("\nInterest calculation cancelled.")
@@ -499,14 +451,14 @@ class BankingSystem:
             print("Type 'exit' to go back to account menu.")
             print("Note: Account number cannot be changed for security reasons.")
             
-            account_data = self.accounts[self.logged_in_account]
+            account_data = self.bank.get_account(self.logged_in_account)
             
             print(f"Current name: {account_data['name']}")
             new_name = input("Enter new name (press Enter to keep current): ").strip()
             if new_name.lower() == 'exit':
                 return
             if new_name:
-                account_data['name'] = new_name
+                self.bank.update_account(self.logged_in_account, name=new_name)
                 print("Name updated successfully!")
             
             print(f"Current account type: {account_data['account_type']}")
@@ -518,7 +470,7 @@ class BankingSystem:
                     print("Please choose either 'savings' or 'current'")
                     continue
                 if new_type:
-                    account_data['account_type'] = new_type
+                    self.bank.update_account(self.logged_in_account, account_type=new_type)
                     print("Account type updated successfully!")
                 break
             
@@ -530,7 +482,7 @@ class BankingSystem:
                     print("Password must be at least 6 characters long!")
                     continue
                 if new_password:
-                    account_data['password'] = new_password
+                    self.bank.update_account(self.logged_in_account, password=new_password)
                     print("Password updated successfully!")
                 break
             
@@ -543,7 +495,151 @@ class BankingSystem:
             print(f"An error occurred while updating account information: {e}")
             print("Please try again.")
 
+    def standing_orders(self):
+        try:
+            print("\n=== Standing Orders ===")
+            schedules = self.scheduler.schedules_for(self.logged_in_account)
+            if not schedules:
+                print("You have no standing orders.")
+            for schedule in schedules:
+                runs = "until cancelled" if schedule['count'] is None else \
+                    f"{schedule['count'] - schedule['runs']} payments left"
+                print(f"#{schedule['schedule_id']}: ${format_money(schedule['amount'])} to "
+                      f"{schedule['target_account']}, {schedule['period']}, next on "
+                      f"{datetime.datetime.fromtimestamp(schedule['next_run']):%Y-%m-%d %H:%M} ({runs})")
+                if schedule['last_error']:
+                    print(f"    Last payment failed: {schedule['last_error']}")
+            
+            print("\n1. Set Up a Standing Order")
+            print("2. Cancel a Standing Order")
+            print("3. Back")
+            choice = input("Please select an option: ").strip()
+            if choice == '1':
+                self.add_standing_order()
+            elif choice == '2':
+                schedule_id = input("Enter the number of the standing order to cancel: ").strip().lstrip('#')
+                if not schedule_id.isdigit():
+                    print("Please enter a standing order number.")
+                    return
+                self.scheduler.cancel(int(schedule_id), self.logged_in_account)
+                print(f"✅ Standing order #{schedule_id} cancelled.")
+        except KeyboardInterrupt:
+            print("\nReturning to account menu...")
+        except Exception as e:
+            print(f"An error occurred with standing orders: {e}")
+            print("Please try again.")
+    
+    def add_standing_order(self):
+        print("Type 'exit' to go back to account menu.")
+        target_account = input("Enter recipient's account number: ").strip()
+        if target_account.lower() == 'exit':
+            return
+        if not self.bank.account_exists(target_account):
+            if self.bank.allocator.is_mistyped(target_account):
+                print("That is not a valid account number. Please check it for a typo.")
+            else:
+                print("Recipient account not found. Please check the account number.")
+            return
+        if target_account == self.logged_in_account:
+            print("You cannot transfer money to your own account!")
+            return
+        
+        while True:
+            amount_str = input("How much should each payment be? $").strip()
+            if amount_str.lower() == 'exit':
+                return
+            try:
+                amount = parse_amount(amount_str)
+                if amount <= 0:
+                    print("Please enter a positive amount!")
+                    continue
+                break
+            except ValueError:
+                print("Please enter a valid amount!")
+        
+        while True:
+            start_str = input("First payment date (YYYY-MM-DD, optionally HH:MM; Enter for now): ").strip()
+            if start_str.lower() == 'exit':
+                return
+            try:
+                start = datetime.datetime.fromisoformat(start_str) if start_str else datetime.datetime.now()
+                break
+            except ValueError:
+                print("Please enter a date like 2026-11-01 or 2026-11-01 09:00")
+        
+        while True:
+            period = input(f"How often? ({'/'.join(PERIODS)}): ").strip().lower()
+            if period == 'exit':
+                return
+            if period in PERIODS:
+                break
+            print(f"Please choose one of: {', '.join(PERIODS)}")
+        
+        count = None
+        if period != 'once':
+            while True:
+                count_str = input("How many payments? (Enter for no end): ").strip()
+                if count_str.lower() == 'exit':
+                    return
+                if not count_str:
+                    break
+                if count_str.isdigit() and int(count_str) > 0:
+                    count = int(count_str)
+                    break
+                print("Please enter a positive whole number!")
+        
+        schedule = self.scheduler.add(self.logged_in_account, target_account, amount, start, period, count)
+        print(f"✅ Standing order #{schedule['schedule_id']} set up!")
+
+def run_schedules(data_file="bank_data.txt"):
+    # For cron, when the console isn't running.
+    bank = Bank(data_file)
+    scheduler = Scheduler(bank)
+    result = scheduler.run_due()
+    scheduler.close()
+    bank.save_data()
+    print(f"Made {result['paid']} scheduled payments, {result['failed']} refused.")
+    return 0
+
+def run_reconcile(data_file="bank_data.txt"):
+    bank = Bank(data_file)
+    discrepancies = bank.reconcile()
+    store = bank.transactions
+    transaction_count = len(store) + sum(len(segment) for segment in store.segments)
+    print(f"Checked {len(bank.accounts)} accounts and {transaction_count} transactions.")
+    for item in discrepancies:
+        if item['position'] is None:
+            where = "current balance"
+        elif 'archive' in item:
+            where = f"archived transaction {item['archive']}#{item['position']}"
+        else:
+            where = f"transaction #{item['position']}"
+        print(f"Account {item['account_number']}, {where}: "
+              f"expected ${format_money(item['expected'])}, recorded ${format_money(item['recorded'])}")
+    if discrepancies:
+        print(f"❌ {len(discrepancies)} discrepancies found.")
+        return 1
+    print("✅ All balances match the replayed transaction history.")
+    return 0
+
+def run_migrate_passwords(data_file="bank_data.txt"):
+    bank = Bank(data_file)
+    print("Hashing stored passwords...")
+    migrated = bank.migrate_passwords()
+    bank.save_data()
+    print(f"✅ {migrated} plaintext passwords replaced by salted hashes.")
+    scrubbed = bank.scrub_legacy_copy()
+    if scrubbed:
+        print(f"✅ {scrubbed} plaintext passwords hashed in {data_file}.legacy as well.")
+    return 0
+
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['reconcile']:
+        sys.exit(run_reconcile(*sys.argv[2:3]))
+    if sys.argv[1:2] == ['run-schedules']:
+        sys.exit(run_schedules(*sys.argv[2:3]))
+    if sys.argv[1:2] == ['migrate-passwords']:
+        sys.exit(run_migrate_passwords(*sys.argv[2:3]))
     try:
         bank = BankingSystem()
         bank.main_menu()
@@ -0,0 +1,125 @@
+# Account-number allocation. Numbers are issued in the order of a full-period
+# linear congruential sequence over the body space of `digits`-digit numbers
+# (no leading zero, as the transaction store keeps numbers as integers). The
+# sequence visits every body exactly once before repeating, so each
+# allocation costs one step however full the space is, and numbers don't
+# come out sequentially. A Luhn check digit is appended by default. That
+# catches every single-digit typo and most swaps of adjacent digits, and
+# makes new numbers one digit longer than the legacy six-digit ones, so the
+# two never collide.
+#
+# The state is a handful of integers. The bank stores it in snapshot
+# metadata and in journal records, so a restart continues the sequence
+# without rescanning existing accounts.
+import math
+import random
+import threading
+
+
+class ExhaustedError(Exception):
+    pass
+
+
+def luhn_digit(body):
+    total = 0
+    for i, character in enumerate(reversed(body)):
+        digit = int(character)
+        if i % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str(-total % 10)
+
+
+def full_period_step(modulus):
+    # Hull-Dobell: x -> (a*x + c) % m visits every residue when c is coprime
+    # to m and a - 1 is divisible by every prime factor of m, and by 4 if m is.
+    step, remaining, factor = 1, modulus, 2
+    while factor * factor <= remaining:
+        if remaining % factor == 0:
+            step *= factor
+            while remaining % factor == 0:
+                remaining //= factor
+        factor += 1
+    if remaining > 1:
+        step *= remaining
+    if modulus % 4 == 0:
+        step = math.lcm(step, 4)
+    return step
+
+
+def luhn_valid(number):
+    return len(number) > 1 and number.isascii() and number.isdigit() and luhn_digit(number[:-1]) == number[-1]
+
+
+class AccountNumberAllocator:
+    def __init__(self, digits=6, check_digit=True, seed=None):
+        self.digits = digits
+        self.check_digit = check_digit
+        self.first = 10 ** (digits - 1)
+        self.space = 10 ** digits - self.first
+        rng = random.Random(seed)
+        step = full_period_step(self.space)
+        self.multiplier = 1 + step * rng.randrange(1, max(2, self.space // step))
+        self.increment = rng.randrange(1, self.space)
+        while math.gcd(self.increment, self.space) != 1:
+            self.increment = rng.randrange(1, self.space)
+        self.state = rng.randrange(self.space)
+        self.issued = 0
+        self._lock = threading.Lock()
+
+    def format(self, body):
+        number = str(self.first + body)
+        return number + luhn_digit(number) if self.check_digit else number
+
+    def is_valid(self, number):
+        if len(number) != self.digits + (1 if self.check_digit else 0) or not number.isascii() \
+                or not number.isdigit() or number[0] == '0':
+            return False
+        return not self.check_digit or luhn_valid(number)
+
+    def is_mistyped(self, number):
+        # Has the shape of this allocator's numbers but a wrong check digit,
+        # so almost certainly a typo. Other unknown numbers, such as legacy
+        # ones without a check digit, are just not found.
+        return self.check_digit and len(number) == self.digits + 1 and number.isascii() and number.isdigit() \
+            and not luhn_valid(number)
+
+    def allocate(self, count=1, taken=()):
+        # Returns the next `count` numbers, skipping any already in `taken`
+        # (accounts opened under explicit numbers).
+        numbers = []
+        with self._lock:
+            while len(numbers) < count:
+                if self.issued >= self.space:
+                    raise ExhaustedError(f"all {self.space} account numbers are in use")
+                self.state = (self.multiplier * self.state + self.increment) % self.space
+                self.issued += 1
+                number = self.format(self.state)
+                if number not in taken:
+                    numbers.append(number)
+        return numbers
+
+    def next(self, taken=()):
+        return self.allocate(1, taken)[0]
+
+    def to_dict(self):
+        with self._lock:
+            return {'digits': self.digits, 'check_digit': self.check_digit, 'multiplier': self.multiplier,
+                    'increment': self.increment, 'state': self.state, 'issued': self.issued}
+
+    def restore(self, saved):
+        # Saved state from a differently configured id space is ignored; the
+        # new space starts a fresh sequence and skips numbers already taken.
+        if saved.get('digits') != self.digits or saved.get('check_digit') != self.check_digit:
+            return
+        with self._lock:
+            # Records can be replayed after a later one was applied (a
+            # snapshot, then older journal entries); never step backwards.
+            if saved['issued'] < self.issued and saved['multiplier'] == self.multiplier:
+                return
+            self.multiplier = saved['multiplier']
+            self.increment = saved['increment']
+            self.state = saved['state']
+            self.issued = saved['issued']
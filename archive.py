@@ -0,0 +1,110 @@
+# Cold history tier. Transactions past a configurable age are moved out of
+# the in-memory store into immutable segment files under
+# <data_file>.archive/, which are memory-mapped and read in place.
+#
+# A segment holds the same columns as TransactionStore, one after another,
+# with rows grouped by account (each account's rows oldest first). A
+# per-account index closes the file: the sorted account numbers and the
+# first row of each. One account's history in a segment is therefore a
+# contiguous row range, found by a bisect over the mapped index. Columns
+# are exposed as memoryviews cast to their type, so reading a record
+# touches only the pages it lives on. Integers are in native byte order.
+#
+# Segments written before transactions had ids (PBSEG001) lack the ids
+# column; their rows read back with no id.
+import bisect
+import mmap
+import os
+import struct
+from array import array
+
+from txstore import NO_ID, TransactionRecord
+
+SEGMENT_MAGIC = b'PBSEG002'
+HEADER = struct.Struct('=8sqqqq')   # magic, rows, accounts, first and last timestamp
+INT_COLUMNS = ('accounts', 'counterparties', 'amounts', 'balances', 'timestamps', 'ids')
+# Column layouts by magic, for reading older segments.
+LAYOUTS = {b'PBSEG001': INT_COLUMNS[:-1], SEGMENT_MAGIC: INT_COLUMNS}
+
+
+def padding(size):
+    return -size % 8
+
+
+class NoIds:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        return NO_ID
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rows, entries, self.first_timestamp, self.last_timestamp = HEADER.unpack_from(self._map)
+        if magic not in LAYOUTS:
+            raise ValueError(f"{path} is not a history segment")
+        self.rows = rows
+        self.ids = NoIds(rows)
+        view = memoryview(self._map)
+        offset = HEADER.size
+        for name in LAYOUTS[magic]:
+            setattr(self, name, view[offset:offset + 8 * rows].cast('q'))
+            offset += 8 * rows
+        self.types = view[offset:offset + rows]
+        offset += rows + padding(rows)
+        self.index_accounts = view[offset:offset + 8 * entries].cast('q')
+        offset += 8 * entries
+        # One extra entry (the row count) closes the last account's range.
+        self.index_starts = view[offset:offset + 8 * (entries + 1)].cast('q')
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        return TransactionRecord(self, row)
+
+    def account_rows(self, account_number):
+        code = int(account_number)
+        i = bisect.bisect_left(self.index_accounts, code)
+        if i < len(self.index_accounts) and self.index_accounts[i] == code:
+            return range(self.index_starts[i], self.index_starts[i + 1])
+        return range(0)
+
+
+def write_segment(path, store, stop):
+    # Writes rows [0, stop) of `store` as a segment, atomically.
+    order = sorted(range(stop), key=store.accounts.__getitem__)
+    accounts = array('q')
+    starts = array('q')
+    previous = None
+    for row, position in enumerate(order):
+        account = store.accounts[position]
+        if account != previous:
+            accounts.append(account)
+            starts.append(row)
+            previous = account
+    starts.append(stop)
+    timestamps = store.timestamps[:stop]
+
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(SEGMENT_MAGIC, stop, len(accounts), min(timestamps, default=0),
+                            max(timestamps, default=0)))
+        for name in INT_COLUMNS:
+            column = getattr(store, name)
+            f.write(array('q', map(column.__getitem__, order)).tobytes())
+        f.write(bytes(map(store.types.__getitem__, order)))
+        f.write(b'\0' * padding(stop))
+        f.write(accounts.tobytes())
+        f.write(starts.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
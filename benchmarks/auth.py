@@ -0,0 +1,98 @@
+# Login throughput under concurrency: N threads log in to random accounts,
+# once with passwords (a KDF run per login) and once with the tokens those
+# logins returned. Also times migrating a bank of plaintext passwords.
+#
+#   python -m benchmarks.auth [--accounts 50] [--logins 400] [--threads 1,2,4,8]
+#
+# The KDF releases the GIL, so password logins scale with the CPU cores
+# available; token logins are a dictionary lookup.
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import passwords
+from core import Bank
+
+PASSWORD = 'secret1'
+
+
+def build_bank(directory, account_count):
+    bank = Bank(os.path.join(directory, "bank_data.txt"))
+    with bank.journal.batch():
+        accounts = [bank.open_account(f"Customer {i}", 100000, 'current', PASSWORD)
+                    for i in range(account_count)]
+    return bank, accounts
+
+
+def measure(threads, login_count, login, credentials, seed):
+    per_thread = login_count // threads
+    start_gate = threading.Barrier(threads)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        start_gate.wait()
+        for _ in range(per_thread):
+            login(rng.choice(credentials))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(worker, i) for i in range(threads)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    return round(per_thread * threads / elapsed, 1)
+
+
+def time_migration(directory, account_count):
+    # A bank as the old code left it: plaintext passwords in the snapshot.
+    bank = Bank(os.path.join(directory, "legacy.txt"), load=False)
+    for i in range(account_count):
+        bank.accounts[str(1000000 + i)] = {'name': f"Customer {i}", 'balance': 100000,
+                                           'account_type': 'current', 'password': PASSWORD,
+                                           'created_date': None}
+    started = time.perf_counter()
+    migrated = bank.migrate_passwords()
+    elapsed = time.perf_counter() - started
+    assert migrated == account_count
+    assert all(passwords.is_hashed(account['password']) for account in bank.accounts.values())
+    bank.journal.close()
+    return round(elapsed, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password and token login throughput.")
+    parser.add_argument('--accounts', type=int, default=50)
+    parser.add_argument('--logins', type=int, default=400, help="password logins per thread count")
+    parser.add_argument('--threads', default="1,2,4,8")
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        bank, accounts = build_bank(directory, args.accounts)
+        tokens = []
+        for account in accounts:
+            bank.authenticate(account, PASSWORD)
+            tokens.append(bank.issue_token(account))
+        results = []
+        for threads in map(int, args.threads.split(',')):
+            results.append({
+                'threads': threads,
+                'password_logins_per_second': measure(
+                    threads, args.logins, lambda account: bank.authenticate(account, PASSWORD),
+                    accounts, args.seed),
+                'token_logins_per_second': measure(
+                    threads, args.logins * 1000, bank.authenticate_token, tokens, args.seed),
+            })
+        bank.journal.close()
+        report = {'cpus': os.cpu_count(), 'kdf': passwords.hash_password(PASSWORD).split('$', 1)[0],
+                  'results': results,
+                  'migration_seconds': time_migration(directory, args.accounts)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Stress test for the locking model: N threads fire random transfers at a
+# shared Bank. Afterwards total money must be unchanged and every account's
+# history must reconcile. Reports throughput for each thread count.
+#
+#   python -m benchmarks.concurrency [--accounts 200] [--transfers 20000] [--threads 1,2,4,8,16]
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core import Bank, InsufficientFundsError
+
+OPENING_BALANCE = 100000
+
+
+def build_bank(directory, account_count):
+    bank = Bank(os.path.join(directory, "bank_data.txt"), snapshot_every=5000)
+    accounts = []
+    with bank.journal.batch():
+        for i in range(account_count):
+            accounts.append(bank.open_account(f"Customer {i}", OPENING_BALANCE, 'current', 'secret1'))
+    return bank, accounts
+
+
+def run(threads, account_count, transfer_count, seed):
+    with tempfile.TemporaryDirectory() as directory:
+        bank, accounts = build_bank(directory, account_count)
+        expected_total = sum(account['balance'] for account in bank.accounts.values())
+        per_thread = transfer_count // threads
+        rejected = [0] * threads
+        start_gate = threading.Barrier(threads)
+
+        def worker(index):
+            rng = random.Random(seed + index)
+            start_gate.wait()
+            for _ in range(per_thread):
+                source, target = rng.sample(accounts, 2)
+                try:
+                    bank.transfer(source, target, rng.randint(1, 50000))
+                except InsufficientFundsError:
+                    rejected[index] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for future in [pool.submit(worker, i) for i in range(threads)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        bank.save_data()
+
+        total = sum(account['balance'] for account in bank.accounts.values())
+        assert total == expected_total, f"money not conserved: {total} != {expected_total}"
+        discrepancies = bank.reconcile()
+        assert not discrepancies, f"history does not reconcile: {discrepancies[:5]}"
+
+        reloaded = Bank(bank.data_file)
+        assert {n: a['balance'] for n, a in reloaded.accounts.items()} == \
+               {n: a['balance'] for n, a in bank.accounts.items()}, "journal replay diverged"
+        reloaded.journal.close()
+
+        attempted = per_thread * threads
+        return {'threads': threads, 'transfers': attempted, 'rejected': sum(rejected),
+                'seconds': round(elapsed, 3), 'transfers_per_second': round(attempted / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent transfer stress test.")
+    parser.add_argument('--accounts', type=int, default=200)
+    parser.add_argument('--transfers', type=int, default=20000)
+    parser.add_argument('--threads', default="1,2,4,8,16")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    results = [run(int(threads), args.accounts, args.transfers, args.seed)
+               for threads in args.threads.split(',')]
+    print(json.dumps(results, indent=2))
+    print("✅ Money conserved and history reconciled at every thread count.")
+
+
+if __name__ == "__main__":
+    main()
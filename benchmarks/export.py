@@ -0,0 +1,57 @@
+# Export throughput and memory: the whole bank streamed to CSV and JSONL
+# in one process and split across worker processes, on a generated bank
+# with part of its history archived. Peak memory is traced in a separate
+# single process run, since tracing slows it down; it should stay flat as
+# --operations grows.
+#
+#   python -m benchmarks.export [--accounts 10000] [--operations 200000] [--workers 4]
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import exporter
+from benchmarks.generator import START, populate
+from core import Bank
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export throughput.")
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--operations', type=int, default=200000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "bank_data.txt")
+        bank = Bank(data_file, load=False, archive_min_rows=1)
+        populate(bank, args.accounts, args.operations, args.seed)
+        bank.save_data()
+        # The first half of the year goes to an archive segment.
+        bank.archive_history(START + datetime.timedelta(days=182))
+        bank.save_data()
+        rows = len(bank.transactions) + sum(len(segment) for segment in bank.transactions.segments)
+        bank.journal.close()
+        del bank
+
+        report = {'rows': rows}
+        for file_format in exporter.FORMATS:
+            for workers in (1, args.workers):
+                output_dir = os.path.join(directory, f"{file_format}-{workers}")
+                started = time.perf_counter()
+                manifest = exporter.export_bank(data_file, output_dir, file_format, workers)
+                seconds = time.perf_counter() - started
+                report[f"{file_format}_{workers}_workers_rows_per_second"] = round(manifest['rows'] / seconds)
+            tracemalloc.start()
+            exporter.export_bank(data_file, os.path.join(directory, "traced"), file_format, 1)
+            report[f"{file_format}_peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
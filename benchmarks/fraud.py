@@ -0,0 +1,94 @@
+# Cost of the fraud rules on the transaction path: the same withdraw/
+# transfer mix against a plain Bank and one checking a daily outflow limit,
+# an hourly count limit and a new-recipient cap, plus the rule engine's
+# check and record on their own. Limits are set high enough that nothing is
+# refused, so both banks do the same work.
+#
+#   python -m benchmarks.fraud [--accounts 1000] [--operations 50000] [--rounds 5]
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from core import Bank
+from fraud import NewRecipientRule, RuleEngine, VelocityRule
+
+OPENING_BALANCE = 10 ** 9
+
+
+def make_rules():
+    return RuleEngine([VelocityRule('daily_outflow', 86400, max_amount=10 ** 12),
+                       VelocityRule('hourly_count', 3600, max_count=10 ** 6),
+                       NewRecipientRule('new_payees', 3600, max_count=10 ** 6)])
+
+
+def plan(account_count, operation_count, seed):
+    rng = random.Random(seed)
+    accounts = [str(1000000 + i) for i in range(account_count)]
+    return accounts, [(rng.random() < 0.4, *rng.sample(accounts, 2), rng.randint(1, 50000))
+                      for _ in range(operation_count)]
+
+
+def run(rules, accounts, operations):
+    with tempfile.TemporaryDirectory() as directory:
+        bank = Bank(os.path.join(directory, "bank_data.txt"), snapshot_every=10 ** 9, load=False, rules=rules)
+        for account_number in accounts:
+            bank.accounts[account_number] = {'name': 'Customer', 'balance': OPENING_BALANCE,
+                                             'account_type': 'current', 'password': 'secret1',
+                                             'created_date': None}
+        started = time.perf_counter()
+        # One journal batch, so disk flushes don't drown out the difference.
+        with bank.journal.batch():
+            for withdraw, source, target, amount in operations:
+                if withdraw:
+                    bank.withdraw(source, amount)
+                else:
+                    bank.transfer(source, target, amount)
+        elapsed = time.perf_counter() - started
+        bank.journal.close()
+        return elapsed
+
+
+def run_engine(accounts, operations):
+    # check + record alone, on an engine that has already seen every account.
+    rules = make_rules()
+    for account_number in accounts:
+        rules.check('withdraw', account_number, 1)
+    started = time.perf_counter()
+    for withdraw, source, target, amount in operations:
+        operation = 'withdraw' if withdraw else 'transfer'
+        rules.record(rules.check(operation, source, amount, None if withdraw else target))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fraud rule overhead.")
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--operations', type=int, default=50000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=9)
+    args = parser.parse_args()
+
+    accounts, operations = plan(args.accounts, args.operations, args.seed)
+    # Setups take turns and each keeps its best time, so drift in machine
+    # load doesn't favour whichever ran first.
+    best = {}
+    for _ in range(args.rounds):
+        for name, seconds in (('plain', run(None, accounts, operations)),
+                              ('rules', run(make_rules(), accounts, operations)),
+                              ('engine_only', run_engine(accounts, operations))):
+            best[name] = min(best.get(name, seconds), seconds)
+    per_operation = {name: seconds / args.operations * 1e6 for name, seconds in best.items()}
+    print(json.dumps({
+        'operations': args.operations,
+        'plain_us_per_operation': round(per_operation['plain'], 2),
+        'rules_us_per_operation': round(per_operation['rules'], 2),
+        'added_us_per_operation': round(per_operation['rules'] - per_operation['plain'], 2),
+        'engine_check_and_record_us': round(per_operation['engine_only'], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
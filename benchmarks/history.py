@@ -0,0 +1,105 @@
+# Point-in-time balances, range statements and the incremental verifier on a
+# large synthetic history. Lookups should stay flat as history grows; an
+# incremental reconcile should cost only the transactions added since the
+# last one. The lookups are then repeated with the older half of the history
+# moved to a memory-mapped archive segment.
+#
+#   python -m benchmarks.history [--accounts 20000] [--transactions 100] [--queries 20000]
+import argparse
+import datetime
+import json
+import os
+import random
+import tempfile
+import time
+
+import storage
+from core import Bank
+
+START = datetime.datetime(2026, 1, 1)
+YEAR = 365 * 86400
+
+
+def add_history(bank, accounts, per_account, rng, start_epoch):
+    # Rows are appended in time order, as commits would be.
+    events = sorted((start_epoch + rng.randrange(YEAR), account_number)
+                    for account_number in accounts for _ in range(per_account))
+    for timestamp, account_number in events:
+        account = bank.accounts[account_number]
+        amount = rng.randint(1, 10000)
+        account['balance'] += amount
+        bank.record_transaction({'type': 'deposit', 'account_number': account_number, 'amount': amount,
+                                 'balance_after': account['balance'], 'timestamp': timestamp})
+
+
+def build_bank(directory, account_count, per_account, seed):
+    rng = random.Random(seed)
+    bank = Bank(os.path.join(directory, "bank_data.txt"), load=False, archive_min_rows=1)
+    accounts = [str(1000000 + i) for i in range(account_count)]
+    for account_number in accounts:
+        bank.accounts[account_number] = {'name': 'Customer', 'balance': 50000, 'account_type': 'current',
+                                         'password': 'secret1', 'created_date': START}
+        bank.record_transaction({'type': 'account_creation', 'account_number': account_number, 'amount': 50000,
+                                 'balance_after': 50000, 'timestamp': START})
+    add_history(bank, accounts, per_account, rng, storage.to_epoch(START))
+    return bank, accounts, rng
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def time_lookups(bank, samples, report, suffix):
+    _, seconds = timed(lambda: [bank.balance_at(account, when) for account, when in samples])
+    report['balance_at_us' + suffix] = round(seconds / len(samples) * 1e6, 2)
+    week = 7 * 86400
+    _, seconds = timed(lambda: [bank.statement(account, when, when + week) for account, when in samples])
+    report['weekly_statement_us' + suffix] = round(seconds / len(samples) * 1e6, 2)
+
+
+def run(args, directory):
+    bank, accounts, rng = build_bank(directory, args.accounts, args.transactions, args.seed)
+    start_epoch = storage.to_epoch(START)
+    report = {'accounts': args.accounts, 'transactions': len(bank.transactions)}
+
+    samples = [(rng.choice(accounts), start_epoch + rng.randrange(YEAR)) for _ in range(args.queries)]
+    time_lookups(bank, samples, report, '')
+    expected = [bank.balance_at(account, when) for account, when in samples]
+
+    _, seconds = timed(bank.archive_history, start_epoch + YEAR // 2)
+    report['archived_rows'] = sum(len(segment) for segment in bank.transactions.segments)
+    report['archive_seconds'] = round(seconds, 3)
+    assert [bank.balance_at(account, when) for account, when in samples] == expected, "archive changed balances"
+    time_lookups(bank, samples, report, '_archived')
+
+    discrepancies, seconds = timed(bank.reconcile)
+    assert not discrepancies, discrepancies[:5]
+    report['full_reconcile_seconds'] = round(seconds, 3)
+    bank.reconcile(incremental=True)
+
+    # A day's worth of new activity on 1% of the accounts.
+    active = rng.sample(accounts, max(1, args.accounts // 100))
+    add_history(bank, active, 5, rng, start_epoch + YEAR)
+    discrepancies, seconds = timed(bank.reconcile, True)
+    assert not discrepancies, discrepancies[:5]
+    report['incremental_reconcile_seconds'] = round(seconds, 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Point-in-time balance and verifier benchmark.")
+    parser.add_argument('--accounts', type=int, default=20000)
+    parser.add_argument('--transactions', type=int, default=100, help="history per account")
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = run(args, directory)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Month-end accrual over a synthetic bank: the per-account loop against the
+# NumPy column engine (when NumPy is installed). Both must agree to the
+# cent.
+#
+#   python -m benchmarks.interest [--accounts 200000] [--transactions 5]
+import argparse
+import datetime
+import json
+import random
+import time
+
+import interest
+import storage
+from core import Bank
+
+TIERS = ((0, 0.02), (1000000, 0.03), (10000000, 0.035))
+
+
+def build_bank(account_count, per_account, start, end, seed):
+    # Fills the in-memory structures directly; the journal isn't involved.
+    rng = random.Random(seed)
+    bank = Bank("/nonexistent/benchmark_bank.txt", load=False)
+    opened = storage.to_epoch(start) - 30 * interest.SECONDS_PER_DAY
+    span = storage.to_epoch(end) - storage.to_epoch(start)
+    for i in range(account_count):
+        account_number = str(1000000 + i)
+        balance = rng.randint(50000, 20000000)
+        bank.accounts[account_number] = {'name': f"Customer {i}", 'balance': balance,
+                                         'account_type': 'savings' if i % 4 else 'current',
+                                         'password': 'secret1', 'created_date': start}
+        bank.record_transaction({'type': 'account_creation', 'account_number': account_number,
+                                 'amount': balance, 'balance_after': balance, 'timestamp': opened})
+        times = sorted(storage.to_epoch(start) + rng.randrange(span) for _ in range(per_account))
+        for timestamp in times:
+            amount = rng.randint(1, 100000)
+            if rng.random() < 0.5 or balance < amount:
+                balance += amount
+                transaction_type = 'deposit'
+            else:
+                balance -= amount
+                transaction_type = 'withdrawal'
+            bank.record_transaction({'type': transaction_type, 'account_number': account_number,
+                                     'amount': amount, 'balance_after': balance, 'timestamp': timestamp})
+        bank.accounts[account_number]['balance'] = balance
+    return bank
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, round(time.perf_counter() - started, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interest accrual throughput.")
+    parser.add_argument('--accounts', type=int, default=200000)
+    parser.add_argument('--transactions', type=int, default=5, help="transactions per account in the month")
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    start, end = datetime.datetime(2026, 9, 1), datetime.datetime(2026, 10, 1)
+    bank, build_seconds = timed(build_bank, args.accounts, args.transactions, start, end, args.seed)
+    report = {'accounts': args.accounts, 'transactions': len(bank.transactions),
+              'build_seconds': build_seconds}
+
+    by_account, report['python_seconds'] = timed(interest.accrue, bank, start, end, TIERS, False)
+    report['accounts_paid'] = len(by_account)
+    report['total_interest'] = sum(amount for _, amount in by_account)
+    if interest.numpy is None:
+        report['numpy_seconds'] = None
+        print(json.dumps(report, indent=2))
+        print("NumPy is not installed; only the per-account loop was measured.")
+        return
+    by_columns, report['numpy_seconds'] = timed(interest.accrue, bank, start, end, TIERS, True)
+    assert by_columns == by_account, "column engine disagrees with the per-account loop"
+    report['speedup'] = round(report['python_seconds'] / max(report['numpy_seconds'], 1e-9), 1)
+    print(json.dumps(report, indent=2))
+    print("✅ Both engines agree to the cent.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Compares the memory held by the old list-of-dicts transaction history with
+# the columnar TransactionStore.
+#
+#   python -m benchmarks.memory [transaction_count]
+import datetime
+import json
+import random
+import sys
+import tracemalloc
+
+from txstore import TransactionStore
+
+
+def synthetic_transactions(count, seed=42):
+    rng = random.Random(seed)
+    accounts = [str(n) for n in rng.sample(range(100000, 1000000), max(2, count // 50))]
+    balances = dict.fromkeys(accounts, 1000.0)
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(count):
+        account = rng.choice(accounts)
+        amount = round(rng.uniform(1, 500), 2)
+        timestamp = start + datetime.timedelta(seconds=i * 30)
+        kind = rng.choice(('deposit', 'withdrawal', 'transfer_out'))
+        if kind == 'deposit':
+            balances[account] += amount
+            yield {'type': 'deposit', 'account_number': account, 'amount': amount,
+                   'balance_after': balances[account], 'timestamp': timestamp,
+                   'description': f'Deposited ${amount:.2f}'}
+        elif kind == 'withdrawal':
+            balances[account] -= amount
+            yield {'type': 'withdrawal', 'account_number': account, 'amount': amount,
+                   'balance_after': balances[account], 'timestamp': timestamp,
+                   'description': f'Withdrew ${amount:.2f}'}
+        else:
+            target = rng.choice(accounts)
+            balances[account] -= amount
+            yield {'type': 'transfer_out', 'account_number': account, 'target_account': target,
+                   'amount': amount, 'balance_after': balances[account], 'timestamp': timestamp,
+                   'description': f'Transferred ${amount:.2f} to account {target}'}
+
+
+def measure(build):
+    tracemalloc.start()
+    container = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return container, current
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    def build_dicts():
+        return list(synthetic_transactions(count))
+
+    def build_store():
+        store = TransactionStore()
+        for transaction in synthetic_transactions(count):
+            store.append(transaction)
+        return store
+
+    dicts, dict_bytes = measure(build_dicts)
+    del dicts
+    store, store_bytes = measure(build_store)
+    results = {
+        'transactions': count,
+        'list_of_dicts_bytes': dict_bytes,
+        'store_bytes': store_bytes,
+        'list_of_dicts_bytes_per_txn': round(dict_bytes / count, 1),
+        'store_bytes_per_txn': round(store_bytes / count, 1),
+        'reduction': round(dict_bytes / store_bytes, 1),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
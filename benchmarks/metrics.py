@@ -0,0 +1,77 @@
+# Cost of instrumentation on the hot path: the same deposit/withdraw/
+# transfer mix against a plain Bank, one recording metrics, one that also
+# calls a tracer, and one profiling transfers.
+#
+#   python -m benchmarks.metrics [--accounts 200] [--operations 50000] [--rounds 5]
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from core import Bank, InsufficientFundsError
+from metrics import Metrics
+
+OPENING_BALANCE = 100000
+SETUPS = (
+    ('plain', lambda: None),
+    ('metrics', lambda: Metrics()),
+    ('metrics_and_tracer', lambda: Metrics(tracer=lambda operation, seconds, error: None)),
+    ('profiling_transfer', lambda: Metrics(profile=('transfer',))),
+)
+
+
+def run(metrics, account_count, operation_count, seed):
+    with tempfile.TemporaryDirectory() as directory:
+        bank = Bank(os.path.join(directory, "bank_data.txt"), snapshot_every=10 ** 9, load=False,
+                    metrics=metrics)
+        accounts = [str(1000000 + i) for i in range(account_count)]
+        for account_number in accounts:
+            bank.accounts[account_number] = {'name': 'Customer', 'balance': OPENING_BALANCE,
+                                             'account_type': 'current', 'password': 'secret1',
+                                             'created_date': None}
+        rng = random.Random(seed)
+        plan = [(rng.random(), rng.sample(accounts, 2), rng.randint(1, 50000)) for _ in range(operation_count)]
+        started = time.perf_counter()
+        # One journal batch, so disk flushes don't drown out the difference.
+        with bank.journal.batch():
+            for choice, (source, target), amount in plan:
+                try:
+                    if choice < 0.3:
+                        bank.deposit(source, amount)
+                    elif choice < 0.6:
+                        bank.withdraw(source, amount)
+                    else:
+                        bank.transfer(source, target, amount)
+                except InsufficientFundsError:
+                    pass
+        elapsed = time.perf_counter() - started
+        bank.journal.close()
+        return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instrumentation overhead.")
+    parser.add_argument('--accounts', type=int, default=200)
+    parser.add_argument('--operations', type=int, default=50000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=9)
+    args = parser.parse_args()
+
+    # Setups take turns and each keeps its best time, so drift in machine
+    # load doesn't favour whichever ran first.
+    best = {}
+    for _ in range(args.rounds):
+        for name, make in SETUPS:
+            seconds = run(make(), args.accounts, args.operations, args.seed)
+            best[name] = min(best.get(name, seconds), seconds)
+    report = {'operations': args.operations}
+    for name, seconds in best.items():
+        report[name] = {'ops_per_second': round(args.operations / seconds),
+                        'overhead_percent': round((seconds / best['plain'] - 1) * 100, 1)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
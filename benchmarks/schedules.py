@@ -0,0 +1,88 @@
+# Standing orders at scale: --schedules spread over the next 30 days. The
+# benchmark times adding them, reloading the schedule journal, a tick with
+# nothing due, and a tick paying one day's worth. The day's payments are
+# compared with the same transfers made directly, with and without
+# idempotency keys. The idle tick is compared with what finding the due
+# schedules by scanning every one would cost.
+#
+#   python -m benchmarks.schedules [--schedules 1000000] [--accounts 10000]
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from core import Bank
+from scheduler import PERIODS, Scheduler
+
+OPENING_BALANCE = 10 ** 12
+START = 1800000000
+DAY = 86400
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduled payment throughput.")
+    parser.add_argument('--schedules', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    accounts = [str(1000000 + i) for i in range(args.accounts)]
+    with tempfile.TemporaryDirectory() as directory:
+        bank = Bank(os.path.join(directory, "bank_data.txt"), snapshot_every=10 ** 9, load=False)
+        for account_number in accounts:
+            bank.accounts[account_number] = {'name': 'Customer', 'balance': OPENING_BALANCE,
+                                             'account_type': 'current', 'password': 'secret1',
+                                             'created_date': None}
+        report = {'schedules': args.schedules}
+
+        scheduler = Scheduler(bank, clock=lambda: START)
+        plan = [(*rng.sample(accounts, 2), rng.randint(100, 100000), START + rng.randrange(30 * DAY),
+                 rng.choice(PERIODS)) for _ in range(args.schedules)]
+        with scheduler.journal.batch():
+            _, seconds = timed(lambda: [scheduler.add(*schedule) for schedule in plan])
+        report['add_us'] = round(seconds / args.schedules * 1e6, 2)
+        scheduler.close()
+
+        scheduler, seconds = timed(lambda: Scheduler(bank))
+        report['load_seconds'] = round(seconds, 2)
+        report['journal_bytes'] = os.path.getsize(scheduler.journal.path)
+
+        _, seconds = timed(lambda: [scheduler.run_due(START - 1) for _ in range(1000)])
+        report['idle_tick_us'] = round(seconds / 1000 * 1e6, 2)
+
+        # What a tick would cost if it had to look at every schedule.
+        _, seconds = timed(lambda: [schedule for schedule in scheduler.schedules.values()
+                                    if schedule.next_run <= START + DAY])
+        report['scan_tick_ms'] = round(seconds * 1e3, 1)
+
+        due = [(schedule.account_number, schedule.target_account, schedule.amount)
+               for schedule in scheduler.schedules.values() if schedule.next_run <= START + DAY]
+        result, seconds = timed(lambda: scheduler.run_due(START + DAY))
+        if result != {'paid': len(due), 'failed': 0}:
+            raise AssertionError(f"expected {len(due)} payments, got {result}")
+        report['day_payments'] = result['paid']
+        report['scheduled_payments_per_second'] = round(result['paid'] / seconds)
+        with bank.journal.batch():
+            _, seconds = timed(lambda: [bank.transfer(*payment) for payment in due])
+        report['direct_transfers_per_second'] = round(len(due) / seconds)
+        # The scheduler's transfers carry idempotency keys, which cost the
+        # bank more to record; this is the like-for-like comparison.
+        with bank.journal.batch():
+            _, seconds = timed(lambda: [bank.transfer(*payment, f"direct:{i}") for i, payment in enumerate(due)])
+        report['direct_keyed_transfers_per_second'] = round(len(due) / seconds)
+        scheduler.close()
+        bank.journal.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# Account search: query latency from the search index against a scan of
+# every account, the extra load time to build the index, and what keeping
+# it current adds to a deposit. Every indexed answer is checked against
+# the scan's.
+#
+#   python -m benchmarks.search [--accounts 1000000] [--queries 200]
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.generator import START, populate
+from core import Bank
+from search import AccountIndex
+
+FIRST_NAMES = ('james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda', 'william',
+               'elizabeth', 'david', 'barbara', 'richard', 'susan', 'joseph', 'jessica', 'thomas', 'sarah',
+               'charles', 'karen', 'amara', 'chen', 'fatima', 'hiroshi', 'ingrid', 'kwame', 'lucia', 'mohammed',
+               'olga', 'priya', 'santiago', 'yusuf')
+SYLLABLES = ('an', 'ber', 'co', 'da', 'el', 'fin', 'gar', 'ho', 'is', 'jo', 'ka', 'lin', 'mor', 'nes', 'ok',
+             'pe', 'qu', 'ros', 'son', 'ta', 'ul', 'vi', 'wen', 'xi', 'ya', 'zed')
+
+
+def surname(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def queries(rng, count):
+    # A mix of the kinds of question an admin asks.
+    made = []
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            made.append({'name': surname(rng)[:4]})
+        elif kind == 1:
+            made.append({'name': f"{rng.choice(FIRST_NAMES)} {surname(rng)[:2]}"})
+        elif kind == 2:
+            low = rng.randint(500, 5000) * 100
+            made.append({'min_balance': low, 'max_balance': low + 500})
+        elif kind == 3:
+            day = START + datetime.timedelta(days=rng.randrange(365))
+            made.append({'account_type': 'savings', 'created_from': day,
+                         'created_to': day + datetime.timedelta(hours=1)})
+        else:
+            made.append({'name': rng.choice(FIRST_NAMES), 'account_type': 'current', 'min_balance': 400000})
+    return made
+
+
+def timed_us(function):
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Account search latency.")
+    parser.add_argument('--accounts', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--deposits', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "bank_data.txt")
+        # Eight-digit numbers leave room for millions of accounts.
+        bank = Bank(data_file, load=False, account_digits=8)
+        accounts = populate(bank, args.accounts, args.accounts, args.seed)
+        for i, account_number in enumerate(accounts):
+            account = bank.accounts[account_number]
+            account['name'] = f"{rng.choice(FIRST_NAMES).title()} {surname(rng).title()}"
+            account['created_date'] = START + datetime.timedelta(seconds=i * 365 * 86400 // args.accounts)
+        bank.save_data()
+        bank.journal.close()
+        del bank
+
+        report = {'accounts': args.accounts}
+        started = time.perf_counter()
+        plain = Bank(data_file)
+        report['load_seconds'] = round(time.perf_counter() - started, 2)
+        started = time.perf_counter()
+        indexed = Bank(data_file, search=AccountIndex())
+        report['load_with_index_seconds'] = round(time.perf_counter() - started, 2)
+
+        indexed_us, scan_us, matches = [], [], []
+        for query in queries(rng, args.queries):
+            found, us = timed_us(lambda: indexed.find_accounts(**query, limit=50))
+            indexed_us.append(us)
+            _, us = timed_us(lambda: plain.find_accounts(**query, limit=50))
+            scan_us.append(us)
+            expected = plain.find_accounts(**query, limit=len(plain.accounts))
+            matches.append(len(expected))
+            if len(found) != min(50, len(expected)) or not set(found) <= set(expected):
+                raise AssertionError(f"index and scan disagree on {query}")
+        report['median_matches'] = statistics.median(matches)
+        report['indexed_query_median_us'] = round(statistics.median(indexed_us), 1)
+        report['indexed_query_max_us'] = round(max(indexed_us), 1)
+        report['scan_query_median_us'] = round(statistics.median(scan_us), 1)
+
+        # The same deposits through each bank, in one journal batch.
+        sample = [rng.choice(accounts) for _ in range(args.deposits)]
+        for name, bank in (('plain', plain), ('indexed', indexed)):
+            with bank.journal.batch():
+                _, us = timed_us(lambda: [bank.deposit(account_number, 100) for account_number in sample])
+            report[f"{name}_deposit_us"] = round(us / args.deposits, 2)
+            bank.journal.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Startup time with and without lazy history, on a generated bank: how
+# long until the first request can be served, and until all history is in
+# memory. The lazy run also makes deposits while history loads, to show
+# what requests pay for sharing the process with the loader.
+#
+#   python -m benchmarks.startup [--accounts 50000] [--operations 1000000]
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.generator import populate
+from core import Bank
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first request, eager and lazy.")
+    parser.add_argument('--accounts', type=int, default=50000)
+    parser.add_argument('--operations', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "bank_data.txt")
+        bank = Bank(data_file, load=False)
+        accounts = populate(bank, args.accounts, args.operations, args.seed)
+        bank.save_data()
+        report = {'accounts': args.accounts, 'history_rows': len(bank.transactions)}
+        bank.journal.close()
+        del bank
+
+        started = time.perf_counter()
+        bank = Bank(data_file)
+        bank.deposit(accounts[0], 100)
+        report['eager_first_request_seconds'] = round(time.perf_counter() - started, 3)
+        report['eager_loaded_seconds'] = round(bank.load_timings['loaded_seconds'], 3)
+        bank.journal.close()
+        del bank
+
+        started = time.perf_counter()
+        bank = Bank(data_file, lazy_history=True)
+        bank.deposit(accounts[0], 100)
+        report['lazy_first_request_seconds'] = round(time.perf_counter() - started, 3)
+        latencies = []
+        while not bank.history_loaded:
+            account_number = accounts[len(latencies) % len(accounts)]
+            request_started = time.perf_counter()
+            bank.deposit(account_number, 100)
+            latencies.append(time.perf_counter() - request_started)
+            time.sleep(0.001)
+        bank.wait_for_history()
+        report['lazy_loaded_seconds'] = round(bank.load_timings['loaded_seconds'], 3)
+        report['deposits_while_loading'] = len(latencies)
+        if latencies:
+            latencies.sort()
+            report['deposit_while_loading_median_ms'] = round(statistics.median(latencies) * 1e3, 3)
+            report['deposit_while_loading_p99_ms'] = round(latencies[int(len(latencies) * 0.99)] * 1e3, 3)
+        bank.journal.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
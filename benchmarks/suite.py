@@ -0,0 +1,193 @@
+# Reproducible benchmark suite. For each scale (accounts x operations) a
+# synthetic bank is generated from a fixed seed (see benchmarks.generator)
+# and the suite times save_data, load_data, transaction history lookups and
+# transfer throughput, and records peak memory. Each scale runs in its own
+# process, so peak RSS belongs to that scale alone. Each scale runs
+# --repeat times and every metric keeps its best value, which filters out
+# most of the noise from other load on the machine.
+#
+#   python -m benchmarks.suite [--scales 1000x10000,10000x100000] [--repeat 3] [--output results.json]
+#   python -m benchmarks.suite --compare baseline.json [--threshold 10]
+#
+# Results are JSON, tagged with the commit, Python version and CPU count.
+# --compare runs the suite and reports every metric that got worse than
+# the baseline by more than --threshold percent, exiting 1 if any did.
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generator import populate
+from core import Bank
+
+DEFAULT_SCALES = "1000x10000,10000x100000,50000x1000000"
+# Metric name suffix -> True if a larger value is better.
+DIRECTIONS = (('_per_second', True), ('_seconds', False), ('_us', False), ('_bytes', False))
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def parse_scale(text):
+    accounts, _, operations = text.lower().partition('x')
+    return int(accounts), int(operations)
+
+
+def run_scale(account_count, operation_count, seed, lookups, transfers):
+    result = {'accounts': account_count, 'operations': operation_count}
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "bank_data.txt")
+        bank = Bank(data_file, load=False)
+        accounts, seconds = timed(populate, bank, account_count, operation_count, seed)
+        result['history_rows'] = len(bank.transactions)
+        result['generate_seconds'] = round(seconds, 3)
+        _, seconds = timed(bank.save_data)
+        result['save_seconds'] = round(seconds, 3)
+        result['snapshot_bytes'] = os.path.getsize(data_file)
+        bank.journal.close()
+        del bank
+        gc.collect()
+
+        bank = Bank(data_file, load=False)
+        _, seconds = timed(bank.load_data)
+        result['load_seconds'] = round(seconds, 3)
+
+        # What the menu's history view does: count, then the first page;
+        # and a full history listing.
+        rng = random.Random(seed)
+        sample = [rng.choice(accounts) for _ in range(lookups)]
+        _, seconds = timed(lambda: [(bank.transaction_count(account), bank.history(account, limit=20))
+                                    for account in sample])
+        result['history_page_us'] = round(seconds / lookups * 1e6, 1)
+        _, seconds = timed(lambda: [bank.history(account) for account in sample])
+        result['history_full_us'] = round(seconds / lookups * 1e6, 1)
+
+        # Transfers through the core, journaled with group commit. Amounts
+        # are small enough that none is refused.
+        pairs = [rng.sample(accounts, 2) for _ in range(transfers)]
+        _, seconds = timed(lambda: [bank.transfer(source, target, 1) for source, target in pairs])
+        result['transfers_per_second'] = round(transfers / seconds)
+        bank.journal.close()
+        del bank
+        gc.collect()
+
+        # Memory held by a loaded bank, measured on a separate load since
+        # tracing slows it down.
+        tracemalloc.start()
+        bank = Bank(data_file)
+        result['loaded_bytes'] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        bank.journal.close()
+    result['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def run_in_subprocess(scale, args):
+    command = [sys.executable, '-m', 'benchmarks.suite', '--single', scale, '--seed', str(args.seed),
+               '--lookups', str(args.lookups), '--transfers', str(args.transfers)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def best_of(runs):
+    best = dict(runs[0])
+    for result in runs[1:]:
+        for metric, value in result.items():
+            higher_is_better = direction(metric)
+            if higher_is_better is not None:
+                best[metric] = max(best[metric], value) if higher_is_better else min(best[metric], value)
+    return best
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit or None, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'run_at': datetime.datetime.now().isoformat(timespec='seconds')}
+
+
+def direction(metric):
+    for suffix, higher_is_better in DIRECTIONS:
+        if metric.endswith(suffix):
+            return higher_is_better
+    return None
+
+
+def compare(baseline, current, threshold):
+    # Returns human-readable lines for every metric worse by more than
+    # threshold percent, matching scales by their accounts and operations.
+    regressions = []
+    previous = {(r['accounts'], r['operations']): r for r in baseline['results']}
+    for result in current['results']:
+        before = previous.get((result['accounts'], result['operations']))
+        if before is None:
+            continue
+        for metric, value in result.items():
+            higher_is_better = direction(metric)
+            old = before.get(metric)
+            if higher_is_better is None or not old or value is None:
+                continue
+            change = (value - old) / old * 100
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(f"{result['accounts']}x{result['operations']} {metric}: "
+                                   f"{old} -> {value} ({change:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducible benchmark suite.")
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help="comma-separated ACCOUNTSxOPERATIONS")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per scale; each metric keeps its best")
+    parser.add_argument('--lookups', type=int, default=2000, help="history lookups per scale")
+    parser.add_argument('--transfers', type=int, default=20000, help="transfers timed per scale")
+    parser.add_argument('--output', help="write the results here as well as to stdout")
+    parser.add_argument('--compare', help="results file from an earlier run to check against")
+    parser.add_argument('--threshold', type=float, default=10, help="regression threshold in percent")
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_scale(*parse_scale(args.single), args.seed, args.lookups, args.transfers)))
+        return
+
+    report = environment()
+    report.update(seed=args.seed, repeat=args.repeat, lookups=args.lookups, transfers=args.transfers,
+                  results=[])
+    for scale in args.scales.split(','):
+        report['results'].append(best_of([run_in_subprocess(scale.strip(), args) for _ in range(args.repeat)]))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        print(f"Compared with {baseline.get('commit') or args.compare}:")
+        for line in regressions:
+            print(f"  ❌ {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"  ✅ No metric regressed by more than {args.threshold:g}%.")
+
+
+if __name__ == "__main__":
+    main()
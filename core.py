@@ -0,0 +1,1016 @@
+import bisect
+import datetime
+import itertools
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+import storage
+from archive import Segment, write_segment
+from allocator import AccountNumberAllocator, ExhaustedError
+from idempotency import IdempotencyIndex
+from journal import Journal
+from passwords import TokenCache, burn_hash, hash_password, is_hashed, verify_password
+from search import Query
+from money import to_cents
+from txstore import TransactionStore, TRANSACTION_TYPES, BALANCE_EFFECT
+
+ACCOUNT_TYPES = ('savings', 'current')
+PREPARED_FIELDS = ('side', 'account_number', 'amount', 'counterparty')
+MIN_OPENING_DEPOSIT = 50000
+MIN_PASSWORD_LENGTH = 6
+SCHEDULED_KEYS = 100000
+
+
+class BankError(Exception):
+    pass
+
+
+class ValidationError(BankError):
+    pass
+
+
+class InvalidAmountError(ValidationError):
+    pass
+
+
+class AccountExistsError(ValidationError):
+    def __init__(self, account_number):
+        super().__init__(f"account {account_number} already exists")
+        self.account_number = account_number
+
+    def __reduce__(self):
+        return (type(self), (self.account_number,))
+
+
+class AccountNotFoundError(BankError):
+    message = "account {} not found"
+
+    def __init__(self, account_number):
+        super().__init__(self.message.format(account_number))
+        self.account_number = account_number
+
+    def __reduce__(self):
+        return (type(self), (self.account_number,))
+
+
+class MistypedAccountNumberError(AccountNotFoundError):
+    # Shaped like the bank's account numbers but with a wrong check digit.
+    message = "{} is not a valid account number; check it for a typo"
+
+
+class AccountSpaceExhaustedError(BankError):
+    pass
+
+
+class IdempotencyConflictError(ValidationError):
+    def __init__(self, key):
+        super().__init__(f"idempotency key {key!r} was already used for a different request")
+        self.key = key
+
+    def __reduce__(self):
+        return (type(self), (self.key,))
+
+
+class AuthenticationError(BankError):
+    pass
+
+
+class InsufficientFundsError(BankError):
+    def __init__(self, account_number, balance, amount):
+        super().__init__(f"account {account_number} has insufficient funds")
+        self.account_number = account_number
+        self.balance = balance
+        self.amount = amount
+
+    def __reduce__(self):
+        return (type(self), (self.account_number, self.balance, self.amount))
+
+
+class RuleViolationError(BankError):
+    # Refused by a fraud.RuleEngine rule.
+    def __init__(self, account_number, rule, reason):
+        super().__init__(f"account {account_number} refused by rule {rule}: {reason}")
+        self.account_number = account_number
+        self.rule = rule
+        self.reason = reason
+
+    def __reduce__(self):
+        return (type(self), (self.account_number, self.rule, self.reason))
+
+
+def check_amount(amount):
+    if not isinstance(amount, int) or isinstance(amount, bool):
+        raise InvalidAmountError("amount must be an integer number of cents")
+    if amount <= 0:
+        raise InvalidAmountError("amount must be positive")
+    return amount
+
+
+class Bank:
+    # The non-interactive banking core. Every operation either returns a
+    # result or raises a BankError subclass; nothing here reads input or
+    # prints, so it can be driven from the menu, a batch file or a server.
+    #
+    # Thread safety: an operation holds the locks of the accounts it touches,
+    # always taken in sorted account-number order so two transfers can never
+    # wait on each other. Its balance changes, history records and journal
+    # record are then published together under the commit lock, so a reader
+    # or snapshot never sees half a transfer.
+    def __init__(self, data_file="bank_data.txt", snapshot_every=10000, load=True,
+                 account_digits=6, check_digit=True, archive_days=None, archive_min_rows=100000,
+                 metrics=None, rules=None, search=None, lazy_history=False):
+        self.data_file = data_file
+        self.snapshot_every = snapshot_every
+        # With archive_days set, each snapshot first moves history older than
+        # that into a new archive segment, once at least archive_min_rows
+        # rows qualify, so snapshots and memory only carry recent history.
+        self.archive_days = archive_days
+        self.archive_min_rows = archive_min_rows
+        self.archive_dir = data_file + ".archive"
+        self.account_digits = account_digits
+        self.check_digit = check_digit
+        # With lazy_history, load_data() returns once accounts and balances
+        # are in, and reads the snapshot's history on a background thread.
+        self.lazy_history = lazy_history
+        self.journal = Journal(data_file + ".journal")
+        self._account_locks = {}
+        self._commit_lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._compacting = False
+        self.reset()
+        # A metrics.Metrics to record operation latencies and errors, from
+        # the initial load onwards.
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.instrument(self)
+        # A fraud.RuleEngine whose velocity rules withdrawals and outgoing
+        # transfers must pass.
+        self.rules = rules
+        if rules is not None:
+            rules.attach(self)
+        # A search.AccountIndex kept up to date with every committed change,
+        # for find_accounts().
+        self.search = search
+        if search is not None:
+            search.attach(self)
+        if load:
+            self.load_data()
+
+    def reset(self):
+        self.accounts = {}
+        self.transactions = TransactionStore()
+        # Two-phase transfers that are prepared but not yet resolved, and the
+        # funds they hold back on each debited account.
+        self.prepared = {}
+        self.held = {}
+        # Per-account verification checkpoint: how many of the account's
+        # transactions reconcile() has checked, and the balance after them.
+        self.checkpoints = {}
+        self.allocator = AccountNumberAllocator(self.account_digits, self.check_digit)
+        self.tokens = TokenCache()
+        # Every history row gets the next id. Results of operations made with
+        # an idempotency key, for answering retries.
+        self.next_transaction_id = 1
+        self.idempotency = IdempotencyIndex()
+        # The scheduler's keys, kept apart so clients can neither claim nor
+        # evict them. Each has to outlive a crash between the bank's fsync
+        # and the scheduler's, however long the bank then stays down, so
+        # they never expire by age; holding one scheduler batch is enough.
+        self.scheduled_idempotency = IdempotencyIndex(capacity=SCHEDULED_KEYS, ttl=None)
+        # Set while history is fully in memory; cleared during a lazy load.
+        self._history_ready = threading.Event()
+        self._history_ready.set()
+        self._history_error = None
+        # Seconds from load_data() being called until it could serve
+        # requests, and until all history was loaded.
+        self.load_timings = {'ready_seconds': None, 'loaded_seconds': None}
+
+    # --- persistence -------------------------------------------------------
+
+    def load_data(self):
+        started = time.perf_counter()
+        status = {'snapshot': False, 'migrated_to': None, 'replayed': 0, 'history_pending': False}
+        snapshot_lsn = 0
+        pending = None
+        if os.path.exists(self.data_file):
+            status['snapshot'] = True
+            if storage.is_legacy_file(self.data_file):
+                snapshot_lsn = self.migrate_legacy_data()
+                status['migrated_to'] = storage.FORMAT_VERSION
+            else:
+                reader = storage.SnapshotReader(self.data_file)
+                try:
+                    snapshot_lsn = reader.header['journal_lsn']
+                    if 'allocator' in reader.header:
+                        self.allocator.restore(reader.header['allocator'])
+                    self.next_transaction_id = reader.header.get('next_transaction_id', 1)
+                    self.idempotency.restore(reader.header.get('idempotency', ()))
+                    self.scheduled_idempotency.restore(reader.header.get('scheduled_idempotency', ()))
+                    for txid, prepared in reader.header.get('prepared', {}).items():
+                        self._hold(txid, prepared)
+                    segments = [Segment(os.path.join(self.archive_dir, name))
+                                for name in reader.header.get('segments', ())]
+                    self.transactions = TransactionStore(segments)
+                    for account_number, account in reader.accounts():
+                        self.accounts[account_number] = account
+                    # Rows in a snapshot from before transaction ids are
+                    # numbered as they load, so those load in order now.
+                    if self.lazy_history and reader.header['transactions'] and \
+                            'next_transaction_id' in reader.header:
+                        pending = reader, TransactionStore(segments)
+                    else:
+                        for transaction in reader.transactions():
+                            self.record_transaction(transaction)
+                finally:
+                    if pending is None:
+                        reader.close()
+        # The journal's rows go after the snapshot's, in self.transactions,
+        # which holds only rows newer than the snapshot until a lazy load
+        # has finished.
+        for record in self.journal.replay(after_lsn=snapshot_lsn):
+            self.apply_journal_record(record)
+            status['replayed'] += 1
+        if self.search is not None:
+            self.search.rebuild(self.accounts)
+        self.load_timings['ready_seconds'] = time.perf_counter() - started
+        if pending is None:
+            self.load_timings['loaded_seconds'] = self.load_timings['ready_seconds']
+        else:
+            status['history_pending'] = True
+            self._history_ready.clear()
+            threading.Thread(target=self._load_history, args=(*pending, started), name="bank-history",
+                             daemon=True).start()
+        return status
+
+    def _load_history(self, reader, store, started):
+        # Reads the snapshot's rows into a store of their own, then appends
+        # the rows committed since load_data() returned and swaps it in.
+        try:
+            with reader:
+                for transaction in reader.transactions():
+                    store.append(transaction)
+            with self._commit_lock:
+                store.copy_rows(self.transactions, 0)
+                self.transactions = store
+            self.load_timings['loaded_seconds'] = time.perf_counter() - started
+        except Exception as e:
+            self._history_error = e
+        finally:
+            self._history_ready.set()
+
+    def wait_for_history(self):
+        # Blocks until a lazy load has all history in memory. Every reader of
+        # history calls this first; balances and new operations don't need to.
+        self._history_ready.wait()
+        if self._history_error is not None:
+            raise self._history_error
+
+    @property
+    def history_loaded(self):
+        return self._history_ready.is_set()
+
+    def migrate_legacy_data(self):
+        # One-shot upgrade of the old literal-dict file: keep a copy of the
+        # original, then rewrite it in the streaming format.
+        data = storage.read_legacy(self.data_file)
+        self.accounts = data.get('accounts', {})
+        for transaction in data.get('transactions', []):
+            self.record_transaction(transaction)
+        snapshot_lsn = data.get('journal_lsn', 0)
+        shutil.copy2(self.data_file, self.data_file + ".legacy")
+        storage.write_snapshot(self.data_file, self.accounts, self.transactions, snapshot_lsn)
+        return snapshot_lsn
+
+    def apply_journal_record(self, record):
+        op = record['op']
+        if op == 'open':
+            account = dict(record['account'])
+            account_number = account.pop('account_number')
+            self.accounts[account_number] = storage.decode_account(account)
+        elif op == 'update':
+            self.accounts[record['account_number']].update(record['fields'])
+        elif op == 'prepare':
+            self._hold(record['txid'], {key: record[key] for key in PREPARED_FIELDS})
+        elif op in ('commit_prepared', 'abort'):
+            self._release(record['txid'])
+        elif op == 'interest':
+            for transaction in record['transactions']:
+                self.accounts[transaction['account_number']]['interest_through'] = record['period_end']
+        if 'allocator' in record:
+            self.allocator.restore(record['allocator'])
+        if 'idempotency' in record:
+            self.idempotency.restore([record['idempotency']])
+        if 'scheduled_idempotency' in record:
+            self.scheduled_idempotency.restore([record['scheduled_idempotency']])
+        for transaction in record.get('transactions', []):
+            transaction = dict(transaction)
+            transaction['timestamp'] = storage.to_datetime(transaction['timestamp'])
+            self.record_transaction(transaction)
+            self.accounts[transaction['account_number']]['balance'] = to_cents(transaction['balance_after'])
+
+    def log_operation(self, op, transactions=(), **fields):
+        record = {'op': op}
+        record.update(fields)
+        if transactions:
+            record['transactions'] = [storage.encode_transaction(t) for t in transactions]
+        # Called under the commit lock; committing() fsyncs after releasing it.
+        self.journal.append(record, defer_sync=True)
+
+    def commit(self, op, transactions=(), balances=(), updates=(), result=None, idempotency=None, scheduled=False,
+               **fields):
+        # balances is a sequence of (account, new_balance) pairs computed by
+        # the caller while holding those accounts' locks; updates holds
+        # (account, changes) pairs published along with them. `result`, the
+        # operation's return value, gets the first transaction's id; with
+        # idempotency=(key, request) it is also remembered, and journaled,
+        # under that key; in the scheduler's index if `scheduled`.
+        index = self.scheduled_idempotency if scheduled else self.idempotency
+        with self.committing():
+            if idempotency is not None and idempotency[0] in index:
+                # Claimed by a different request since the caller checked.
+                raise IdempotencyConflictError(idempotency[0])
+            for account, balance in balances:
+                account['balance'] = balance
+            for account, changes in updates:
+                account.update(changes)
+            for transaction in transactions:
+                self.record_transaction(transaction)
+            if self.search is not None:
+                for account_number in {transaction['account_number'] for transaction in transactions}:
+                    self.search.refresh(account_number, self.accounts[account_number])
+            if result is not None and transactions:
+                result['transaction_id'] = transactions[0]['transaction_id']
+            if idempotency is not None:
+                key, request = idempotency
+                created = time.time()
+                index.add(key, request, result, created)
+                fields['scheduled_idempotency' if scheduled else 'idempotency'] = [key, created, request, result]
+            self.log_operation(op, transactions, **fields)
+        # Compaction is held back while a batch is open; the batch triggers it
+        # itself once its records are committed.
+        if not self.journal.batching:
+            self.maybe_compact()
+
+    def maybe_compact(self):
+        # The snapshot is written on a background thread so the operation that
+        # crossed the threshold doesn't pay for it.
+        if self.journal.records >= self.snapshot_every and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._background_compaction, name="bank-compaction", daemon=True).start()
+
+    def _background_compaction(self):
+        try:
+            self.save_data()
+        finally:
+            self._compacting = False
+
+    def save_data(self):
+        # Freeze a consistent cut under the commit lock and seal the journal
+        # at that point; writers carry on into a fresh journal file while the
+        # snapshot is written. The sealed part is dropped only once the
+        # snapshot has been swapped in atomically.
+        self.wait_for_history()
+        with self._compaction_lock:
+            if self.archive_days is not None:
+                self.archive_history(datetime.datetime.now() - datetime.timedelta(days=self.archive_days))
+            with self._commit_lock:
+                accounts = {account_number: dict(account) for account_number, account in self.accounts.items()}
+                transactions = self.transactions
+                transaction_count = len(transactions)
+                journal_lsn = self.journal.lsn
+                metadata = {'prepared': dict(self.prepared), 'allocator': self.allocator.to_dict(),
+                            'segments': [segment.name for segment in transactions.segments],
+                            'next_transaction_id': self.next_transaction_id,
+                            'idempotency': self.idempotency.to_list(),
+                            'scheduled_idempotency': self.scheduled_idempotency.to_list()}
+                self.journal.rotate()
+            storage.write_snapshot(self.data_file, accounts, transactions, journal_lsn,
+                                   transaction_count=transaction_count, metadata=metadata)
+            self.journal.drop_sealed()
+
+    def archive_history(self, before):
+        # Moves the oldest rows, up to the first one dated `before` or later,
+        # into a new segment. Rows are in commit order, which is time order to
+        # within a second, and each account's archived rows are a prefix of
+        # its history. Readers never lock: the replacement store is built to
+        # the side and swapped in with one assignment. The old snapshot keeps
+        # covering these rows until the next one, which lists the segment, is
+        # in place.
+        self.wait_for_history()
+        store = self.transactions
+        with self._commit_lock:
+            count = len(store)
+        stop = bisect.bisect_left(store.timestamps, storage.to_epoch(before), hi=count)
+        if stop < self.archive_min_rows:
+            return None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{len(store.segments) + 1:06d}.seg")
+        write_segment(path, store, stop)
+        archived = store.archived(Segment(path), stop, count)
+        with self._commit_lock:
+            archived.copy_rows(store, count)
+            self.transactions = archived
+        return path
+
+    # --- locking -----------------------------------------------------------
+
+    @contextmanager
+    def committing(self):
+        # The commit lock, for publishing changes and journaling them. The
+        # journal's group fsync, when due, runs once the lock is released,
+        # so other committers never wait behind a disk flush.
+        with self._commit_lock:
+            yield
+        self.journal.sync_due()
+
+    def lock_for(self, account_number):
+        lock = self._account_locks.get(account_number)
+        if lock is None:
+            lock = self._account_locks.setdefault(account_number, threading.Lock())
+        return lock
+
+    @contextmanager
+    def locked(self, *account_numbers):
+        with ExitStack() as stack:
+            for account_number in sorted(set(account_numbers)):
+                stack.enter_context(self.lock_for(account_number))
+            yield
+
+    # --- transaction history -----------------------------------------------
+
+    def account_rows(self, account_number):
+        # The account's whole history, as TransactionStore.account_rows().
+        self.wait_for_history()
+        return self.transactions.account_rows(account_number)
+
+    def record_transaction(self, transaction):
+        # Rows replayed from the journal or a snapshot keep their id; new
+        # ones (and rows from before ids existed) take the next one.
+        transaction_id = transaction.get('transaction_id')
+        if not transaction_id:
+            transaction_id = transaction['transaction_id'] = self.next_transaction_id
+        self.next_transaction_id = max(self.next_transaction_id, transaction_id + 1)
+        self.transactions.append(transaction)
+
+    def replayed(self, key, request, scheduled=False):
+        # The original result if `key` was already used for this same
+        # request, None if the key is new. A key reused for a different
+        # request is refused.
+        if key is None:
+            return None
+        if not isinstance(key, str) or not 0 < len(key) <= 255:
+            raise ValidationError("idempotency key must be a string of 1 to 255 characters")
+        entry = (self.scheduled_idempotency if scheduled else self.idempotency).get(key)
+        if entry is None:
+            return None
+        original, result = entry
+        if original != request:
+            raise IdempotencyConflictError(key)
+        return dict(result)
+
+    def iter_account_transactions(self, account_number, newest_first=True, offset=0, limit=None):
+        runs = self.account_rows(account_number)
+        for columns, rows in (reversed(runs) if newest_first else runs):
+            count = len(rows)
+            if offset >= count:
+                offset -= count
+                continue
+            stop = count if limit is None else min(count, offset + limit)
+            for i in range(offset, stop):
+                yield columns[rows[count - 1 - i] if newest_first else rows[i]]
+            if limit is not None:
+                limit -= stop - offset
+                if not limit:
+                    return
+            offset = 0
+
+    def account_transactions_between(self, account_number, start=None, end=None):
+        # Each run of an account's history is in time order, so the range is
+        # found by bisecting on timestamp rather than scanning it.
+        for columns, rows in self.account_rows(account_number):
+            timestamp_of = columns.timestamps.__getitem__
+            low = 0 if start is None else bisect.bisect_left(rows, storage.to_epoch(start), key=timestamp_of)
+            high = len(rows) if end is None else bisect.bisect_right(rows, storage.to_epoch(end), key=timestamp_of)
+            for i in range(low, high):
+                yield columns[rows[i]]
+
+    def transaction_count(self, account_number):
+        return sum(len(rows) for _, rows in self.account_rows(account_number))
+
+    def _balance_as_of(self, runs, epoch, inclusive):
+        search = bisect.bisect_right if inclusive else bisect.bisect_left
+        for columns, rows in reversed(runs):
+            i = search(rows, epoch, key=columns.timestamps.__getitem__)
+            if i:
+                return columns.balances[rows[i - 1]]
+        return None
+
+    def balance_at(self, account_number, when):
+        # The balance after the last transaction at or before `when`; None if
+        # the account had not been opened yet.
+        self.get_account(account_number)
+        return self._balance_as_of(self.account_rows(account_number), storage.to_epoch(when), True)
+
+    def statement(self, account_number, start, end):
+        # Opening and closing balances plus the transactions in [start, end],
+        # oldest first: a few bisects and a slice of the account's history.
+        self.get_account(account_number)
+        if storage.to_epoch(end) < storage.to_epoch(start):
+            raise ValidationError("statement must end after it starts")
+        runs = self.account_rows(account_number)
+        return {'account_number': account_number, 'start': start, 'end': end,
+                'opening_balance': self._balance_as_of(runs, storage.to_epoch(start), False) or 0,
+                'closing_balance': self._balance_as_of(runs, storage.to_epoch(end), True) or 0,
+                'transactions': [transaction.to_dict() for transaction in
+                                 self.account_transactions_between(account_number, start, end)]}
+
+    def reconcile(self, incremental=False):
+        # Replays each account's history and checks every recorded
+        # balance_after, then the live balance, against the running total.
+        # Incremental runs start from each account's checkpoint, so only
+        # transactions added since the last run are read. The checkpoint
+        # never moves past a discrepancy, so it is reported again until fixed.
+        discrepancies = []
+        self.wait_for_history()
+        for account_number, account in list(self.accounts.items()):
+            with self._commit_lock:
+                store = self.transactions
+                runs = [(columns, rows, len(rows)) for columns, rows in store.account_rows(account_number)]
+                live_balance = account['balance']
+            count = sum(length for _, _, length in runs)
+            checked, running = self.checkpoints.get(account_number, (0, 0)) if incremental else (0, 0)
+            checkpoint = None
+            seen = 0
+            for columns, rows, length in runs:
+                for i in range(max(checked - seen, 0), length):
+                    row = rows[i]
+                    effect = BALANCE_EFFECT[TRANSACTION_TYPES[columns.types[row]]] * columns.amounts[row]
+                    running += effect
+                    recorded = columns.balances[row]
+                    if running != recorded:
+                        discrepancy = {'account_number': account_number, 'position': row,
+                                       'expected': running, 'recorded': recorded}
+                        if columns is not store:
+                            discrepancy['archive'] = columns.name
+                        discrepancies.append(discrepancy)
+                        if checkpoint is None:
+                            checkpoint = (seen + i, running - effect)
+                        running = recorded
+                seen += length
+            if running != live_balance:
+                discrepancies.append({'account_number': account_number, 'position': None,
+                                      'expected': running, 'recorded': live_balance})
+            self.checkpoints[account_number] = checkpoint or (count, running)
+        return discrepancies
+
+    # --- accounts ----------------------------------------------------------
+
+    def generate_account_number(self):
+        return self.reserve_account_numbers(1, log=False)[0]
+
+    def reserve_account_numbers(self, count, log=True):
+        # Hands out `count` unused numbers in one step, e.g. for a batch of
+        # openings. Logging the allocator's new position keeps a restart from
+        # handing the same numbers out again before they are used.
+        try:
+            numbers = self.allocator.allocate(count, taken=self.accounts)
+        except ExhaustedError as e:
+            raise AccountSpaceExhaustedError(str(e)) from None
+        if log:
+            with self.committing():
+                self.log_operation('reserve', allocator=self.allocator.to_dict())
+        return numbers
+
+    def account_exists(self, account_number):
+        return account_number in self.accounts
+
+    def get_account(self, account_number):
+        try:
+            return self.accounts[account_number]
+        except KeyError:
+            if isinstance(account_number, str) and self.allocator.is_mistyped(account_number):
+                raise MistypedAccountNumberError(account_number) from None
+            raise AccountNotFoundError(account_number) from None
+
+    def find_accounts(self, name=None, account_type=None, min_balance=None, max_balance=None,
+                      created_from=None, created_to=None, limit=100):
+        # Up to `limit` account numbers matching every condition given (see
+        # search.Query). Answered from the search index when the bank has
+        # one, otherwise by scanning every account.
+        if account_type is not None:
+            self.validate_account_type(account_type)
+        if limit < 1:
+            raise ValidationError("limit must be positive")
+        query = Query(name, account_type, min_balance, max_balance, created_from, created_to)
+        if self.search is not None:
+            return self.search.find(query, limit)
+        matches = (account_number for account_number, account in list(self.accounts.items())
+                   if query.matches_account(account))
+        return list(itertools.islice(matches, limit))
+
+    def validate_name(self, name):
+        if not name or not name.strip():
+            raise ValidationError("name is required")
+        return name.strip()
+
+    def validate_account_type(self, account_type):
+        if account_type not in ACCOUNT_TYPES:
+            raise ValidationError("account type must be 'savings' or 'current'")
+        return account_type
+
+    def validate_account_number(self, account_number):
+        # An explicit number must be one the allocator could issue: all
+        # digits with no leading zero, since the transaction store keeps
+        # numbers as integers, and the right length and check digit.
+        if not isinstance(account_number, str) or not self.allocator.is_valid(account_number):
+            raise ValidationError(f"{account_number!r} is not a valid account number")
+        return account_number
+
+    def validate_password(self, password):
+        if len(password) < MIN_PASSWORD_LENGTH:
+            raise ValidationError(f"password must be at least {MIN_PASSWORD_LENGTH} characters long")
+        return password
+
+    def open_account(self, name, initial_deposit, account_type, password, account_number=None):
+        name = self.validate_name(name)
+        check_amount(initial_deposit)
+        if initial_deposit < MIN_OPENING_DEPOSIT:
+            raise InvalidAmountError("minimum opening deposit is $500.00")
+        self.validate_account_type(account_type)
+        self.validate_password(password)
+        if account_number is not None:
+            self.validate_account_number(account_number)
+        now = datetime.datetime.now()
+        account = {
+            'name': name,
+            'balance': initial_deposit,
+            'account_type': account_type,
+            'password': hash_password(password),
+            'created_date': now
+        }
+        with self.committing():
+            if account_number is None:
+                account_number = self.generate_account_number()
+            elif account_number in self.accounts:
+                raise AccountExistsError(account_number)
+            self.accounts[account_number] = account
+            transaction = {
+                'type': 'account_creation',
+                'account_number': account_number,
+                'amount': initial_deposit,
+                'balance_after': initial_deposit,
+                'timestamp': now
+            }
+            self.record_transaction(transaction)
+            if self.search is not None:
+                self.search.refresh(account_number, account)
+            self.log_operation('open', [transaction], account=storage.encode_account(account_number, account),
+                               allocator=self.allocator.to_dict())
+        if not self.journal.batching:
+            self.maybe_compact()
+        return account_number
+
+    def authenticate(self, account_number, password):
+        # Runs the KDF, so it costs tens of milliseconds; callers serving many
+        # clients should run it on a worker thread. A legacy plaintext
+        # password is replaced by its hash on the first successful login.
+        try:
+            account = self.get_account(account_number)
+        except AccountNotFoundError:
+            burn_hash(password)
+            raise
+        stored = account['password']
+        if not verify_password(password, stored):
+            raise AuthenticationError("incorrect password")
+        if not is_hashed(stored):
+            self._replace_password(account_number, stored, hash_password(password))
+        return account
+
+    def issue_token(self, account_number):
+        # For an account that has just authenticated; the token stands in for
+        # the password until it expires or the password changes.
+        return self.tokens.issue(account_number, self.get_account(account_number)['password'])
+
+    def revoke_token(self, token):
+        self.tokens.revoke(token)
+
+    def authenticate_token(self, token):
+        entry = self.tokens.lookup(token)
+        if entry is not None:
+            account_number, credential = entry
+            account = self.accounts.get(account_number)
+            if account is not None and account['password'] == credential:
+                return account_number, account
+        raise AuthenticationError("invalid or expired token")
+
+    def _replace_password(self, account_number, old, new):
+        account = self.get_account(account_number)
+        with self.locked(account_number), self.committing():
+            if account['password'] != old:
+                return False
+            account['password'] = new
+            self.log_operation('update', account_number=account_number, fields={'password': new})
+        return True
+
+    def migrate_passwords(self, workers=4):
+        # Hashes every remaining plaintext password on a thread pool and
+        # journals the results as one batch.
+        plaintext = [(account_number, account['password']) for account_number, account in self.accounts.items()
+                     if not is_hashed(account['password'])]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(hash_password, [password for _, password in plaintext]))
+        migrated = 0
+        with self.journal.batch():
+            for (account_number, password), hashed in zip(plaintext, hashes):
+                migrated += self._replace_password(account_number, password, hashed)
+        return migrated
+
+    def scrub_legacy_copy(self, workers=4):
+        # The original file migrate_legacy_data() keeps holds the plaintext
+        # passwords. Rewrites it with each one hashed; returns how many were.
+        path = self.data_file + ".legacy"
+        if not os.path.exists(path):
+            return 0
+        data = storage.read_legacy_literal(path)
+        accounts = [account for account in data.get('accounts', {}).values()
+                    if isinstance(account.get('password'), str) and not is_hashed(account['password'])]
+        if not accounts:
+            return 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(hash_password, [account['password'] for account in accounts]))
+        for account, hashed in zip(accounts, hashes):
+            account['password'] = hashed
+        storage.write_legacy_literal(path, data)
+        return len(accounts)
+
+    def update_account(self, account_number, name=None, account_type=None, password=None):
+        account = self.get_account(account_number)
+        fields = {}
+        if name:
+            fields['name'] = self.validate_name(name)
+        if account_type:
+            fields['account_type'] = self.validate_account_type(account_type)
+        if password:
+            fields['password'] = hash_password(self.validate_password(password))
+        if fields:
+            with self.locked(account_number), self.committing():
+                account.update(fields)
+                if self.search is not None:
+                    self.search.refresh(account_number, account)
+                self.log_operation('update', account_number=account_number, fields=fields)
+        return fields
+
+    # --- money movement ----------------------------------------------------
+
+    def deposit(self, account_number, amount, idempotency_key=None):
+        account = self.get_account(account_number)
+        check_amount(amount)
+        request = ['deposit', account_number, amount]
+        with self.locked(account_number):
+            result = self.replayed(idempotency_key, request)
+            if result is not None:
+                return result
+            previous_balance = account['balance']
+            balance = previous_balance + amount
+            transaction = {
+                'type': 'deposit',
+                'account_number': account_number,
+                'amount': amount,
+                'balance_after': balance,
+                'timestamp': datetime.datetime.now()
+            }
+            result = {'account_number': account_number, 'amount': amount,
+                      'previous_balance': previous_balance, 'balance': balance}
+            self.commit('deposit', [transaction], [(account, balance)], result=result,
+                        idempotency=(idempotency_key, request) if idempotency_key else None)
+        return result
+
+    def withdraw(self, account_number, amount, idempotency_key=None):
+        account = self.get_account(account_number)
+        check_amount(amount)
+        request = ['withdraw', account_number, amount]
+        if self.rules is not None:
+            # Seeding reads history, which may wait for a lazy load; no
+            # account lock is held meanwhile.
+            self.rules.prepare(account_number)
+        with self.locked(account_number):
+            result = self.replayed(idempotency_key, request)
+            if result is not None:
+                return result
+            previous_balance = account['balance']
+            available = previous_balance - self.held.get(account_number, 0)
+            if available < amount:
+                raise InsufficientFundsError(account_number, available, amount)
+            if self.rules is not None:
+                rule_ticket = self.rules.check('withdraw', account_number, amount)
+            balance = previous_balance - amount
+            transaction = {
+                'type': 'withdrawal',
+                'account_number': account_number,
+                'amount': amount,
+                'balance_after': balance,
+                'timestamp': datetime.datetime.now()
+            }
+            result = {'account_number': account_number, 'amount': amount,
+                      'previous_balance': previous_balance, 'balance': balance}
+            self.commit('withdraw', [transaction], [(account, balance)], result=result,
+                        idempotency=(idempotency_key, request) if idempotency_key else None)
+            if self.rules is not None:
+                self.rules.record(rule_ticket)
+        return result
+
+    def transfer(self, account_number, target_account, amount, idempotency_key=None, scheduled=False):
+        # scheduled=True is the scheduler paying a standing order; its key
+        # goes in the scheduler's own index.
+        sender = self.get_account(account_number)
+        recipient = self.get_account(target_account)
+        if target_account == account_number:
+            raise ValidationError("cannot transfer money to the same account")
+        check_amount(amount)
+        request = ['transfer', account_number, target_account, amount]
+        if self.rules is not None:
+            self.rules.prepare(account_number)
+        with self.locked(account_number, target_account):
+            result = self.replayed(idempotency_key, request, scheduled)
+            if result is not None:
+                return result
+            available = sender['balance'] - self.held.get(account_number, 0)
+            if available < amount:
+                raise InsufficientFundsError(account_number, available, amount)
+            if self.rules is not None:
+                rule_ticket = self.rules.check('transfer', account_number, amount, target_account)
+            sender_balance = sender['balance'] - amount
+            recipient_balance = recipient['balance'] + amount
+            now = datetime.datetime.now()
+            outgoing = {
+                'type': 'transfer_out',
+                'account_number': account_number,
+                'target_account': target_account,
+                'amount': amount,
+                'balance_after': sender_balance,
+                'timestamp': now
+            }
+            incoming = {
+                'type': 'transfer_in',
+                'account_number': target_account,
+                'source_account': account_number,
+                'amount': amount,
+                'balance_after': recipient_balance,
+                'timestamp': now
+            }
+            result = {'account_number': account_number, 'target_account': target_account, 'amount': amount,
+                      'balance': sender_balance, 'target_balance': recipient_balance}
+            self.commit('transfer', [outgoing, incoming],
+                        [(sender, sender_balance), (recipient, recipient_balance)], result=result,
+                        idempotency=(idempotency_key, request) if idempotency_key else None, scheduled=scheduled)
+            if self.rules is not None:
+                self.rules.record(rule_ticket)
+        return result
+
+    def history(self, account_number, offset=0, limit=None, newest_first=True):
+        self.get_account(account_number)
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValidationError("offset and limit must not be negative")
+        return [transaction.to_dict() for transaction in
+                self.iter_account_transactions(account_number, newest_first, offset, limit)]
+
+    # --- interest ----------------------------------------------------------
+
+    def post_interest(self, postings, period_end, chunk_size=10000):
+        # postings is an iterable of (account_number, cents) pairs, as
+        # computed by interest.accrue(). Each account remembers the period
+        # end it has been paid through, so re-running a posting cut short by
+        # a crash pays only the accounts it missed. The run is a single
+        # journal batch with one fsync; each chunk is one journal record.
+        period_end = storage.to_epoch(period_end)
+        if period_end > storage.to_epoch(datetime.datetime.now()):
+            raise ValidationError("cannot post interest for a period that has not ended")
+        posted = 0
+        postings = iter(postings)
+        with self.journal.batch():
+            while True:
+                chunk = list(itertools.islice(postings, chunk_size))
+                if not chunk:
+                    break
+                with self.locked(*(account_number for account_number, _ in chunk)):
+                    # Stamped under the locks, like every other operation, so
+                    # an account's transactions stay in timestamp order.
+                    now = datetime.datetime.now()
+                    transactions = []
+                    balances = []
+                    for account_number, amount in chunk:
+                        account = self.get_account(account_number)
+                        if account.get('interest_through', 0) >= period_end:
+                            continue
+                        balance = account['balance'] + check_amount(amount)
+                        transactions.append({
+                            'type': 'interest',
+                            'account_number': account_number,
+                            'amount': amount,
+                            'balance_after': balance,
+                            'timestamp': now
+                        })
+                        balances.append((account, balance))
+                    if transactions:
+                        self.commit('interest', transactions, balances,
+                                    [(account, {'interest_through': period_end}) for account, _ in balances],
+                                    period_end=period_end)
+                        posted += len(transactions)
+        self.maybe_compact()
+        return posted
+
+    # --- two-phase transfers -----------------------------------------------
+    #
+    # Used when the two sides of a transfer live in different Banks (see
+    # sharding.py). prepare_* durably records one side and, for the debit,
+    # holds the funds back; commit_prepared and abort_prepared resolve it.
+    # Both resolutions are no-ops for an unknown txid, so a coordinator can
+    # safely repeat them during recovery.
+
+    def _hold(self, txid, prepared):
+        self.prepared[txid] = prepared
+        if prepared['side'] == 'debit':
+            account_number = prepared['account_number']
+            self.held[account_number] = self.held.get(account_number, 0) + prepared['amount']
+
+    def _release(self, txid):
+        prepared = self.prepared.pop(txid, None)
+        if prepared is not None and prepared['side'] == 'debit':
+            account_number = prepared['account_number']
+            self.held[account_number] -= prepared['amount']
+            if not self.held[account_number]:
+                del self.held[account_number]
+        return prepared
+
+    def prepare_debit(self, txid, account_number, amount, target_account):
+        account = self.get_account(account_number)
+        check_amount(amount)
+        if self.rules is not None:
+            self.rules.prepare(account_number)
+        with self.locked(account_number):
+            available = account['balance'] - self.held.get(account_number, 0)
+            if available < amount:
+                raise InsufficientFundsError(account_number, available, amount)
+            if self.rules is not None:
+                rule_ticket = self.rules.check('transfer', account_number, amount, target_account)
+            self._prepare(txid, {'side': 'debit', 'account_number': account_number,
+                                 'amount': amount, 'counterparty': target_account})
+            if self.rules is not None:
+                self.rules.record(rule_ticket)
+        return txid
+
+    def prepare_credit(self, txid, account_number, amount, source_account):
+        self.get_account(account_number)
+        check_amount(amount)
+        with self.locked(account_number):
+            self._prepare(txid, {'side': 'credit', 'account_number': account_number,
+                                 'amount': amount, 'counterparty': source_account})
+        return txid
+
+    def _prepare(self, txid, prepared):
+        with self.committing():
+            self._hold(txid, prepared)
+            self.log_operation('prepare', txid=txid, **prepared)
+        # A participant's vote must survive a crash before it is given.
+        self.journal.sync()
+
+    def commit_prepared(self, txid):
+        prepared = self.prepared.get(txid)
+        if prepared is None:
+            return None
+        account_number = prepared['account_number']
+        account = self.accounts[account_number]
+        with self.locked(account_number):
+            amount = prepared['amount']
+            if prepared['side'] == 'debit':
+                balance = account['balance'] - amount
+                transaction = {'type': 'transfer_out', 'account_number': account_number,
+                               'target_account': prepared['counterparty']}
+            else:
+                balance = account['balance'] + amount
+                transaction = {'type': 'transfer_in', 'account_number': account_number,
+                               'source_account': prepared['counterparty']}
+            transaction.update(amount=amount, balance_after=balance, timestamp=datetime.datetime.now())
+            with self.committing():
+                if self._release(txid) is None:
+                    return None
+                account['balance'] = balance
+                self.record_transaction(transaction)
+                if self.search is not None:
+                    self.search.refresh(account_number, account)
+                self.log_operation('commit_prepared', [transaction], txid=txid)
+        if not self.journal.batching:
+            self.maybe_compact()
+        return {'account_number': account_number, 'balance': balance,
+                'transaction_id': transaction['transaction_id']}
+
+    def abort_prepared(self, txid):
+        with self.committing():
+            if self._release(txid) is None:
+                return False
+            self.log_operation('abort', txid=txid)
+        return True
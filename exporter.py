@@ -0,0 +1,296 @@
+# Streaming export of transaction history to CSV or JSONL.
+#
+#   python exporter.py --account 1234567 [--start 2026-01-01] [--end 2026-06-30T23:59:59]
+#                      [--types deposit,withdrawal] [--format csv] --output statement.csv
+#   python exporter.py --all [--workers 4] [--format jsonl] --output-dir export/
+#
+# Rows come from generators and are written --chunk-size at a time, so
+# memory stays flat however long the history is. A single account's rows
+# are read from the loaded bank through its per-account index, with the
+# date range found by bisecting on time.
+#
+# The whole-bank export is for regulatory dumps. It reads the archive
+# segments, the snapshot and the journal tail straight from disk, read-only
+# and without loading the bank. Each worker process takes an equal share of
+# every one of them, segments by row and the snapshot's transaction section
+# and the journal files by byte offset, so every line is parsed by exactly
+# one worker, and writes its own part file. manifest.json lists the parts
+# and their row counts. The files are read as they are when the export
+# starts, so for a point-in-time dump run it against a quiet data file.
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import storage
+from archive import Segment
+from core import Bank, BankError, ValidationError
+from money import format_money, to_cents
+from txstore import COUNTERPARTY_KEYS, DESCRIPTIONS, NO_ACCOUNT, NO_ID, TRANSACTION_TYPES, TYPE_CODES
+
+FIELDS = ('transaction_id', 'timestamp', 'account_number', 'type', 'amount', 'balance_after',
+          'counterparty', 'description')
+FORMATS = ('csv', 'jsonl')
+
+
+def export_row(transaction_id, timestamp, account_number, transaction_type, amount, balance, counterparty):
+    return (transaction_id or None,
+            datetime.datetime.fromtimestamp(timestamp).isoformat(),
+            str(account_number), transaction_type, format_money(amount), format_money(balance),
+            None if counterparty in (None, NO_ACCOUNT) else str(counterparty),
+            DESCRIPTIONS[transaction_type].format(amount=format_money(amount), counterparty=counterparty))
+
+
+def column_row(columns, row):
+    return export_row(columns.ids[row], columns.timestamps[row], columns.accounts[row],
+                      TRANSACTION_TYPES[columns.types[row]], columns.amounts[row], columns.balances[row],
+                      columns.counterparties[row])
+
+
+def record_row(record, timestamp):
+    # A transaction as stored in a snapshot or journal record.
+    counterparty_key = COUNTERPARTY_KEYS.get(record['type'])
+    return export_row(record.get('transaction_id', NO_ID), timestamp, record['account_number'], record['type'],
+                      to_cents(record['amount']), to_cents(record['balance_after']),
+                      record.get(counterparty_key) if counterparty_key else None)
+
+
+def record_rows(records, selection):
+    for record in records:
+        timestamp = record['timestamp']
+        if isinstance(timestamp, str):
+            # Journals written before the v2 format carry ISO strings.
+            timestamp = storage.to_epoch(storage.to_datetime(timestamp))
+        if selection.matches(timestamp, TYPE_CODES[record['type']]):
+            yield record_row(record, timestamp)
+
+
+class Filter:
+    # Which rows to export: a time range [start, end] and a set of
+    # transaction types. None means any.
+    def __init__(self, start=None, end=None, types=None):
+        self.start = None if start is None else storage.to_epoch(start)
+        self.end = None if end is None else storage.to_epoch(end)
+        self.types = None if types is None else {TYPE_CODES[t] for t in types}
+
+    def covers(self, first, last):
+        return (self.start is None or last >= self.start) and (self.end is None or first <= self.end)
+
+    def matches(self, timestamp, type_code):
+        return ((self.start is None or timestamp >= self.start) and (self.end is None or timestamp <= self.end)
+                and (self.types is None or type_code in self.types))
+
+
+def parse_types(text):
+    types = [t.strip() for t in text.split(',') if t.strip()]
+    unknown = [t for t in types if t not in TRANSACTION_TYPES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown transaction types {', '.join(unknown)}; "
+                              f"expected some of {', '.join(TRANSACTION_TYPES)}")
+    return types
+
+
+# --- rows from a loaded bank -------------------------------------------------
+
+def account_rows(bank, account_number, selection):
+    for transaction in bank.account_transactions_between(account_number, selection.start, selection.end):
+        columns, row = transaction.store, transaction.position
+        if selection.types is None or columns.types[row] in selection.types:
+            yield column_row(columns, row)
+
+
+# --- rows straight from the data files ---------------------------------------
+
+def columns_rows(columns, rows, selection):
+    timestamps, types = columns.timestamps, columns.types
+    for row in rows:
+        if selection.matches(timestamps[row], types[row]):
+            yield column_row(columns, row)
+
+
+def file_lines(path, start, end):
+    # The complete lines of a file that start in bytes [start, end). Slices
+    # that tile a file read every line once: a line that straddles `start`
+    # belongs to the slice before. Stops at a torn tail still being written.
+    with open(path, 'rb') as f:
+        position = start
+        if start > 0:
+            f.seek(start - 1)
+            position += len(f.readline()) - 1
+        while position < end:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                break
+            position += len(line)
+            yield line
+
+
+def data_sources(data_file, selection):
+    # What a whole-bank export reads, oldest first, as (kind, path, start,
+    # end) tuples: archive segments by row, then the snapshot's transaction
+    # section and the journal files by byte offset. Also returns the
+    # snapshot's journal LSN, below which journal records are already in it.
+    if storage.is_legacy_file(data_file):
+        raise ValidationError(f"{data_file} is in the old format; open it with the bank once to upgrade it")
+    with storage.SnapshotReader(data_file) as reader:
+        header = reader.header
+    sources = []
+    archive_dir = data_file + ".archive"
+    for name in header.get('segments', ()):
+        segment = Segment(os.path.join(archive_dir, name))
+        if selection.covers(segment.first_timestamp, segment.last_timestamp):
+            sources.append(('segment', segment.path, 0, len(segment)))
+    with open(data_file, 'rb') as f:
+        # Past the header and the accounts to the first transaction.
+        for _ in range(1 + header['accounts']):
+            f.readline()
+        sources.append(('snapshot', data_file, f.tell(), os.fstat(f.fileno()).st_size))
+    path = data_file + ".journal"
+    for part in (path + ".sealed", path):
+        if os.path.exists(part):
+            sources.append(('journal', part, 0, os.path.getsize(part)))
+    return header['journal_lsn'], sources
+
+
+def share(sources, part, parts):
+    # Part `part` of `parts`: the same fraction of every source.
+    return [(kind, path, start + (end - start) * part // parts, start + (end - start) * (part + 1) // parts)
+            for kind, path, start, end in sources]
+
+
+def source_rows(sources, snapshot_lsn, selection):
+    for kind, path, start, end in sources:
+        if kind == 'segment':
+            yield from columns_rows(Segment(path), range(start, end), selection)
+        elif kind == 'snapshot':
+            yield from record_rows(map(json.loads, file_lines(path, start, end)), selection)
+        else:
+            for line in file_lines(path, start, end):
+                # Like Journal.replay, but never truncates a bad tail:
+                # another process may still be writing it.
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get('lsn', 0) > snapshot_lsn:
+                    yield from record_rows(record.get('transactions', ()), selection)
+
+
+# --- writing -----------------------------------------------------------------
+
+def write_rows(rows, path, file_format='csv', chunk_size=10000):
+    # Writes to a temporary file renamed into place once complete; returns
+    # the number of rows written.
+    if file_format not in FORMATS:
+        raise ValidationError(f"unknown export format {file_format!r}")
+    count = 0
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8', newline='', buffering=1 << 20) as f:
+            writer = csv.writer(f) if file_format == 'csv' else None
+            if writer is not None:
+                writer.writerow(FIELDS)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                if writer is not None:
+                    writer.writerows(chunk)
+                else:
+                    f.write(''.join(json.dumps(dict(zip(FIELDS, row)), separators=(',', ':')) + '\n'
+                                    for row in chunk))
+                count += len(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+    return count
+
+
+def export_account(bank, account_number, path, file_format='csv', start=None, end=None, types=None,
+                   chunk_size=10000):
+    bank.get_account(account_number)
+    return write_rows(account_rows(bank, account_number, Filter(start, end, types)), path, file_format,
+                      chunk_size)
+
+
+def export_part(path, file_format, sources, snapshot_lsn, start, end, types, chunk_size):
+    rows = source_rows(sources, snapshot_lsn, Filter(start, end, types))
+    return path, write_rows(rows, path, file_format, chunk_size)
+
+
+def export_bank(data_file, directory, file_format='csv', workers=4, start=None, end=None, types=None,
+                chunk_size=10000):
+    # Returns the manifest, also written to directory/manifest.json.
+    os.makedirs(directory, exist_ok=True)
+    snapshot_lsn, sources = data_sources(data_file, Filter(start, end, types))
+    parts = max(1, workers)
+    jobs = [(os.path.join(directory, f"part-{i:05d}.{file_format}"), file_format, share(sources, i, parts),
+             snapshot_lsn, start, end, types, chunk_size) for i in range(parts)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(export_part, *zip(*jobs)))
+    else:
+        results = [export_part(*job) for job in jobs]
+    manifest = {
+        'data_file': os.path.abspath(data_file),
+        'exported_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'format': file_format,
+        'filters': {'start': start and storage.to_datetime(storage.to_epoch(start)).isoformat(),
+                    'end': end and storage.to_datetime(storage.to_epoch(end)).isoformat(), 'types': types},
+        'parts': [{'file': os.path.basename(path), 'rows': rows} for path, rows in results],
+        'rows': sum(rows for _, rows in results),
+    }
+    with open(os.path.join(directory, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def parse_time(text):
+    return datetime.datetime.fromisoformat(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export transaction history to CSV or JSONL.")
+    parser.add_argument('--data-file', default="bank_data.txt")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--account', help="export this account's history")
+    target.add_argument('--all', action='store_true', help="export the whole bank, in parallel parts")
+    parser.add_argument('--start', type=parse_time, help="ISO date or time, inclusive")
+    parser.add_argument('--end', type=parse_time, help="ISO date or time, inclusive")
+    parser.add_argument('--types', type=parse_types, help="comma-separated transaction types")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--output', help="output file for --account")
+    parser.add_argument('--output-dir', default="export", help="output directory for --all")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        if args.account:
+            bank = Bank(args.data_file)
+            output = args.output or f"statement-{args.account}.{args.format}"
+            try:
+                rows = export_account(bank, args.account, output, args.format, args.start, args.end, args.types,
+                                      args.chunk_size)
+            finally:
+                bank.journal.close()
+            report = {'output': output, 'rows': rows}
+        else:
+            manifest = export_bank(args.data_file, args.output_dir, args.format, args.workers, args.start,
+                                   args.end, args.types, args.chunk_size)
+            report = {'output_dir': args.output_dir, 'parts': len(manifest['parts']), 'rows': manifest['rows']}
+    except BankError as e:
+        parser.exit(1, f"❌ {e}\n")
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# Velocity rules on money leaving an account, checked inline by withdraw,
+# transfer and prepare_debit before they commit:
+#
+#   rules = RuleEngine([VelocityRule('daily_outflow', 86400, max_amount=1000000, max_count=50),
+#                       NewRecipientRule('new_payees', 3600, max_count=3)])
+#   bank = Bank("bank_data.txt", rules=rules)
+#
+# or from a JSON file (amounts in dollars, windows in seconds):
+#
+#   [{"rule": "velocity", "name": "daily_outflow", "window": 86400, "max_amount": "10000", "max_count": 50},
+#    {"rule": "new_recipients", "name": "new_payees", "window": 3600, "max_count": 3}]
+#
+# Each account keeps, per rule, a deque of its recent (time, amount) events
+# and their running total. A check drops the events that have left the
+# window from the front and compares the totals, so it costs O(1) amortised
+# and never looks at the transaction store. An account's windows, and the
+# recipients it has paid before, are seeded from its own history through
+# the per-account index before it is first checked, so limits carry over
+# a restart. The bank calls prepare() for that before taking the account's
+# lock, as seeding may wait for a lazy history load.
+#
+# A check and its record happen under the account's lock, so two
+# operations on one account cannot both slip under a limit. A prepared
+# cross-shard debit counts as soon as it is prepared, even if it is later
+# aborted.
+import json
+import time
+from collections import deque
+
+from core import RuleViolationError, ValidationError
+from money import format_money, parse_amount
+from txstore import TRANSACTION_TYPES, TYPE_CODES
+
+# Operation -> the history row it leaves on the debited account.
+OPERATION_TYPES = {'withdraw': 'withdrawal', 'transfer': 'transfer_out'}
+
+
+class Window:
+    __slots__ = ('events', 'total')
+
+    def __init__(self):
+        self.events = deque()
+        self.total = 0
+
+    def expire(self, cutoff):
+        events = self.events
+        while events and events[0][0] <= cutoff:
+            self.total -= events.popleft()[1]
+
+    def add(self, timestamp, amount):
+        self.events.append((timestamp, amount))
+        self.total += amount
+
+
+class VelocityRule:
+    # At most max_count operations, and max_amount cents in total, out of
+    # an account in any `window` seconds.
+    counted = "operations"
+
+    def __init__(self, name, window, max_amount=None, max_count=None, operations=('withdraw', 'transfer')):
+        if max_amount is None and max_count is None:
+            raise ValidationError(f"rule {name} needs max_amount or max_count")
+        unknown = set(operations) - set(OPERATION_TYPES)
+        if unknown:
+            raise ValidationError(f"rule {name} has unknown operations {', '.join(sorted(unknown))}")
+        self.name = name
+        self.window = window
+        self.max_amount = max_amount
+        self.max_count = max_count
+        self.operations = frozenset(operations)
+
+    def applies(self, operation, target, known):
+        return operation in self.operations
+
+    def check(self, window, amount):
+        if self.max_count is not None and len(window.events) >= self.max_count:
+            return f"more than {self.max_count} {self.counted} in {self.window} seconds"
+        if self.max_amount is not None and window.total + amount > self.max_amount:
+            return f"more than ${format_money(self.max_amount)} of {self.counted} in {self.window} seconds"
+        return None
+
+    def seed(self, history):
+        # history yields (timestamp, type, amount, counterparty) rows of the
+        # account, oldest first.
+        types = {OPERATION_TYPES[operation] for operation in self.operations}
+        return [(timestamp, amount) for timestamp, kind, amount, _ in history if kind in types]
+
+
+class NewRecipientRule(VelocityRule):
+    # At most max_count transfers, and max_amount cents in total, to
+    # accounts this account had never paid before, in any `window` seconds.
+    counted = "transfers to new recipients"
+
+    def __init__(self, name, window, max_amount=None, max_count=None):
+        super().__init__(name, window, max_amount, max_count, ('transfer',))
+
+    def applies(self, operation, target, known):
+        return operation == 'transfer' and target not in known
+
+    def seed(self, history):
+        events = []
+        known = set()
+        for timestamp, kind, amount, counterparty in history:
+            if kind == 'transfer_out':
+                if counterparty not in known:
+                    events.append((timestamp, amount))
+                known.add(counterparty)
+        return events
+
+
+RULE_CLASSES = {'velocity': VelocityRule, 'new_recipients': NewRecipientRule}
+
+
+class AccountState:
+    __slots__ = ('windows', 'known')
+
+    def __init__(self, windows, known):
+        self.windows = windows
+        self.known = known
+
+
+class RuleEngine:
+    def __init__(self, rules, clock=time.time):
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValidationError("rule names must be unique")
+        self.rules = list(rules)
+        self.clock = clock
+        self.bank = None
+        self._accounts = {}
+        self.violations = dict.fromkeys(names, 0)
+
+    def attach(self, bank):
+        self.bank = bank
+
+    def _seed(self, account_number):
+        # Reads the account's outgoing history once: the counterparties it
+        # has paid and, per rule, the events still inside its window.
+        history = []
+        if self.bank is not None:
+            outgoing = {TYPE_CODES[kind] for kind in OPERATION_TYPES.values()}
+            for columns, rows in self.bank.account_rows(account_number):
+                for row in rows:
+                    code = columns.types[row]
+                    if code in outgoing:
+                        history.append((columns.timestamps[row], TRANSACTION_TYPES[code], columns.amounts[row],
+                                        str(columns.counterparties[row])))
+        known = {counterparty for _, kind, _, counterparty in history if kind == 'transfer_out'}
+        windows = []
+        now = self.clock()
+        for rule in self.rules:
+            window = Window()
+            for timestamp, amount in rule.seed(history):
+                if timestamp > now - rule.window:
+                    window.add(timestamp, amount)
+            windows.append(window)
+        return AccountState(windows, known)
+
+    def prepare(self, account_number):
+        # Seeds the account's state if it has none yet. Two threads may seed
+        # at once; the first to finish wins, so events recorded into it are
+        # never replaced.
+        if account_number not in self._accounts:
+            self._accounts.setdefault(account_number, self._seed(account_number))
+
+    def check(self, operation, account_number, amount, target=None):
+        # Raises RuleViolationError if the operation would break a rule.
+        # Otherwise returns a ticket to pass to record() once the operation
+        # has committed.
+        now = self.clock()
+        state = self._accounts.get(account_number)
+        if state is None:
+            state = self._accounts.setdefault(account_number, self._seed(account_number))
+        known = state.known
+        applied = []
+        for rule, window in zip(self.rules, state.windows):
+            if rule.applies(operation, target, known):
+                window.expire(now - rule.window)
+                reason = rule.check(window, amount)
+                if reason is not None:
+                    self.violations[rule.name] += 1
+                    raise RuleViolationError(account_number, rule.name, reason)
+                applied.append(window)
+        return now, state, applied, amount, target
+
+    def record(self, ticket):
+        now, state, applied, amount, target = ticket
+        for window in applied:
+            window.add(now, amount)
+        if target is not None:
+            state.known.add(target)
+
+
+def rule_from_dict(spec):
+    spec = dict(spec)
+    kind = spec.pop('rule', None)
+    if kind not in RULE_CLASSES:
+        raise ValidationError(f"unknown rule {kind!r}; expected one of {', '.join(RULE_CLASSES)}")
+    if 'max_amount' in spec:
+        spec['max_amount'] = parse_amount(str(spec['max_amount']))
+    try:
+        return RULE_CLASSES[kind](**spec)
+    except TypeError as e:
+        raise ValidationError(f"bad {kind} rule: {e}") from None
+
+
+def load_rules(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [rule_from_dict(spec) for spec in json.load(f)]
@@ -0,0 +1,58 @@
+# Caller-supplied idempotency keys. A client that retries a deposit,
+# withdrawal or transfer after a timeout sends the same key again; the
+# bank then returns the original result instead of applying it twice.
+#
+# The index remembers, per key, the request it was first used for and that
+# request's result. Entries are kept in the order they were added, so the
+# oldest is always first: lookups are a dictionary hit, and eviction, once
+# an entry is past `ttl` seconds or the index is over `capacity`, pops from
+# the front. Creation times are wall-clock epoch seconds so they stay
+# meaningful across a restart, when the index is rebuilt from the snapshot
+# and the journal. With ttl=None entries only ever leave by capacity.
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyIndex:
+    def __init__(self, capacity=100000, ttl=86400):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (request, result) for a live key, else None.
+        with self._lock:
+            self._evict(time.time())
+            entry = self._entries.get(key)
+            return None if entry is None else entry[1:]
+
+    def add(self, key, request, result, created=None):
+        created = time.time() if created is None else created
+        with self._lock:
+            self._entries[key] = (created, list(request), result)
+            self._entries.move_to_end(key)
+            self._evict(time.time())
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            key, (created, _, _) = next(iter(entries.items()))
+            if len(entries) <= self.capacity and (self.ttl is None or created + self.ttl >= now):
+                break
+            del entries[key]
+
+    def to_list(self):
+        with self._lock:
+            return [[key, created, request, result] for key, (created, request, result) in self._entries.items()]
+
+    def restore(self, entries):
+        for key, created, request, result in entries:
+            self.add(key, request, result, created)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,185 @@
+# Month-end interest for savings accounts.
+#
+#   python interest.py [--data-file bank_data.txt] [--month 2026-09] [--tiers 0:3,10000:3.5] [--post]
+#
+# Interest is paid on the average daily balance over the period. Each day
+# counts the account's balance at the end of that day, read back from the
+# transaction history. The account earns the rate of the highest tier its
+# average reaches. Without --post the accruals are only reported.
+#
+# With NumPy installed the calculation runs over the transaction store's
+# columns in a few array passes. Without it, a per-account loop gives
+# identical results, more slowly.
+import argparse
+import bisect
+import datetime
+import json
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import storage
+from core import Bank
+from money import parse_amount, format_money
+
+SECONDS_PER_DAY = 86400
+DAYS_PER_YEAR = 365
+# (minimum average daily balance in cents, annual rate), ascending.
+DEFAULT_TIERS = ((0, 0.03),)
+
+
+def rate_for(balance, tiers=DEFAULT_TIERS):
+    index = bisect.bisect_right([minimum for minimum, _ in tiers], balance)
+    return tiers[index - 1][1] if index else 0.0
+
+
+def interest_on(balance_seconds, period_seconds, tiers=DEFAULT_TIERS):
+    rate = rate_for(balance_seconds / period_seconds, tiers)
+    return round(balance_seconds * rate / (DAYS_PER_YEAR * SECONDS_PER_DAY))
+
+
+def previous_month(today=None):
+    today = today or datetime.date.today()
+    end = datetime.datetime(today.year, today.month, 1)
+    start = (end - datetime.timedelta(days=1)).replace(day=1)
+    return start, end
+
+
+def balance_seconds(bank, account_number, start, end):
+    # End-of-day balance times seconds, summed over [start, end). A
+    # transaction's balance_after holds from the start of its day until the
+    # start of the day of the account's next transaction.
+    total = 0
+    begin = balance = None
+    for columns, rows in bank.account_rows(account_number):
+        first = bisect.bisect_left(rows, start, key=columns.timestamps.__getitem__)
+        for i in range(max(first - 1, 0), len(rows)):
+            row = rows[i]
+            day = start + (columns.timestamps[row] - start) // SECONDS_PER_DAY * SECONDS_PER_DAY
+            if day >= end:
+                break
+            day = max(day, start)
+            if begin is not None:
+                total += balance * (day - begin)
+            begin, balance = day, columns.balances[row]
+    if begin is not None:
+        total += balance * (end - begin)
+    return total
+
+
+def accrue_by_account(bank, accounts, start, end, tiers):
+    return [interest_on(balance_seconds(bank, account_number, start, end), end - start, tiers)
+            for account_number in accounts]
+
+
+def accrue_by_columns(bank, accounts, start, end, tiers):
+    # The same calculation as balance_seconds, for every account at once.
+    # The in-memory columns are copied up to the current length, so
+    # transactions committed meanwhile are simply not seen. Archive segments
+    # are read in place; from one that ends before the period only each
+    # account's last row matters, as it carries the opening balance.
+    bank.wait_for_history()
+    store = bank.transactions
+    count = len(store)
+    if not accounts:
+        return []
+    parts = []
+    for segment in store.segments:
+        columns = [numpy.frombuffer(getattr(segment, name), dtype=numpy.int64)
+                   for name in ('accounts', 'timestamps', 'balances')]
+        if segment.last_timestamp < start:
+            last_rows = numpy.frombuffer(segment.index_starts, dtype=numpy.int64)[1:] - 1
+            columns = [column[last_rows] for column in columns]
+        parts.append(columns)
+    parts.append([numpy.frombuffer(getattr(store, name)[:count], dtype=numpy.int64)
+                  for name in ('accounts', 'timestamps', 'balances')])
+    owners, times, balances = (numpy.concatenate(column) for column in zip(*parts))
+    if not len(owners):
+        return [0] * len(accounts)
+
+    # Group by account, keeping each account's history in order.
+    order = numpy.argsort(owners, kind='stable')
+    owners, times, balances = owners[order], times[order], balances[order]
+    firsts = numpy.flatnonzero(numpy.r_[True, owners[1:] != owners[:-1]])
+
+    begins = numpy.clip(start + (times - start) // SECONDS_PER_DAY * SECONDS_PER_DAY, start, end)
+    finishes = numpy.append(begins[1:], end)
+    finishes[firsts[1:] - 1] = end
+    totals = numpy.add.reduceat(balances * (finishes - begins), firsts)
+    owners = owners[firsts]
+
+    codes = numpy.fromiter(map(int, accounts), dtype=numpy.int64, count=len(accounts))
+    found = numpy.minimum(numpy.searchsorted(owners, codes), len(owners) - 1)
+    totals = numpy.where(owners[found] == codes, totals[found], 0)
+
+    thresholds = numpy.array([minimum for minimum, _ in tiers])
+    rates = numpy.array([0.0] + [rate for _, rate in tiers])
+    rates = rates[numpy.searchsorted(thresholds, totals / (end - start), side='right')]
+    return numpy.rint(totals * rates / (DAYS_PER_YEAR * SECONDS_PER_DAY)).astype(numpy.int64).tolist()
+
+
+def accrue(bank, start, end, tiers=DEFAULT_TIERS, vectorized=None):
+    # Returns (account_number, cents) for every savings account that earned
+    # interest over [start, end).
+    start, end = storage.to_epoch(start), storage.to_epoch(end)
+    if end <= start:
+        raise ValueError("interest period must end after it starts")
+    if vectorized is None:
+        vectorized = numpy is not None
+    accounts = [account_number for account_number, account in bank.accounts.items()
+                if account['account_type'] == 'savings']
+    calculate = accrue_by_columns if vectorized else accrue_by_account
+    return [(account_number, amount) for account_number, amount in
+            zip(accounts, calculate(bank, accounts, start, end, tiers)) if amount > 0]
+
+
+def parse_tiers(text):
+    # "0:3,10000:3.5" -> minimum balance in dollars : annual rate in percent
+    tiers = []
+    for tier in text.split(','):
+        minimum, _, rate = tier.partition(':')
+        tiers.append((parse_amount(minimum.strip()), float(rate) / 100))
+    return tuple(sorted(tiers))
+
+
+def parse_month(text):
+    start = datetime.datetime.strptime(text, "%Y-%m")
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accrue and post month-end interest on savings accounts.")
+    parser.add_argument('--data-file', default="bank_data.txt")
+    parser.add_argument('--month', help="YYYY-MM, default the previous calendar month")
+    parser.add_argument('--tiers', help="comma-separated minimum_dollars:annual_percent, default 0:3")
+    parser.add_argument('--post', action='store_true', help="credit the interest instead of only reporting it")
+    parser.add_argument('--python', action='store_true', help="use the per-account loop even if NumPy is available")
+    args = parser.parse_args()
+
+    start, end = parse_month(args.month) if args.month else previous_month()
+    tiers = parse_tiers(args.tiers) if args.tiers else DEFAULT_TIERS
+    bank = Bank(args.data_file)
+    vectorized = numpy is not None and not args.python
+    started = time.perf_counter()
+    postings = accrue(bank, start, end, tiers, vectorized)
+    report = {
+        'period': [start.date().isoformat(), end.date().isoformat()],
+        'engine': 'numpy' if vectorized else 'python',
+        'accounts': len(postings),
+        'total_interest': format_money(sum(amount for _, amount in postings)),
+        'accrual_seconds': round(time.perf_counter() - started, 3),
+    }
+    if args.post:
+        started = time.perf_counter()
+        report['posted'] = bank.post_interest(postings, end)
+        report['posting_seconds'] = round(time.perf_counter() - started, 3)
+    bank.journal.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Journal:
+    def __init__(self, path, group_size=64, group_interval=0.05):
+        self.path = path
+        self.sealed_path = path + ".sealed"
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.lsn = 0
+        self.records = 0
+        self._pending = 0
+        # When the oldest record not yet fsynced was appended, None if none.
+        self._oldest_pending = None
+        self._file = None
+        # Batches belong to the thread that opened them: other threads'
+        # appends still reach the OS at once while one is open.
+        self._local = threading.local()
+        # _lock guards the file and counters; _sync_lock is held for a whole
+        # fsync, so appends carry on while one runs. Take _sync_lock first.
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._flusher = None
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+
+    def replay(self, after_lsn=0):
+        # Yields every complete record written after the given LSN, starting
+        # with a sealed segment left behind by an interrupted snapshot.
+        self.lsn = max(self.lsn, after_lsn)
+        for path in (self.sealed_path, self.path):
+            yield from self._replay_file(path, after_lsn)
+
+    def _replay_file(self, path, after_lsn):
+        # A torn final line (crash mid-write) is cut off so new appends start
+        # clean.
+        if not os.path.exists(path):
+            return
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                good_offset += len(line)
+                self.records += 1
+                lsn = record.get('lsn', 0)
+                if lsn <= after_lsn:
+                    continue
+                self.lsn = max(self.lsn, lsn)
+                yield record
+        if good_offset != os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+
+    def open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        if self._flusher is None or not self._flusher.is_alive():
+            self._closed.clear()
+            self._flusher = threading.Thread(target=self._flush_pending, name="journal-flusher", daemon=True)
+            self._flusher.start()
+
+    def append(self, record, defer_sync=False):
+        # Every record reaches the OS immediately (outside a batch); fsync is
+        # grouped so a burst of operations shares one disk flush. A caller
+        # holding a lock other writers need passes defer_sync=True and calls
+        # sync_due() once it has let go.
+        with self._lock:
+            self.open()
+            self.lsn += 1
+            record['lsn'] = lsn = self.lsn
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self.records += 1
+            self._pending += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+                self._wake.set()
+            if self.batching:
+                return lsn
+            self._file.flush()
+        if not defer_sync:
+            self.sync_due()
+        return lsn
+
+    def sync_due(self):
+        # Group commit: one fsync once group_size records are pending or the
+        # oldest has waited group_interval. Inside a batch it waits for the
+        # batch to end.
+        if self.batching:
+            return
+        oldest = self._oldest_pending
+        if self._pending >= self.group_size or \
+                (oldest is not None and time.monotonic() - oldest >= self.group_interval):
+            self.sync()
+
+    def _flush_pending(self):
+        # Runs on its own thread: an acknowledged record is fsynced within
+        # group_interval even when no later append comes along to do it.
+        while not self._closed.is_set():
+            oldest = self._oldest_pending
+            if oldest is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if self._closed.wait(max(oldest + self.group_interval - time.monotonic(), 0)):
+                return
+            self.sync_due()
+
+    @contextmanager
+    def batch(self):
+        # Buffers every record this thread appends inside the block and makes
+        # them all durable with a single flush and fsync when it exits.
+        local = self._local
+        local.depth = getattr(local, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            local.depth -= 1
+            if not local.depth:
+                self.sync()
+
+    @property
+    def batching(self):
+        # True inside a batch opened by the calling thread.
+        return getattr(self._local, 'depth', 0) > 0
+
+    def sync(self):
+        with self._sync_lock:
+            self._sync()
+
+    def _sync(self):
+        # Caller holds _sync_lock. Records appended while the fsync runs stay
+        # pending for the next one.
+        with self._lock:
+            if self._file is None or not self._pending:
+                return
+            self._file.flush()
+            synced = self._pending
+            started = time.monotonic()
+            fileno = self._file.fileno()
+        os.fsync(fileno)
+        with self._lock:
+            self._pending -= synced
+            self._oldest_pending = started if self._pending else None
+
+    def _sync_and_close(self):
+        # Caller holds both locks.
+        if self._file is not None:
+            if self._pending:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        self._pending = 0
+        self._oldest_pending = None
+
+    def rotate(self):
+        # Seals everything written so far and starts a fresh file, so appends
+        # can continue while a snapshot covering the sealed part is written.
+        # If an earlier snapshot failed, its sealed segment is kept and the
+        # current file is added to it.
+        with self._sync_lock, self._lock:
+            self._sync_and_close()
+            if os.path.exists(self.path):
+                if os.path.exists(self.sealed_path):
+                    with open(self.sealed_path, 'ab') as sealed, open(self.path, 'rb') as current:
+                        shutil.copyfileobj(current, sealed)
+                        sealed.flush()
+                        os.fsync(sealed.fileno())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.sealed_path)
+            self.records = 0
+
+    def drop_sealed(self):
+        # Called once a snapshot covering the sealed segment is durable.
+        if os.path.exists(self.sealed_path):
+            os.remove(self.sealed_path)
+
+    def close(self):
+        with self._sync_lock, self._lock:
+            self._sync_and_close()
+        self._closed.set()
+        self._wake.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self._flusher = None
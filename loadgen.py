@@ -0,0 +1,145 @@
+# Load generator for server.py. Opens many sessions at once, pipelines
+# requests on each and reports throughput and latency percentiles.
+#
+#   python server.py --data-file /tmp/load_bank.txt &
+#   python loadgen.py --connections 1000 --requests 200 --pipeline 8
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    def send(self, op, **fields):
+        self.next_id += 1
+        fields.update(id=self.next_id, op=op)
+        self.writer.write((json.dumps(fields) + '\n').encode('utf-8'))
+
+    async def receive(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    async def request(self, op, **fields):
+        self.send(op, **fields)
+        await self.writer.drain()
+        response = await self.receive()
+        if not response['ok']:
+            raise RuntimeError(f"{op} failed: {response['error']}: {response['message']}")
+        return response['result']
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def run_session(client, accounts, requests, pipeline, rng, latencies, errors):
+    # Keeps up to `pipeline` requests in flight; responses arrive in order,
+    # so their send times are matched from the front of a queue.
+    sent_at = deque()
+    window = asyncio.Semaphore(pipeline)
+
+    async def read_responses():
+        for _ in range(requests):
+            response = await client.receive()
+            latencies.append(time.perf_counter() - sent_at.popleft())
+            if not response['ok']:
+                errors[response['error']] = errors.get(response['error'], 0) + 1
+            window.release()
+
+    reader = asyncio.create_task(read_responses())
+    for _ in range(requests):
+        await window.acquire()
+        roll = rng.random()
+        amount = f"{rng.randint(1, 5000) / 100:.2f}"
+        sent_at.append(time.perf_counter())
+        if roll < 0.3:
+            client.send('deposit', amount=amount)
+        elif roll < 0.5:
+            client.send('withdraw', amount=amount)
+        elif roll < 0.8:
+            client.send('transfer', target=rng.choice(accounts), amount=amount)
+        elif roll < 0.95:
+            client.send('balance')
+        else:
+            client.send('history', limit=20)
+        await client.writer.drain()
+    await reader
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    clients = []
+    accounts = []
+    setup_started = time.perf_counter()
+    for i in range(args.connections):
+        client = await Client.connect(args.host, args.port)
+        opened = await client.request('open', name=f"Load Tester {i}", amount="10000.00",
+                                      account_type='current', password='loadtest')
+        await client.request('login', account=opened['account_number'], password='loadtest')
+        clients.append(client)
+        accounts.append(opened['account_number'])
+    setup_seconds = time.perf_counter() - setup_started
+
+    latencies = []
+    errors = {}
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(client, accounts, args.requests, args.pipeline,
+                                       random.Random(rng.random()), latencies, errors)
+                           for client in clients))
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    report = {
+        'connections': args.connections,
+        'pipeline': args.pipeline,
+        'requests': len(latencies),
+        'setup_seconds': round(setup_seconds, 3),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'errors': errors,
+    }
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive server.py with concurrent pipelined sessions.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=100, help="requests per connection")
+    parser.add_argument('--pipeline', type=int, default=8, help="requests in flight per connection")
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# Operation metrics for the banking core: a latency histogram per
+# operation, error counts by exception class, and a few gauges, exported in
+# the Prometheus text format.
+#
+#   metrics = Metrics()
+#   bank = Bank("bank_data.txt", metrics=metrics)
+#   print(metrics.render())
+#
+# Instrumentation is opt-in per Bank. instrument() replaces the bank's
+# operation methods with timed wrappers on that one instance, so a bank
+# created without metrics runs exactly the original code. Enabled, a call
+# costs two perf_counter() reads and a bisect over the bucket bounds. Each
+# thread records into its own histograms, so recording takes no lock; they
+# are summed when the metrics are rendered.
+#
+# Two optional hooks go further. Operations named in `profile` run under
+# their own cProfile.Profile, which can be dumped to .prof files for pstats
+# or snakeviz. A `tracer` is called as tracer(operation, seconds, error) after
+# every instrumented call, e.g. to log slow operations.
+import bisect
+import cProfile
+import functools
+import os
+import threading
+import time
+
+# Upper bounds in seconds; a final +Inf bucket catches the rest.
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OPERATIONS = (
+    'open_account', 'authenticate', 'authenticate_token', 'update_account', 'deposit', 'withdraw',
+    'transfer', 'history', 'statement', 'balance_at', 'reconcile', 'post_interest',
+    'load_data', 'save_data', 'archive_history',
+)
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def add(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    def __init__(self, profile=(), tracer=None):
+        unknown = set(profile) - set(OPERATIONS) - {'journal_fsync'}
+        if unknown:
+            raise ValueError(f"cannot profile unknown operations: {', '.join(sorted(unknown))}")
+        self.gauges = {}
+        self.tracer = tracer
+        self.profiles = {operation: cProfile.Profile() for operation in profile}
+        # A profiler can only run on one thread at a time, and only one can
+        # be active per thread. Calls to a profiled operation made meanwhile
+        # (concurrently, or nested inside another profiled one) are timed
+        # but not profiled.
+        self._profiling = {operation: threading.Lock() for operation in profile}
+        self._local = threading.local()
+        # Per-thread (histograms by operation, error counts) pairs.
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = ({}, {})
+            self._local.histograms = shard[0]
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _histogram(self, operation):
+        return self._shard()[0].setdefault(operation, Histogram())
+
+    def _count_error(self, operation, error):
+        errors = self._shard()[1]
+        errors[operation, error] = errors.get((operation, error), 0) + 1
+
+    def instrument(self, bank):
+        for operation in OPERATIONS:
+            setattr(bank, operation, self.wrap(operation, getattr(bank, operation)))
+        # Journal fsyncs, whether from group commit, a batch or a snapshot.
+        bank.journal._sync = self.wrap('journal_fsync', bank.journal._sync)
+        self.gauges['bank_accounts'] = ("Open accounts.", lambda: len(bank.accounts))
+        self.gauges['bank_transactions'] = ("Transactions held in memory.", lambda: len(bank.transactions))
+        self.gauges['bank_archived_transactions'] = (
+            "Transactions in archive segments.",
+            lambda: sum(len(segment) for segment in bank.transactions.segments))
+        self.gauges['bank_journal_lsn'] = ("Last journal sequence number.", lambda: bank.journal.lsn)
+        self.gauges['bank_history_loaded'] = ("1 once all history is in memory, 0 during a lazy load.",
+                                              lambda: int(bank.history_loaded))
+        self.gauges['bank_startup_ready_seconds'] = ("Seconds until the bank could serve requests.",
+                                                     lambda: bank.load_timings['ready_seconds'] or 0)
+        self.gauges['bank_startup_loaded_seconds'] = ("Seconds until all history was loaded.",
+                                                      lambda: bank.load_timings['loaded_seconds'] or 0)
+        return bank
+
+    def wrap(self, operation, function):
+        call = self._profiled(operation, function) if operation in self.profiles else function
+        local = self._local
+        tracer = self.tracer
+        perf_counter = time.perf_counter
+        bisect_left = bisect.bisect_left
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            error = None
+            started = perf_counter()
+            try:
+                return call(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                seconds = perf_counter() - started
+                try:
+                    histogram = local.histograms[operation]
+                except (AttributeError, KeyError):
+                    histogram = self._histogram(operation)
+                histogram.counts[bisect_left(BUCKETS, seconds)] += 1
+                histogram.sum += seconds
+                histogram.count += 1
+                if error is not None:
+                    self._count_error(operation, error)
+                if tracer is not None:
+                    tracer(operation, seconds, error)
+        return timed
+
+    def _profiled(self, operation, function):
+        profile = self.profiles[operation]
+        profiling = self._profiling[operation]
+        local = self._local
+
+        def call(*args, **kwargs):
+            if getattr(local, 'profiling', False) or not profiling.acquire(blocking=False):
+                return function(*args, **kwargs)
+            local.profiling = True
+            try:
+                return profile.runcall(function, *args, **kwargs)
+            finally:
+                local.profiling = False
+                profiling.release()
+        return call
+
+    def snapshot(self):
+        # Totals over all threads: ({operation: Histogram}, {(operation, error): count}).
+        latency, errors = {}, {}
+        with self._lock:
+            shards = list(self._shards)
+        for histograms, shard_errors in shards:
+            for operation, histogram in list(histograms.items()):
+                latency.setdefault(operation, Histogram()).add(histogram)
+            for key, count in list(shard_errors.items()):
+                errors[key] = errors.get(key, 0) + count
+        return latency, errors
+
+    def render(self):
+        latency, errors = self.snapshot()
+        lines = ["# HELP bank_operation_seconds Latency of core bank operations.",
+                 "# TYPE bank_operation_seconds histogram"]
+        for operation, histogram in sorted(latency.items()):
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += bucket
+                lines.append(f'bank_operation_seconds_bucket{{operation="{operation}",le="{bound}"}} {cumulative}')
+            lines.append(f'bank_operation_seconds_sum{{operation="{operation}"}} {histogram.sum:.9f}')
+            lines.append(f'bank_operation_seconds_count{{operation="{operation}"}} {histogram.count}')
+        lines.append("# HELP bank_operation_errors_total Operations that raised, by exception class.")
+        lines.append("# TYPE bank_operation_errors_total counter")
+        for (operation, error), count in sorted(errors.items()):
+            lines.append(f'bank_operation_errors_total{{operation="{operation}",error="{label(error)}"}} {count}')
+        for name, (description, read) in self.gauges.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {read()}")
+        return '\n'.join(lines) + '\n'
+
+    def dump_profiles(self, directory):
+        # One <operation>.prof per profiled operation; returns the paths.
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for operation, profile in self.profiles.items():
+            path = os.path.join(directory, operation + ".prof")
+            profile.dump_stats(path)
+            paths.append(path)
+        return paths
@@ -0,0 +1,33 @@
+# Money is held as an int number of cents everywhere: balances, transaction
+# amounts and persisted records. Arithmetic is plain int arithmetic; these
+# helpers only convert at the edges (user input, display, old data files).
+
+CENTS_PER_DOLLAR = 100
+
+
+def parse_amount(text):
+    text = text.strip().lstrip('$').replace(',', '')
+    sign = 1
+    if text.startswith('-'):
+        sign = -1
+        text = text[1:]
+    whole, _, fraction = text.partition('.')
+    if not (whole or fraction) or (whole and not whole.isdigit()) or (fraction and not fraction.isdigit()):
+        raise ValueError(f"invalid amount: {text!r}")
+    if len(fraction) > 2:
+        raise ValueError("amounts can have at most two decimal places")
+    return sign * (int(whole or '0') * CENTS_PER_DOLLAR + int(fraction.ljust(2, '0')))
+
+
+def format_money(cents):
+    sign = '-' if cents < 0 else ''
+    dollars, remainder = divmod(abs(cents), CENTS_PER_DOLLAR)
+    return f"{sign}{dollars}.{remainder:02d}"
+
+
+def to_cents(value):
+    # Files written before balances were kept in cents store float dollars;
+    # JSON keeps the two apart (250.0 vs 25000).
+    if isinstance(value, float):
+        return int(round(value * CENTS_PER_DOLLAR))
+    return value
@@ -0,0 +1,109 @@
+# Password hashing and the verified-login token cache.
+#
+# Stored credentials carry their scheme and parameters, so the cost can be
+# raised later without invalidating existing hashes:
+#
+#   scrypt$16384$8$1$<salt>$<hash>
+#   pbkdf2_sha256$200000$<salt>$<hash>
+#
+# where salt and hash are base64. New hashes use scrypt, or PBKDF2 where the
+# interpreter's OpenSSL lacks it. Each costs tens of milliseconds of CPU.
+# Both release the GIL while they run, so a thread pool hashes in parallel
+# without stalling other threads. Anything else is a legacy plaintext
+# password.
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 200000
+SALT_BYTES = 16
+SCHEMES = ('scrypt', 'pbkdf2_sha256')
+
+
+def encode(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def hash_password(password, salt=None):
+    salt = salt or os.urandom(SALT_BYTES)
+    secret = password.encode('utf-8')
+    if hasattr(hashlib, 'scrypt'):
+        digest = hashlib.scrypt(secret, salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${encode(salt)}${encode(digest)}"
+    digest = hashlib.pbkdf2_hmac('sha256', secret, salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${encode(salt)}${encode(digest)}"
+
+
+def burn_hash(password):
+    # A KDF run whose result is thrown away, so a login refused before any
+    # password is checked, e.g. for an unknown account, takes as long as
+    # one refused for a wrong password.
+    hash_password(password, bytes(SALT_BYTES))
+
+
+def is_hashed(stored):
+    return stored.split('$', 1)[0] in SCHEMES
+
+
+def verify_password(password, stored):
+    secret = password.encode('utf-8')
+    scheme, _, fields = stored.partition('$')
+    if scheme == 'scrypt':
+        n, r, p, salt, expected = fields.split('$')
+        expected = base64.b64decode(expected)
+        digest = hashlib.scrypt(secret, salt=base64.b64decode(salt), n=int(n), r=int(r), p=int(p),
+                                dklen=len(expected))
+    elif scheme == 'pbkdf2_sha256':
+        iterations, salt, expected = fields.split('$')
+        expected = base64.b64decode(expected)
+        digest = hashlib.pbkdf2_hmac('sha256', secret, base64.b64decode(salt), int(iterations))
+    else:
+        digest, expected = secret, stored.encode('utf-8')
+    return hmac.compare_digest(digest, expected)
+
+
+class TokenCache:
+    # Tokens for recently verified logins, so a client can authenticate again
+    # without another KDF run. A token expires `ttl` seconds after it was
+    # issued, and past `capacity` the least recently used ones are dropped.
+    # Each token remembers the credential it was issued against, so changing
+    # the password invalidates it.
+    def __init__(self, capacity=100000, ttl=900):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue(self, account_number, credential):
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._tokens[token] = (account_number, credential, time.monotonic() + self.ttl)
+            if len(self._tokens) > self.capacity:
+                self._tokens.popitem(last=False)
+        return token
+
+    def lookup(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._tokens[token]
+                return None
+            self._tokens.move_to_end(token)
+            return entry[0], entry[1]
+
+    def revoke(self, token):
+        with self._lock:
+            self._tokens.pop(token, None)
+
+    def __len__(self):
+        return len(self._tokens)
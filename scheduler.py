@@ -0,0 +1,317 @@
+# Standing orders: future-dated and recurring transfers.
+#
+#   scheduler = Scheduler(bank)
+#   schedule = scheduler.add("123456", "654321", 2500, datetime.datetime(2026, 11, 1, 9), 'monthly', count=12)
+#   scheduler.run_due()   # from a timer: the server every second, or cron
+#
+# Schedules live in their own journal, bank_data.txt.schedules, separate
+# from the bank's: "add" and "cancel" records, and a "ran" record for each
+# payment made. Once finished runs outnumber the live schedules, the
+# journal is compacted to one "add" per live schedule, the same way
+# sharding.py compacts its decision log.
+#
+# Due payments come off a heap of (next run, schedule id, run number)
+# entries. A tick pops only what is due, so it costs O(log n) per payment
+# no matter how many schedules exist. A cancelled schedule's heap entry is
+# left in place and skipped when it surfaces.
+#
+# Payments go through Bank.transfer() in batches of batch_size, each batch
+# one bank journal fsync followed by one schedule journal fsync. Every
+# payment carries the idempotency key "schedule:<id>:<run>", kept in the
+# bank's index for scheduled payments rather than the clients' one. A crash
+# after the bank's fsync but before the scheduler's makes the restarted
+# scheduler retry that batch, and the bank answers each retry with the
+# original result instead of paying again. A payment refused by the bank,
+# e.g. for insufficient funds, counts as that run failing. The schedule
+# moves on to its next run and keeps the error for the account holder to
+# see. Any other error puts the batch back on the heap for the next tick.
+#
+# The transfers run without holding the scheduler's lock, so adding,
+# listing or cancelling schedules never waits for a batch of payments.
+#
+# Recurring runs are computed from the first run, so a monthly payment due
+# on the 31st goes out on the last day of shorter months and returns to the
+# 31st afterwards. A run missed while the bank was down is paid late, once
+# per missed run.
+import calendar
+import datetime
+import heapq
+import threading
+import time
+
+import storage
+from core import BankError, ValidationError, check_amount
+from journal import Journal
+
+PERIODS = ('once', 'daily', 'weekly', 'monthly')
+BATCH_SIZE = 1000
+
+
+def occurrence(first_run, period, run):
+    # Epoch seconds of run number `run` (0 is the first), in local time, so
+    # a daily 9:00 payment stays at 9:00 across daylight saving changes.
+    if run == 0 or period == 'once':
+        return first_run
+    start = datetime.datetime.fromtimestamp(first_run)
+    if period == 'daily':
+        when = start + datetime.timedelta(days=run)
+    elif period == 'weekly':
+        when = start + datetime.timedelta(weeks=run)
+    else:
+        month = start.month - 1 + run
+        year, month = start.year + month // 12, month % 12 + 1
+        when = start.replace(year=year, month=month, day=min(start.day, calendar.monthrange(year, month)[1]))
+    return int(when.timestamp())
+
+
+class Schedule:
+    __slots__ = ('schedule_id', 'account_number', 'target_account', 'amount', 'first_run', 'period', 'count',
+                 'runs', 'failures', 'last_error', 'next_run')
+
+    def __init__(self, schedule_id, account_number, target_account, amount, first_run, period, count=None,
+                 runs=0, failures=0, last_error=None):
+        self.schedule_id = schedule_id
+        self.account_number = account_number
+        self.target_account = target_account
+        self.amount = amount
+        self.first_run = first_run
+        self.period = period
+        # Total runs, None for no end; a 'once' schedule has one.
+        self.count = 1 if period == 'once' else count
+        self.runs = runs
+        self.failures = failures
+        self.last_error = last_error
+        self.next_run = occurrence(first_run, period, runs)
+
+    @property
+    def finished(self):
+        return self.count is not None and self.runs >= self.count
+
+    def to_dict(self):
+        return {'schedule_id': self.schedule_id, 'account_number': self.account_number,
+                'target_account': self.target_account, 'amount': self.amount, 'first_run': self.first_run,
+                'period': self.period, 'count': self.count, 'runs': self.runs, 'failures': self.failures,
+                'last_error': self.last_error}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class Scheduler:
+    def __init__(self, bank, path=None, batch_size=BATCH_SIZE, clock=time.time, load=True):
+        self.bank = bank
+        self.batch_size = batch_size
+        self.clock = clock
+        if batch_size > bank.scheduled_idempotency.capacity:
+            raise ValueError(f"batch_size must be at most {bank.scheduled_idempotency.capacity}, "
+                             "the scheduled payment keys the bank keeps")
+        self.journal = Journal(path or bank.data_file + ".schedules")
+        self.schedules = {}
+        # Account number -> ids of the schedules paying out of it.
+        self.by_account = {}
+        self.next_id = 1
+        self._heap = []
+        self._lock = threading.Lock()
+        # Held for a whole run_due(), so only one runs at a time.
+        self._run_lock = threading.Lock()
+        # Paid and failed runs since start.
+        self.paid = 0
+        self.failed = 0
+        if load:
+            self.load()
+
+    def load(self):
+        with self._lock:
+            for record in self.journal.replay():
+                self._apply(record)
+            self._heap = [(schedule.next_run, schedule_id, schedule.runs)
+                          for schedule_id, schedule in self.schedules.items()]
+            heapq.heapify(self._heap)
+            if self._worth_compacting():
+                self._compact()
+        return len(self.schedules)
+
+    def _apply(self, record):
+        op = record['op']
+        if op == 'state':
+            self.next_id = max(self.next_id, record['next_id'])
+        elif op == 'add':
+            schedule = Schedule.from_dict(record['schedule'])
+            self.schedules[schedule.schedule_id] = schedule
+            self.by_account.setdefault(schedule.account_number, set()).add(schedule.schedule_id)
+            self.next_id = max(self.next_id, schedule.schedule_id + 1)
+        elif op == 'cancel':
+            self._discard(record['schedule_id'])
+        elif op == 'ran':
+            schedule = self.schedules.get(record['schedule_id'])
+            if schedule is not None and schedule.runs == record['run']:
+                self._advance(schedule, record.get('error'))
+        else:
+            raise ValueError(f"unknown schedule journal op {op!r}")
+
+    def _discard(self, schedule_id):
+        schedule = self.schedules.pop(schedule_id, None)
+        if schedule is not None:
+            ids = self.by_account[schedule.account_number]
+            ids.discard(schedule_id)
+            if not ids:
+                del self.by_account[schedule.account_number]
+        return schedule
+
+    def _advance(self, schedule, error):
+        # Marks the current run done; returns the schedule if it has another.
+        schedule.runs += 1
+        if error is not None:
+            schedule.failures += 1
+        schedule.last_error = error
+        if schedule.finished:
+            self._discard(schedule.schedule_id)
+            return None
+        schedule.next_run = occurrence(schedule.first_run, schedule.period, schedule.runs)
+        return schedule
+
+    def _compact(self):
+        # Rewrites the journal as the live schedules alone. Until the sealed
+        # old file is dropped, a crash replays both, and re-adding a
+        # schedule with its current state is harmless.
+        self.journal.rotate()
+        with self.journal.batch():
+            self.journal.append({'op': 'state', 'next_id': self.next_id})
+            for schedule in self.schedules.values():
+                self.journal.append({'op': 'add', 'schedule': schedule.to_dict()})
+        self.journal.drop_sealed()
+
+    def _worth_compacting(self):
+        # Once finished runs outnumber the live schedules, as they do after
+        # a month of daily payments.
+        return self.journal.records > max(100000, 2 * len(self.schedules))
+
+    def maybe_compact(self):
+        with self._lock:
+            if self._worth_compacting():
+                self._compact()
+
+    # --- managing schedules ------------------------------------------------
+
+    def add(self, account_number, target_account, amount, first_run, period='once', count=None):
+        self.bank.get_account(account_number)
+        self.bank.get_account(target_account)
+        if target_account == account_number:
+            raise ValidationError("cannot schedule a transfer to the same account")
+        check_amount(amount)
+        if period not in PERIODS:
+            raise ValidationError(f"period must be one of {', '.join(PERIODS)}")
+        if count is not None and (not isinstance(count, int) or count < 1):
+            raise ValidationError("count must be a positive whole number")
+        with self._lock:
+            schedule = Schedule(self.next_id, account_number, target_account, amount,
+                                storage.to_epoch(first_run), period, count)
+            self.journal.append({'op': 'add', 'schedule': schedule.to_dict()})
+            self._apply({'op': 'add', 'schedule': schedule.to_dict()})
+            heapq.heappush(self._heap, (schedule.next_run, schedule.schedule_id, schedule.runs))
+            # Inside scheduler.journal.batch() a bulk load syncs once at the end.
+            if not self.journal.batching:
+                self.journal.sync()
+        return schedule.to_dict()
+
+    def cancel(self, schedule_id, account_number=None):
+        # With account_number, only a schedule paying out of that account.
+        with self._lock:
+            schedule = self.schedules.get(schedule_id)
+            if schedule is None or (account_number is not None and schedule.account_number != account_number):
+                raise ValidationError(f"no schedule {schedule_id}")
+            self.journal.append({'op': 'cancel', 'schedule_id': schedule_id})
+            self.journal.sync()
+            self._discard(schedule_id)
+        return schedule.to_dict()
+
+    def schedules_for(self, account_number):
+        with self._lock:
+            schedules = [self.schedules[schedule_id] for schedule_id in self.by_account.get(account_number, ())]
+        return [dict(schedule.to_dict(), next_run=schedule.next_run)
+                for schedule in sorted(schedules, key=lambda schedule: schedule.next_run)]
+
+    def __len__(self):
+        return len(self.schedules)
+
+    # --- running due payments ----------------------------------------------
+
+    def next_due(self):
+        # Epoch seconds of the earliest pending run, None if there is none.
+        with self._lock:
+            while self._heap:
+                next_run, schedule_id, run = self._heap[0]
+                schedule = self.schedules.get(schedule_id)
+                if schedule is not None and schedule.runs == run:
+                    return next_run
+                heapq.heappop(self._heap)
+        return None
+
+    def _due(self, now):
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now and len(due) < self.batch_size:
+            _, schedule_id, run = heapq.heappop(heap)
+            schedule = self.schedules.get(schedule_id)
+            # Skips entries of cancelled schedules.
+            if schedule is not None and schedule.runs == run:
+                due.append(schedule)
+        return due
+
+    def run_due(self, now=None):
+        # Pays every run due by `now`, batch_size at a time. Returns how
+        # many were paid and how many the bank refused.
+        now = self.clock() if now is None else now
+        paid = failed = 0
+        with self._run_lock:
+            while True:
+                with self._lock:
+                    due = self._due(now)
+                if not due:
+                    break
+                errors = []
+                recorded = 0
+                try:
+                    with self.bank.journal.batch():
+                        for schedule in due:
+                            try:
+                                self.bank.transfer(schedule.account_number, schedule.target_account,
+                                                   schedule.amount, f"schedule:{schedule.schedule_id}:{schedule.runs}",
+                                                   scheduled=True)
+                                errors.append(None)
+                            except BankError as e:
+                                errors.append(f"{type(e).__name__}: {e}")
+                    # The transfers are durable; now record that they ran.
+                    with self.journal.batch(), self._lock:
+                        for schedule, error in zip(due, errors):
+                            self.journal.append({'op': 'ran', 'schedule_id': schedule.schedule_id,
+                                                 'run': schedule.runs, 'error': error})
+                            recorded += 1
+                            if error is None:
+                                paid += 1
+                            else:
+                                failed += 1
+                            # Unless cancelled while its payment was made.
+                            if self.schedules.get(schedule.schedule_id) is not schedule:
+                                continue
+                            if self._advance(schedule, error) is not None:
+                                heapq.heappush(self._heap, (schedule.next_run, schedule.schedule_id, schedule.runs))
+                finally:
+                    # Runs not recorded go back on the heap; payments already
+                    # made are answered from their keys when retried.
+                    if recorded < len(due):
+                        with self._lock:
+                            for schedule in due[recorded:]:
+                                heapq.heappush(self._heap, (schedule.next_run, schedule.schedule_id, schedule.runs))
+        self.paid += paid
+        self.failed += failed
+        if paid or failed:
+            self.bank.maybe_compact()
+            self.maybe_compact()
+        return {'paid': paid, 'failed': failed}
+
+    def close(self):
+        # Waits for a run in progress on another thread.
+        with self._run_lock, self._lock:
+            self.journal.close()
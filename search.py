@@ -0,0 +1,278 @@
+# Secondary indexes over accounts, for admin queries such as "savings
+# accounts of anyone called Jo... holding $10,000-$50,000, opened this year":
+#
+#   index = AccountIndex()
+#   bank = Bank("bank_data.txt", search=index)
+#   bank.find_accounts(name="jo", account_type="savings", min_balance=1000000, max_balance=5000000,
+#                      created_from=datetime.datetime(2026, 1, 1))
+#
+# Names are indexed word by word, so "jo" matches "Jo Smith", "John Doe"
+# and "Anna Jones". A query of several words needs each to prefix some word
+# of the name. Balances and creation dates are kept in sorted order, and
+# account types in one bucket per type.
+#
+# A query reads candidates from whichever of its conditions matches the
+# fewest accounts and checks the rest on each candidate, so its cost
+# follows the size of the answer rather than the number of accounts. The
+# Bank refreshes an account's entries whenever a commit changes it, under
+# the commit lock. Queries take the index's own lock.
+import bisect
+import threading
+
+import storage
+
+BLOCK = 1000
+# Balance and creation-date entries are single ints, key * ACCOUNT_SPAN +
+# account number, which compare far faster than (key, account) tuples.
+# Account numbers are numeric with no leading zero (see allocator.py) and
+# must stay below ACCOUNT_SPAN: at most MAX_ACCOUNT_DIGITS digits, check
+# digit included.
+ACCOUNT_SPAN = 1 << 64
+MAX_ACCOUNT_DIGITS = 19
+
+
+class SortedIndex:
+    # A sorted list of index entries, held as a list of sorted blocks of
+    # up to 2 * BLOCK entries, the layout sortedcontainers uses. An insert
+    # or removal shifts one block rather than the whole list, so it stays
+    # cheap with millions of entries.
+    def __init__(self, items=()):
+        items = sorted(items)
+        self._blocks = [items[i:i + BLOCK] for i in range(0, len(items), BLOCK)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(items)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, item):
+        blocks, maxes = self._blocks, self._maxes
+        self._len += 1
+        if not blocks:
+            blocks.append([item])
+            maxes.append(item)
+            return
+        i = bisect.bisect_left(maxes, item)
+        if i == len(maxes):
+            i -= 1
+            blocks[i].append(item)
+            maxes[i] = item
+        else:
+            bisect.insort(blocks[i], item)
+        if len(blocks[i]) > 2 * BLOCK:
+            block = blocks[i]
+            blocks[i:i + 1] = [block[:BLOCK], block[BLOCK:]]
+            maxes[i:i + 1] = [block[BLOCK - 1], block[-1]]
+
+    def remove(self, item):
+        blocks, maxes = self._blocks, self._maxes
+        i = bisect.bisect_left(maxes, item)
+        block = blocks[i]
+        del block[bisect.bisect_left(block, item)]
+        self._len -= 1
+        if block:
+            maxes[i] = block[-1]
+        else:
+            del blocks[i]
+            del maxes[i]
+
+    def _locate(self, item):
+        # (block, offset) of the first entry >= item.
+        i = bisect.bisect_left(self._maxes, item)
+        if i == len(self._maxes):
+            return i, 0
+        return i, bisect.bisect_left(self._blocks[i], item)
+
+    def irange(self, low, high):
+        # Entries with low <= entry < high, in order. For (word,
+        # account_number) entries, (word,) sorts before every entry of word.
+        blocks = self._blocks
+        i, j = self._locate(low)
+        while i < len(blocks):
+            block = blocks[i]
+            for k in range(j, len(block)):
+                if block[k] >= high:
+                    return
+                yield block[k]
+            i, j = i + 1, 0
+
+    def count(self, low, high):
+        (i, j), (m, n) = self._locate(low), self._locate(high)
+        if i == m:
+            return n - j
+        return len(self._blocks[i]) - j + sum(len(block) for block in self._blocks[i + 1:m]) + n
+
+
+def name_words(name):
+    return name.lower().split()
+
+
+def search_name(name):
+    # " john smith": with every word preceded by a space, "word starts with
+    # jo" is the substring test " jo" in name.
+    return ''.join(' ' + word for word in name_words(name))
+
+
+class Query:
+    # The conditions of one find_accounts() call; None means any. Balances
+    # are in cents and both ranges are inclusive.
+    def __init__(self, name=None, account_type=None, min_balance=None, max_balance=None,
+                 created_from=None, created_to=None):
+        self.words = name_words(name) if name else []
+        self._prefixes = [' ' + word for word in self.words]
+        self.account_type = account_type
+        self.min_balance = min_balance
+        self.max_balance = max_balance
+        self.created_from = None if created_from is None else storage.to_epoch(created_from)
+        self.created_to = None if created_to is None else storage.to_epoch(created_to)
+
+    def matches(self, entry):
+        name, account_type, balance, created = entry.search_name, entry.account_type, entry.balance, entry.created
+        if self.account_type is not None and account_type != self.account_type:
+            return False
+        if (self.min_balance is not None and balance < self.min_balance) or \
+                (self.max_balance is not None and balance > self.max_balance):
+            return False
+        if self.created_from is not None or self.created_to is not None:
+            if created is None or (self.created_from is not None and created < self.created_from) or \
+                    (self.created_to is not None and created > self.created_to):
+                return False
+        for prefix in self._prefixes:
+            if prefix not in name:
+                return False
+        return True
+
+    def matches_account(self, account):
+        return self.matches(Entry(account))
+
+
+class Entry:
+    # What the index last saw of one account: the indexed fields as stored,
+    # and the forms they are indexed in.
+    __slots__ = ('name', 'account_type', 'balance', 'created_date', 'search_name', 'created')
+
+    def __init__(self, account):
+        self.name = account['name']
+        self.account_type = account['account_type']
+        self.balance = account['balance']
+        self.created_date = account.get('created_date')
+        self.search_name = search_name(self.name)
+        self.created = storage.to_epoch(self.created_date)
+
+
+def packed_range(low, high):
+    # Bounds for keys in [low, high]; None leaves that end open.
+    return (float('-inf') if low is None else low * ACCOUNT_SPAN,
+            float('inf') if high is None else (high + 1) * ACCOUNT_SPAN)
+
+
+def unpacked(entries):
+    for entry in entries:
+        yield str(entry % ACCOUNT_SPAN)
+
+
+class AccountIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rebuild({})
+
+    def attach(self, bank):
+        # Longer account numbers would spill into the key above them and
+        # collide.
+        digits = bank.account_digits + (1 if bank.check_digit else 0)
+        if digits > MAX_ACCOUNT_DIGITS:
+            raise ValueError(f"account search supports account numbers of up to {MAX_ACCOUNT_DIGITS} digits, "
+                             f"not {digits}")
+
+    def rebuild(self, accounts):
+        # Bulk load after the bank has loaded: one sort per index.
+        entries = {account_number: Entry(account) for account_number, account in accounts.items()}
+        with self._lock:
+            self._entries = entries
+            self._names = SortedIndex((word, account_number) for account_number, entry in entries.items()
+                                      for word in set(entry.search_name.split()))
+            self._balances = SortedIndex(entry.balance * ACCOUNT_SPAN + int(account_number)
+                                         for account_number, entry in entries.items())
+            self._created = SortedIndex(entry.created * ACCOUNT_SPAN + int(account_number)
+                                        for account_number, entry in entries.items() if entry.created is not None)
+            self._types = {}
+            for account_number, entry in entries.items():
+                self._types.setdefault(entry.account_type, set()).add(account_number)
+
+    def refresh(self, account_number, account):
+        # Re-indexes whatever changed since the account was last seen; a
+        # balance change, the common case, moves one sorted entry.
+        with self._lock:
+            entry = self._entries.get(account_number)
+            if entry is None:
+                self._add(account_number, Entry(account))
+                return
+            number = int(account_number)
+            if account['balance'] != entry.balance:
+                self._balances.remove(entry.balance * ACCOUNT_SPAN + number)
+                entry.balance = account['balance']
+                self._balances.add(entry.balance * ACCOUNT_SPAN + number)
+            if account['name'] != entry.name or account['account_type'] != entry.account_type or \
+                    account.get('created_date') != entry.created_date:
+                self._remove(account_number, entry)
+                self._add(account_number, Entry(account))
+
+    def _add(self, account_number, entry):
+        number = int(account_number)
+        self._entries[account_number] = entry
+        for word in set(entry.search_name.split()):
+            self._names.add((word, account_number))
+        self._types.setdefault(entry.account_type, set()).add(account_number)
+        self._balances.add(entry.balance * ACCOUNT_SPAN + number)
+        if entry.created is not None:
+            self._created.add(entry.created * ACCOUNT_SPAN + number)
+
+    def _remove(self, account_number, entry):
+        number = int(account_number)
+        del self._entries[account_number]
+        for word in set(entry.search_name.split()):
+            self._names.remove((word, account_number))
+        self._types[entry.account_type].discard(account_number)
+        self._balances.remove(entry.balance * ACCOUNT_SPAN + number)
+        if entry.created is not None:
+            self._created.remove(entry.created * ACCOUNT_SPAN + number)
+
+    def _candidates(self, query):
+        # (estimated size, account numbers) for each condition the query
+        # has; find() reads the smallest.
+        options = []
+        for word in query.words:
+            low, high = (word,), (word + '\uffff',)
+            options.append((self._names.count(low, high),
+                            (account_number for _, account_number in self._names.irange(low, high))))
+        if query.account_type is not None:
+            bucket = self._types.get(query.account_type, ())
+            options.append((len(bucket), iter(bucket)))
+        if query.min_balance is not None or query.max_balance is not None:
+            low, high = packed_range(query.min_balance, query.max_balance)
+            options.append((self._balances.count(low, high), unpacked(self._balances.irange(low, high))))
+        if query.created_from is not None or query.created_to is not None:
+            low, high = packed_range(query.created_from, query.created_to)
+            options.append((self._created.count(low, high), unpacked(self._created.irange(low, high))))
+        if not options:
+            options.append((len(self._entries), iter(self._entries)))
+        return min(options, key=lambda option: option[0])[1]
+
+    def find(self, query, limit=100):
+        found = []
+        seen = set()
+        with self._lock:
+            entries = self._entries
+            for account_number in self._candidates(query):
+                # A name query can reach one account through two words.
+                if account_number in seen:
+                    continue
+                seen.add(account_number)
+                if query.matches(entries[account_number]):
+                    found.append(account_number)
+                    if len(found) >= limit:
+                        break
+        return found
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,545 @@
+# Network front end for the banking core: newline-delimited JSON over TCP.
+#
+#   python server.py [--host 127.0.0.1] [--port 8765] [--data-file bank_data.txt]
+#
+# Each connection is its own session. A request is one JSON object per line:
+#
+#   {"id": 1, "op": "login", "account": "123456", "password": "secret1"}
+#   {"id": 2, "op": "deposit", "amount": "25.00"}
+#
+# and gets exactly one response line, in request order:
+#
+#   {"id": 2, "ok": true, "result": {"balance": "1025.00", ...}}
+#   {"id": 3, "ok": false, "error": "InsufficientFundsError", "message": "..."}
+#
+# deposit, withdraw and transfer accept an optional "idempotency_key". A
+# retry carrying the same key gets the original response back instead of
+# moving the money again; reusing a key for a different request is an
+# IdempotencyConflictError. Keys are remembered for a day.
+#
+# Passwords are checked with a deliberately slow KDF, on a separate pool of
+# --kdf-workers threads so that logins never stall the event loop. A
+# successful login returns a token; {"op": "login", "token": "..."} logs in
+# again without the KDF until the token expires, the password changes or
+# the session logs out.
+#
+# Ops: open, login, logout, balance, deposit, withdraw, transfer, history,
+# statement, schedule, schedules, cancel_schedule. Amounts go both ways as
+# dollar strings; times are epoch seconds or ISO dates, e.g.
+# {"op": "statement", "start": "2026-09-01", "end": "2026-09-30T23:59:59"}
+# and {"op": "balance", "at": 1788220800}. Clients may pipeline: send many
+# requests without waiting. Each session buffers at most --pipeline
+# unanswered requests. Past that the server stops reading the socket, so a
+# fast sender is slowed by TCP flow control rather than growing memory.
+# Responses to pipelined requests are coalesced into one socket write.
+#
+# Standing orders: {"op": "schedule", "target": "654321", "amount": "25.00",
+# "start": "2026-11-01T09:00", "period": "monthly", "count": 12} pays the
+# target from the logged-in account on that date and then monthly, 12 times
+# in all. period is once (the default), daily, weekly or monthly; leave out
+# count for no end. Due payments are made every --schedule-every seconds;
+# see scheduler.py.
+#
+# With --lazy-history the server starts taking requests once accounts and
+# balances are loaded, and reads transaction history in the background.
+# Requests that read history (history, statement, balance "at") wait until
+# it is in, without holding up other sessions; logins, deposits, withdrawals
+# and transfers don't, unless --rules is set, when withdrawals and transfers
+# wait too.
+#
+# With --metrics-port, GET /metrics on that port returns operation latency
+# histograms, error counts and gauges in the Prometheus text format.
+# --profile runs the named core operations under cProfile and writes one
+# .prof file per operation to --profile-dir at shutdown; --slow-ms prints
+# every operation slower than that.
+#
+# With --admin-port, GET /accounts on that port searches accounts by name
+# prefix, type, balance range and opening date, from in-memory indexes;
+# see account_search() and search.py. It has no login, so it listens on
+# --admin-host, loopback by default, rather than --host.
+import argparse
+import asyncio
+import datetime
+import json
+import signal
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from core import Bank, BankError, ValidationError, InvalidAmountError, AuthenticationError
+from fraud import RuleEngine, load_rules
+from metrics import Metrics
+from money import parse_amount, format_money
+from scheduler import Scheduler
+from search import AccountIndex
+
+
+class NotLoggedInError(BankError):
+    pass
+
+
+class Session:
+    __slots__ = ('account_number', 'token')
+
+    def __init__(self):
+        self.account_number = None
+        # The token this session logged in with or was issued; logout
+        # revokes it.
+        self.token = None
+
+
+def amount_of(request):
+    try:
+        return parse_amount(str(request['amount']))
+    except KeyError:
+        raise ValidationError("missing field 'amount'") from None
+    except ValueError as e:
+        raise InvalidAmountError(str(e)) from None
+
+
+def field(request, name):
+    value = request.get(name)
+    if value is None or str(value).strip() == '':
+        raise ValidationError(f"missing field '{name}'")
+    return str(value).strip()
+
+
+def idempotency_key(request):
+    key = request.get('idempotency_key')
+    return None if key is None else str(key)
+
+
+def int_field(request, name, default, low=0, high=None):
+    # A whole number in [low, high]; JSON true/false and floats don't count.
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < low:
+        raise ValidationError(f"'{name}' must be a whole number of at least {low}")
+    return value if high is None else min(value, high)
+
+
+def time_field(request, name):
+    value = request.get(name)
+    if value is None:
+        raise ValidationError(f"missing field '{name}'")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def money_fields(result):
+    return {key: format_money(value) if key in ('amount', 'balance', 'previous_balance', 'target_balance',
+                                                'balance_after') else value
+            for key, value in result.items()}
+
+
+class BankServer:
+    def __init__(self, bank, host="127.0.0.1", port=8765, max_connections=10000,
+                 max_pipeline=64, workers=0, kdf_workers=4, scheduler=None):
+        self.bank = bank
+        self.scheduler = scheduler
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.max_pipeline = max_pipeline
+        # Core operations are short (the journal's fsync is batched), so by
+        # default they run directly on the event loop; handing each one to a
+        # thread costs more than the operation. With workers > 0 they run on
+        # a thread pool instead, relying on the core's own locks.
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bank") if workers else None
+        # Password hashing always leaves the event loop. The KDF releases the
+        # GIL, so these threads hash in parallel.
+        self.kdf_executor = ThreadPoolExecutor(max_workers=kdf_workers, thread_name_prefix="kdf")
+        self.connections = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                 backlog=min(self.max_connections, 4096))
+        return self.server
+
+    async def handle_connection(self, reader, writer):
+        if self.connections >= self.max_connections:
+            writer.write(self.encode({'id': None, 'ok': False, 'error': 'ServerBusy',
+                                      'message': 'too many connections'}))
+            await writer.drain()
+            writer.close()
+            return
+        self.connections += 1
+        session = Session()
+        pending = asyncio.Queue(self.max_pipeline)
+        responder = asyncio.create_task(self.respond(pending, writer, session))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Blocks once the session has max_pipeline unanswered
+                # requests, which stops us reading from the socket.
+                await pending.put(line)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            try:
+                if not responder.done():
+                    await pending.put(None)
+                await responder
+            finally:
+                self.connections -= 1
+                writer.close()
+
+    async def respond(self, pending, writer, session):
+        connected = True
+        output = []
+        while True:
+            line = await pending.get()
+            if line is not None:
+                output.append(self.encode(await self.execute(line, session)))
+                # While more pipelined requests are waiting, keep answering
+                # them and send the responses together.
+                if not pending.empty() and len(output) < self.max_pipeline:
+                    continue
+            if connected and output:
+                try:
+                    writer.write(b''.join(output))
+                    await writer.drain()
+                except ConnectionError:
+                    # Keep draining the queue so the reader never blocks on it.
+                    connected = False
+            output.clear()
+            if line is None:
+                return
+
+    def encode(self, response):
+        return (json.dumps(response, separators=(',', ':')) + '\n').encode('utf-8')
+
+    async def execute(self, line, session):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValidationError("request must be a JSON object")
+            request_id = request.get('id')
+            handler = getattr(self, 'op_' + str(request.get('op')), None)
+            if handler is None:
+                raise ValidationError(f"unknown op {request.get('op')!r}")
+            result = await handler(request, session)
+            return {'id': request_id, 'ok': True, 'result': result}
+        except BankError as e:
+            return {'id': request_id, 'ok': False, 'error': type(e).__name__, 'message': str(e)}
+        except ValueError as e:
+            return {'id': request_id, 'ok': False, 'error': 'BadRequest', 'message': str(e)}
+        except Exception as e:
+            # A bug in one request must not take the session's responder,
+            # and with it every answer still queued, down with it.
+            print(f"Internal error on {line[:200]!r}: {type(e).__name__}: {e}")
+            return {'id': request_id, 'ok': False, 'error': 'InternalError', 'message': "internal server error"}
+
+    async def call(self, function, *args):
+        if self.executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def hash_call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.kdf_executor, function, *args)
+
+    async def history_ready(self):
+        # During a lazy load, history requests wait on a thread rather than
+        # holding up everyone else's requests on the event loop.
+        if not self.bank.history_loaded:
+            await asyncio.get_running_loop().run_in_executor(None, self.bank.wait_for_history)
+
+    def logged_in(self, session):
+        if session.account_number is None:
+            raise NotLoggedInError("log in first")
+        return session.account_number
+
+    # --- operations --------------------------------------------------------
+
+    async def op_open(self, request, session):
+        account_number = await self.hash_call(self.bank.open_account, field(request, 'name'), amount_of(request),
+                                         field(request, 'account_type').lower(), field(request, 'password'))
+        return {'account_number': account_number}
+
+    async def op_login(self, request, session):
+        if 'token' in request:
+            token = field(request, 'token')
+            account_number, account = self.bank.authenticate_token(token)
+            session.account_number, session.token = account_number, token
+            return {'account_number': account_number, 'name': account['name']}
+        account_number = field(request, 'account')
+        try:
+            account = await self.hash_call(self.bank.authenticate, account_number, field(request, 'password'))
+        except BankError:
+            # Don't reveal whether the account exists.
+            raise AuthenticationError("invalid account number or password") from None
+        session.account_number = account_number
+        session.token = self.bank.issue_token(account_number)
+        return {'account_number': account_number, 'name': account['name'], 'token': session.token}
+
+    async def op_logout(self, request, session):
+        if session.token is not None:
+            self.bank.revoke_token(session.token)
+        session.account_number = session.token = None
+        return {}
+
+    async def op_balance(self, request, session):
+        account = self.bank.get_account(self.logged_in(session))
+        if 'at' in request:
+            await self.history_ready()
+            balance = self.bank.balance_at(session.account_number, time_field(request, 'at'))
+            return {'account_number': session.account_number,
+                    'balance': None if balance is None else format_money(balance)}
+        return {'account_number': session.account_number, 'balance': format_money(account['balance'])}
+
+    async def op_deposit(self, request, session):
+        result = await self.call(self.bank.deposit, self.logged_in(session), amount_of(request),
+                                 idempotency_key(request))
+        return money_fields(result)
+
+    async def op_withdraw(self, request, session):
+        if self.bank.rules is not None:
+            # Fraud rules read the account's history.
+            await self.history_ready()
+        result = await self.call(self.bank.withdraw, self.logged_in(session), amount_of(request),
+                                 idempotency_key(request))
+        return money_fields(result)
+
+    async def op_transfer(self, request, session):
+        if self.bank.rules is not None:
+            await self.history_ready()
+        result = await self.call(self.bank.transfer, self.logged_in(session), field(request, 'target'),
+                                 amount_of(request), idempotency_key(request))
+        result = money_fields(result)
+        # The recipient's balance is not the sender's business.
+        result.pop('target_balance', None)
+        return result
+
+    async def op_history(self, request, session):
+        offset = int_field(request, 'offset', 0)
+        limit = int_field(request, 'limit', 50, low=1, high=500)
+        await self.history_ready()
+        transactions = self.bank.history(self.logged_in(session), offset=offset, limit=limit)
+        for transaction in transactions:
+            transaction['timestamp'] = int(transaction['timestamp'].timestamp())
+        return {'transactions': [money_fields(t) for t in transactions]}
+
+    async def op_statement(self, request, session):
+        await self.history_ready()
+        statement = self.bank.statement(self.logged_in(session), time_field(request, 'start'),
+                                        time_field(request, 'end'))
+        for transaction in statement['transactions']:
+            transaction['timestamp'] = int(transaction['timestamp'].timestamp())
+        return {'account_number': statement['account_number'],
+                'opening_balance': format_money(statement['opening_balance']),
+                'closing_balance': format_money(statement['closing_balance']),
+                'transactions': [money_fields(t) for t in statement['transactions']]}
+
+    def scheduled(self):
+        if self.scheduler is None:
+            raise ValidationError("scheduled payments are not enabled")
+        return self.scheduler
+
+    async def op_schedule(self, request, session):
+        count = request.get('count')
+        if count is not None and (isinstance(count, bool) or not isinstance(count, int)):
+            raise ValidationError("count must be a whole number")
+        start = time_field(request, 'start') if 'start' in request else datetime.datetime.now()
+        schedule = self.scheduled().add(self.logged_in(session), field(request, 'target'), amount_of(request),
+                                        start, str(request.get('period', 'once')), count)
+        return money_fields(schedule)
+
+    async def op_schedules(self, request, session):
+        return {'schedules': [money_fields(schedule)
+                              for schedule in self.scheduled().schedules_for(self.logged_in(session))]}
+
+    async def op_cancel_schedule(self, request, session):
+        try:
+            schedule_id = int(field(request, 'schedule_id'))
+        except ValueError:
+            raise ValidationError("schedule_id must be a number") from None
+        return money_fields(self.scheduled().cancel(schedule_id, self.logged_in(session)))
+
+
+async def run_schedules_periodically(scheduler, interval):
+    # Payments run on a thread, so a big batch of them doesn't hold up the
+    # event loop; the core's locks keep them apart from requests.
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        result = await loop.run_in_executor(None, scheduler.run_due)
+        if result['failed']:
+            print(f"Scheduler: {result['paid']} payments made, {result['failed']} refused")
+
+
+async def report_history_loaded(bank):
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, bank.wait_for_history)
+        print(f"Transaction history loaded {bank.load_timings['loaded_seconds']:.2f}s after start")
+    except Exception as e:
+        print(f"Error loading transaction history: {e}")
+
+
+async def verify_periodically(bank, interval):
+    # Each pass only reads history added since the previous one. It runs on
+    # a thread: a pass over every account, or waiting out a lazy history
+    # load, would otherwise hold up every request on the event loop.
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        discrepancies = await loop.run_in_executor(None, bank.reconcile, True)
+        if discrepancies:
+            print(f"Verifier: {len(discrepancies)} balance discrepancies, first {discrepancies[0]}")
+
+
+async def serve_http(routes, host, port):
+    # Just enough HTTP for a Prometheus scrape and the admin search: GET
+    # only. routes maps a path to a function of the query parameters that
+    # returns (content type, body).
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode('latin-1').split()
+            target = urllib.parse.urlsplit(parts[1] if len(parts) > 1 else '')
+            route = routes.get(target.path)
+            if route is None:
+                status, content_type, body = "404 Not Found", "text/plain", b"not found\n"
+            else:
+                try:
+                    content_type, body = route(dict(urllib.parse.parse_qsl(target.query)))
+                    status = "200 OK"
+                except (BankError, ValueError) as e:
+                    status, content_type = "400 Bad Request", "application/json"
+                    body = json.dumps({'error': type(e).__name__, 'message': str(e)}).encode('utf-8')
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(handle, host, port)
+
+
+def metrics_page(metrics):
+    def page(params):
+        return "text/plain; version=0.0.4", metrics.render().encode('utf-8')
+    return page
+
+
+def account_search(bank):
+    # GET /accounts?name=jo+sm&type=savings&min_balance=100&max_balance=5000.50
+    #     &created_from=2026-01-01&created_to=2026-06-30&limit=50
+    def optional(params, name, parse):
+        return parse(params[name]) if params.get(name) else None
+
+    def moment(value):
+        return int(value) if value.isdigit() else datetime.datetime.fromisoformat(value)
+
+    def search(params):
+        numbers = bank.find_accounts(name=params.get('name'), account_type=params.get('type'),
+                                     min_balance=optional(params, 'min_balance', parse_amount),
+                                     max_balance=optional(params, 'max_balance', parse_amount),
+                                     created_from=optional(params, 'created_from', moment),
+                                     created_to=optional(params, 'created_to', moment),
+                                     limit=min(int(params.get('limit', 50)), 1000))
+        accounts = []
+        for account_number in numbers:
+            account = bank.accounts[account_number]
+            created = account.get('created_date')
+            accounts.append({'account_number': account_number, 'name': account['name'],
+                             'account_type': account['account_type'], 'balance': format_money(account['balance']),
+                             'created_date': None if created is None else int(created.timestamp())})
+        return "application/json", json.dumps({'accounts': accounts}).encode('utf-8')
+    return search
+
+
+def print_slow(threshold):
+    def tracer(operation, seconds, error):
+        if seconds >= threshold:
+            print(f"Slow operation: {operation} took {seconds * 1000:.1f} ms"
+                  + (f" and raised {error}" if error else ""))
+    return tracer
+
+
+async def serve(args):
+    metrics = None
+    if args.metrics_port or args.profile or args.slow_ms:
+        metrics = Metrics(profile=args.profile.split(',') if args.profile else (),
+                          tracer=print_slow(args.slow_ms / 1000) if args.slow_ms else None)
+    rules = RuleEngine(load_rules(args.rules)) if args.rules else None
+    bank = Bank(args.data_file, archive_days=args.archive_days, metrics=metrics, rules=rules,
+                search=AccountIndex() if args.admin_port else None, lazy_history=args.lazy_history)
+    scheduler = Scheduler(bank) if args.schedule_every else None
+    server = BankServer(bank, args.host, args.port, args.max_connections, args.pipeline, args.workers,
+                        args.kdf_workers, scheduler)
+    await server.start()
+    print(f"Serving on {args.host}:{args.port}, ready {bank.load_timings['ready_seconds']:.2f}s after start")
+    loading = asyncio.create_task(report_history_loaded(bank)) if not bank.history_loaded else None
+    metrics_server = await serve_http({'/metrics': metrics_page(metrics)}, args.host, args.metrics_port) \
+        if args.metrics_port else None
+    admin_server = await serve_http({'/accounts': account_search(bank)}, args.admin_host, args.admin_port) \
+        if args.admin_port else None
+    verifier = asyncio.create_task(verify_periodically(bank, args.verify_every)) if args.verify_every else None
+    payer = asyncio.create_task(run_schedules_periodically(scheduler, args.schedule_every)) \
+        if scheduler is not None else None
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            pass
+    await stop.wait()
+    for task in (verifier, payer, loading):
+        if task is not None:
+            task.cancel()
+    server.server.close()
+    await server.server.wait_closed()
+    for http_server in (metrics_server, admin_server):
+        if http_server is not None:
+            http_server.close()
+    if server.executor is not None:
+        server.executor.shutdown()
+    server.kdf_executor.shutdown()
+    if scheduler is not None:
+        scheduler.close()
+    bank.save_data()
+    if metrics is not None and metrics.profiles:
+        for path in metrics.dump_profiles(args.profile_dir):
+            print(f"Profile written to {path}")
+    print("Data saved. Server stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the bank over newline-delimited JSON.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--data-file', default="bank_data.txt")
+    parser.add_argument('--max-connections', type=int, default=10000)
+    parser.add_argument('--pipeline', type=int, default=64, help="max unanswered requests per session")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="run operations on this many threads instead of the event loop")
+    parser.add_argument('--kdf-workers', type=int, default=4, help="threads for password hashing")
+    parser.add_argument('--archive-days', type=int,
+                        help="move history older than this many days to memory-mapped archive segments")
+    parser.add_argument('--verify-every', type=float, default=0,
+                        help="check new history for balance discrepancies every this many seconds")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument('--profile', help="comma-separated core operations to run under cProfile, e.g. transfer")
+    parser.add_argument('--profile-dir', default="profiles")
+    parser.add_argument('--slow-ms', type=float, default=0, help="print operations slower than this")
+    parser.add_argument('--rules', help="JSON file of fraud velocity rules (see fraud.py)")
+    parser.add_argument('--admin-port', type=int,
+                        help="serve the indexed account search, GET /accounts, on this port")
+    parser.add_argument('--admin-host', default="127.0.0.1",
+                        help="interface for --admin-port, which has no login")
+    parser.add_argument('--lazy-history', action='store_true',
+                        help="serve requests while transaction history loads in the background")
+    parser.add_argument('--schedule-every', type=float, default=1,
+                        help="make due scheduled payments every this many seconds; 0 turns them off")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
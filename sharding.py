@@ -0,0 +1,315 @@
+# Hash-partitions the account space across worker processes. Each shard is
+# an ordinary Bank in its own process, with its own snapshot and journal
+# (bank_data.txt.shard0, .shard1, ...). ShardedBank routes every call to the
+# shard that owns the account.
+#
+# A transfer between accounts on different shards uses two-phase commit.
+# Both shards first prepare their side: the debit side checks funds and
+# holds them back. The coordinator then durably logs its decision in
+# bank_data.txt.2pc, and both sides are told to commit or abort. After a
+# crash, recover() resolves every still-prepared transfer from that log.
+#
+# Idempotency keys on deposits, withdrawals and single-shard transfers are
+# handled by the owning shard. For cross-shard transfers the coordinator
+# keeps its own index: the key goes into the commit decision, so a retry
+# after a crash is recognised even if the reply never arrived.
+import multiprocessing
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.reduction import ForkingPickler
+
+from allocator import AccountNumberAllocator, ExhaustedError
+from core import (Bank, BankError, AccountExistsError, AccountSpaceExhaustedError, IdempotencyConflictError,
+                  ValidationError)
+from fraud import RuleEngine
+from idempotency import IdempotencyIndex
+from journal import Journal
+
+SHARD_METHODS = frozenset((
+    'open_account', 'authenticate', 'update_account', 'get_account', 'account_exists',
+    'deposit', 'withdraw', 'transfer', 'history', 'reconcile', 'save_data',
+    'prepare_debit', 'prepare_credit', 'commit_prepared', 'abort_prepared',
+    'prepared_transactions', 'total_balance', 'account_count',
+))
+
+
+def shard_of(account_number, shard_count):
+    return zlib.crc32(account_number.encode('ascii')) % shard_count
+
+
+class ShardBank(Bank):
+    def prepared_transactions(self):
+        return dict(self.prepared)
+
+    def total_balance(self):
+        return sum(account['balance'] for account in self.accounts.values())
+
+    def account_count(self):
+        return len(self.accounts)
+
+
+def shard_worker(connection, data_file, snapshot_every, rules=(), account_digits=6, check_digit=True):
+    # Every account lives on one shard, so each shard enforces the fraud
+    # rules for its own accounts. Shards use the coordinator's number format
+    # to validate the numbers it opens accounts under.
+    bank = ShardBank(data_file, snapshot_every=snapshot_every, account_digits=account_digits,
+                     check_digit=check_digit, rules=RuleEngine(rules) if rules else None)
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            # Coordinator went away; everything acknowledged is journaled.
+            bank.journal.close()
+            return
+        if message is None:
+            bank.save_data()
+            connection.send(('ok', None))
+            return
+        method, args = message
+        try:
+            if method not in SHARD_METHODS:
+                raise ValidationError(f"unknown shard method {method!r}")
+            response = ('ok', getattr(bank, method)(*args))
+        except Exception as e:
+            # Whatever went wrong is the caller's to see; the shard itself
+            # keeps serving its other accounts.
+            response = ('error', portable_error(e))
+        try:
+            payload = ForkingPickler.dumps(response)
+        except Exception as e:
+            # A result that cannot be pickled is an error like any other.
+            payload = ForkingPickler.dumps(('error', portable_error(e)))
+        try:
+            connection.send_bytes(payload)
+        except OSError:
+            bank.journal.close()
+            return
+
+
+def portable_error(error):
+    # The coordinator's reader thread dies on a response it cannot unpickle,
+    # so an error that does not survive the round trip is sent as its repr.
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(repr(error))
+
+
+class Shard:
+    # Coordinator-side handle for one worker process. Requests are pipelined:
+    # submit() returns a Future straight away, and a reader thread resolves
+    # futures in order as the worker answers.
+    def __init__(self, context, index, data_file, snapshot_every, rules=(), account_digits=6, check_digit=True):
+        self.index = index
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=shard_worker,
+                                       args=(child, data_file, snapshot_every, rules, account_digits, check_digit),
+                                       name=f"bank-shard-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self._pending = deque()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_responses, name=f"shard-{index}-reader", daemon=True)
+        self._reader.start()
+
+    def submit(self, method, *args):
+        future = Future()
+        with self._send_lock:
+            self._pending.append(future)
+            self.connection.send((method, args) if method is not None else None)
+        return future
+
+    def call(self, method, *args):
+        return self.submit(method, *args).result()
+
+    def _read_responses(self):
+        while True:
+            try:
+                status, value = self.connection.recv()
+            except (EOFError, OSError):
+                for future in self._pending:
+                    future.set_exception(ConnectionError(f"shard {self.index} exited"))
+                return
+            future = self._pending.popleft()
+            if status == 'ok':
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stop(self):
+        self.call(None)
+        self.process.join()
+        self.connection.close()
+
+
+class ShardedBank:
+    def __init__(self, data_file="bank_data.txt", shards=4, snapshot_every=10000,
+                 account_digits=6, check_digit=True, rules=()):
+        # rules: fraud rule objects (see fraud.py), enforced by each shard.
+        context = multiprocessing.get_context('spawn')
+        self.shards = [Shard(context, i, f"{data_file}.shard{i}", snapshot_every, list(rules), account_digits,
+                             check_digit) for i in range(shards)]
+        # Account numbers are allocated here rather than per shard, since the
+        # number decides the shard. The coordinator log also carries the
+        # allocator's position.
+        self.allocator = AccountNumberAllocator(account_digits, check_digit)
+        self.decisions = Journal(data_file + ".2pc")
+        self.idempotency = IdempotencyIndex()
+        self._claims = threading.Lock()
+        self.recover()
+
+    def shard_for(self, account_number):
+        return self.shards[shard_of(account_number, len(self.shards))]
+
+    def recover(self):
+        committed = set()
+        for record in self.decisions.replay():
+            if record['op'] == 'commit':
+                committed.add(record['txid'])
+            elif record['op'] == 'allocator':
+                self.allocator.restore(record['allocator'])
+            if 'idempotency' in record:
+                self.idempotency.restore([record['idempotency']])
+        for shard in self.shards:
+            for txid in shard.call('prepared_transactions'):
+                shard.call('commit_prepared' if txid in committed else 'abort_prepared', txid)
+        # Every transfer is now resolved on every shard, so no decision is
+        # needed any more; only the allocator position and the live
+        # idempotency keys carry over.
+        self.decisions.rotate()
+        self.decisions.append({'op': 'allocator', 'allocator': self.allocator.to_dict()})
+        for entry in self.idempotency.to_list():
+            self.decisions.append({'op': 'idempotency', 'idempotency': entry})
+        self.decisions.sync()
+        self.decisions.drop_sealed()
+
+    def close(self):
+        for shard in self.shards:
+            shard.stop()
+        self.decisions.close()
+
+    # --- routed operations -------------------------------------------------
+
+    def open_account(self, name, initial_deposit, account_type, password):
+        while True:
+            try:
+                account_number = self.allocator.next()
+            except ExhaustedError as e:
+                raise AccountSpaceExhaustedError(str(e)) from None
+            self.decisions.append({'op': 'allocator', 'allocator': self.allocator.to_dict()})
+            try:
+                return self.shard_for(account_number).call('open_account', name, initial_deposit,
+                                                           account_type, password, account_number)
+            except AccountExistsError:
+                continue
+
+    def authenticate(self, account_number, password):
+        return self.shard_for(account_number).call('authenticate', account_number, password)
+
+    def get_account(self, account_number):
+        return self.shard_for(account_number).call('get_account', account_number)
+
+    def deposit(self, account_number, amount, idempotency_key=None):
+        return self.shard_for(account_number).call('deposit', account_number, amount, idempotency_key)
+
+    def withdraw(self, account_number, amount, idempotency_key=None):
+        return self.shard_for(account_number).call('withdraw', account_number, amount, idempotency_key)
+
+    def history(self, account_number, offset=0, limit=None, newest_first=True):
+        return self.shard_for(account_number).call('history', account_number, offset, limit, newest_first)
+
+    def replayed(self, key, request):
+        if key is None:
+            return None
+        entry = self.idempotency.get(key)
+        if entry is None:
+            return None
+        if entry[0] != request:
+            raise IdempotencyConflictError(key)
+        return dict(entry[1])
+
+    def transfer(self, account_number, target_account, amount, idempotency_key=None):
+        source = self.shard_for(account_number)
+        target = self.shard_for(target_account)
+        if source is target:
+            return source.call('transfer', account_number, target_account, amount, idempotency_key)
+        if account_number == target_account:
+            raise ValidationError("cannot transfer money to the same account")
+        request = ['transfer', account_number, target_account, amount]
+        result = self.replayed(idempotency_key, request)
+        if result is not None:
+            return result
+
+        txid = uuid.uuid4().hex
+        votes = [source.submit('prepare_debit', txid, account_number, amount, target_account),
+                 target.submit('prepare_credit', txid, target_account, amount, account_number)]
+        refusals = []
+        for vote in votes:
+            try:
+                vote.result()
+            except BankError as e:
+                refusals.append(e)
+        if refusals:
+            self.abort(txid, source, target)
+            raise refusals[0]
+
+        # The decision is durable before either side hears it; recover()
+        # relies on that. A keyed transfer claims its key in the same
+        # record, so of two concurrent retries only one commits. The result
+        # is filled in once both sides have applied it; a retry arriving
+        # after a crash in between gets it without balances.
+        result = {'account_number': account_number, 'target_account': target_account, 'amount': amount}
+        decision = {'op': 'commit', 'txid': txid}
+        try:
+            with self._claims:
+                replay = self.replayed(idempotency_key, request)
+                if replay is None:
+                    if idempotency_key is not None:
+                        decision['idempotency'] = [idempotency_key, time.time(), request, result]
+                        self.idempotency.restore([decision['idempotency']])
+                    self.decisions.append(decision)
+                    self.decisions.sync()
+        except IdempotencyConflictError:
+            self.abort(txid, source, target)
+            raise
+        if replay is not None:
+            self.abort(txid, source, target)
+            return replay
+
+        debit = source.submit('commit_prepared', txid)
+        credit = target.submit('commit_prepared', txid)
+        result = dict(result, balance=debit.result()['balance'], target_balance=credit.result()['balance'],
+                      transaction_id=debit.result()['transaction_id'])
+        if idempotency_key is not None:
+            entry = [idempotency_key, decision['idempotency'][1], request, result]
+            self.idempotency.restore([entry])
+            self.decisions.append({'op': 'idempotency', 'idempotency': entry})
+        return result
+
+    def abort(self, txid, *shards):
+        for future in [shard.submit('abort_prepared', txid) for shard in shards]:
+            future.result()
+
+    # --- whole-bank queries ------------------------------------------------
+
+    def total_balance(self):
+        return sum(future.result() for future in [shard.submit('total_balance') for shard in self.shards])
+
+    def account_count(self):
+        return sum(future.result() for future in [shard.submit('account_count') for shard in self.shards])
+
+    def reconcile(self):
+        discrepancies = []
+        for future in [shard.submit('reconcile') for shard in self.shards]:
+            discrepancies.extend(future.result())
+        return discrepancies
+
+    def save_data(self):
+        for future in [shard.submit('save_data') for shard in self.shards]:
+            future.result()
@@ -0,0 +1,168 @@
+import ast
+import datetime
+import itertools
+import json
+import os
+
+from money import to_cents
+
+FORMAT_NAME = "python-bank"
+# v3: balances and amounts are integer cents (v2 stored float dollars).
+FORMAT_VERSION = 3
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def to_epoch(value):
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    return value
+
+
+def to_datetime(value):
+    # Journals written before the v2 format carry ISO strings.
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value)
+    return value
+
+
+def decode_account(record):
+    if 'created_date' in record:
+        record['created_date'] = to_datetime(record['created_date'])
+    if 'balance' in record:
+        record['balance'] = to_cents(record['balance'])
+    return record
+
+
+def encode_account(account_number, account):
+    record = dict(account, account_number=account_number)
+    if 'created_date' in record:
+        record['created_date'] = to_epoch(record['created_date'])
+    return record
+
+
+def encode_transaction(transaction):
+    # Descriptions are rebuilt from the other fields at display time.
+    record = dict(transaction)
+    record.pop('description', None)
+    if 'timestamp' in record:
+        record['timestamp'] = to_epoch(record['timestamp'])
+    return record
+
+
+def dump_line(record):
+    return json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def is_legacy_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        first_line = f.readline().strip()
+    if not first_line:
+        return False
+    try:
+        header = json.loads(first_line)
+    except ValueError:
+        return True
+    return not (isinstance(header, dict) and header.get('format') == FORMAT_NAME)
+
+
+def read_legacy_literal(path):
+    # The old file's dict as written, dates still ISO strings.
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    if not content:
+        return {'accounts': {}, 'transactions': []}
+    return ast.literal_eval(content)
+
+
+def write_legacy_literal(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(str(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_legacy(path):
+    data = read_legacy_literal(path)
+    for account in data.get('accounts', {}).values():
+        decode_account(account)
+    for transaction in data.get('transactions', []):
+        if 'timestamp' in transaction:
+            transaction['timestamp'] = to_datetime(transaction['timestamp'])
+    return data
+
+
+def write_snapshot(path, accounts, transactions, journal_lsn=0, transaction_count=None, metadata=None):
+    # Accounts come first so a reader can start serving balances before it
+    # has streamed the (much longer) transaction section. transaction_count
+    # cuts off records appended after the snapshot point. metadata is small
+    # bank-wide state that travels in the header.
+    if transaction_count is None:
+        transaction_count = len(transactions)
+    header = dict(metadata or {})
+    header.update({
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'journal_lsn': journal_lsn,
+        'accounts': len(accounts),
+        'transactions': transaction_count,
+    })
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(dump_line(header))
+        for account_number, account in accounts.items():
+            f.write(dump_line(encode_account(account_number, account)))
+        for transaction in itertools.islice(transactions, transaction_count):
+            f.write(dump_line(encode_transaction(transaction)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnapshotReader:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'r', encoding='utf-8')
+        line = self._file.readline()
+        if not line.strip():
+            self.header = {'format': FORMAT_NAME, 'version': FORMAT_VERSION,
+                           'journal_lsn': 0, 'accounts': 0, 'transactions': 0}
+        else:
+            self.header = json.loads(line)
+        if self.header.get('format') != FORMAT_NAME:
+            raise SnapshotError(f"{path} is not a {FORMAT_NAME} snapshot")
+        if self.header['version'] > FORMAT_VERSION:
+            raise SnapshotError(f"{path} uses format version {self.header['version']}, "
+                                f"this program reads up to {FORMAT_VERSION}")
+
+    def _records(self, count, section):
+        for _ in range(count):
+            line = self._file.readline()
+            if not line:
+                raise SnapshotError(f"{self.path} is truncated in the {section} section")
+            yield json.loads(line)
+
+    def accounts(self):
+        for record in self._records(self.header['accounts'], 'accounts'):
+            account_number = record.pop('account_number')
+            yield account_number, decode_account(record)
+
+    def transactions(self):
+        # Timestamps stay as epoch seconds; the transaction store keeps them
+        # that way too, so there is no datetime round trip per record.
+        yield from self._records(self.header['transactions'], 'transactions')
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,19 @@
+import pytest
+
+from allocator import luhn_digit
+from core import AccountNotFoundError, Bank, MistypedAccountNumberError
+
+
+def test_only_numbers_with_a_bad_check_digit_are_reported_as_typos(tmp_path):
+    bank = Bank(str(tmp_path / "bank_data.txt"))
+    digits = bank.allocator.digits
+    body = "1" * digits
+    mistyped = body + str((int(luhn_digit(body)) + 1) % 10)
+    with pytest.raises(MistypedAccountNumberError):
+        bank.get_account(mistyped)
+    # A legacy number has no check digit, and other misses are not typos either.
+    for number in ("1" * 6, body + luhn_digit(body), "12ab"):
+        with pytest.raises(AccountNotFoundError) as error:
+            bank.get_account(number)
+        assert type(error.value) is AccountNotFoundError
+    bank.journal.close()
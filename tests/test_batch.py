@@ -0,0 +1,16 @@
+from batch import BatchEngine, read_operations
+from core import Bank
+
+
+def test_json_lines_that_are_not_objects_are_rejected_on_their_own(tmp_path):
+    path = tmp_path / "operations.jsonl"
+    path.write_text('[1, 2]\n"x"\n5\nnull\n'
+                    '{"op": "open", "name": "Saver", "amount": "600.00", "account_type": "savings", '
+                    '"password": "secret1"}\n', encoding='utf-8')
+    bank = Bank(str(tmp_path / "bank_data.txt"))
+    report = BatchEngine(bank).run(read_operations(str(path)))
+    assert report['applied'] == 1
+    assert report['rejected'] == 4
+    assert report['errors'] == {'ValidationError': 4}
+    assert len(bank.accounts) == 1
+    bank.journal.close()
@@ -0,0 +1,28 @@
+import threading
+
+from core import Bank
+from fraud import RuleEngine, VelocityRule
+
+
+def test_rule_seeding_waits_for_history_without_the_account_lock(tmp_path):
+    rules = RuleEngine([VelocityRule('daily_outflow', 86400, max_count=5)])
+    bank = Bank(str(tmp_path / "bank_data.txt"), rules=rules)
+    account_number = bank.open_account("Saver", 100000, 'savings', "secret1")
+    # As during a lazy load: history is not in memory yet.
+    bank._history_ready.clear()
+    withdrawal = threading.Thread(target=bank.withdraw, args=(account_number, 100))
+    withdrawal.start()
+    withdrawal.join(0.2)
+    assert withdrawal.is_alive()
+
+    deposit = threading.Thread(target=bank.deposit, args=(account_number, 100))
+    deposit.start()
+    deposit.join(2)
+    try:
+        assert not deposit.is_alive()
+    finally:
+        bank._history_ready.set()
+        withdrawal.join()
+        deposit.join()
+    assert bank.get_account(account_number)['balance'] == 100000
+    bank.journal.close()
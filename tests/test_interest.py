@@ -0,0 +1,33 @@
+import datetime
+import itertools
+
+import core
+from core import Bank
+
+
+class Clock(datetime.datetime):
+    # Every reading is a minute after the previous one.
+    ticks = itertools.count()
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 1) + datetime.timedelta(minutes=next(cls.ticks))
+
+
+def test_interest_is_stamped_when_its_chunk_is_posted(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.datetime, 'datetime', Clock)
+    bank = Bank(str(tmp_path / "bank_data.txt"))
+    first = bank.open_account("First", 100000, 'savings', "secret1")
+    second = bank.open_account("Second", 100000, 'savings', "secret1")
+
+    def postings():
+        yield first, 100
+        # Runs between the two chunks, while no locks are held.
+        bank.deposit(second, 500)
+        yield second, 100
+
+    assert bank.post_interest(postings(), datetime.datetime(2023, 12, 31), chunk_size=1) == 2
+    history = bank.history(second, newest_first=False)
+    assert [transaction['type'] for transaction in history[-2:]] == ['deposit', 'interest']
+    assert history[-2]['timestamp'] < history[-1]['timestamp']
+    bank.journal.close()
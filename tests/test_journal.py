@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+
+from core import Bank
+from journal import Journal
+
+
+def test_idle_journal_is_fsynced_within_group_interval(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: (synced.append(fd), real_fsync(fd)))
+    journal = Journal(str(tmp_path / "journal"), group_size=64, group_interval=0.05)
+    journal.append({'op': 'first'})
+    journal.append({'op': 'second'})
+    assert not synced
+    time.sleep(0.3)
+    assert len(synced) == 1
+    assert journal._pending == 0
+    journal.close()
+
+
+def test_commit_lock_is_free_while_the_journal_fsyncs(tmp_path, monkeypatch):
+    bank = Bank(str(tmp_path / "bank_data.txt"))
+    account_number = bank.open_account("Saver", 100000, 'savings', "secret1")
+    bank.journal.sync()
+    in_fsync = threading.Event()
+    release = threading.Event()
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        in_fsync.set()
+        release.wait(5)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', slow_fsync)
+    bank.journal.group_size = 1
+    depositor = threading.Thread(target=bank.deposit, args=(account_number, 100))
+    depositor.start()
+    assert in_fsync.wait(5)
+    try:
+        assert bank._commit_lock.acquire(timeout=1)
+        bank._commit_lock.release()
+    finally:
+        release.set()
+        depositor.join()
+    assert bank.get_account(account_number)['balance'] == 100100
+    bank.journal.close()
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from core import Bank
+from scheduler import Scheduler
+
+DAY = 86400
+
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_crash_before_ran_record_does_not_pay_twice_after_a_day(tmp_path, monkeypatch, snapshot):
+    data_file = str(tmp_path / "bank_data.txt")
+    bank = Bank(data_file)
+    payer = bank.open_account("Payer", 100000, 'current', "secret1")
+    payee = bank.open_account("Payee", 100000, 'current', "secret1")
+    now = time.time()
+    scheduler = Scheduler(bank, clock=lambda: now)
+    schedule = scheduler.add(payer, payee, 1000, now - 1)
+
+    # The crash: the payment is durable in the bank's journal, but the
+    # scheduler's "ran" record never gets written.
+    bank.transfer(payer, payee, 1000, f"schedule:{schedule['schedule_id']}:0", scheduled=True)
+    if snapshot:
+        bank.save_data()
+    bank.journal.sync()
+    bank.journal.close()
+    scheduler.journal.close()
+
+    later = now + 2 * DAY
+    monkeypatch.setattr(time, 'time', lambda: later)
+    bank = Bank(data_file)
+    scheduler = Scheduler(bank, clock=lambda: later)
+    assert scheduler.run_due() == {'paid': 1, 'failed': 0}
+    assert bank.get_account(payer)['balance'] == 99000
+    assert bank.get_account(payee)['balance'] == 101000
+    assert scheduler.run_due() == {'paid': 0, 'failed': 0}
+    bank.journal.close()
+    scheduler.close()
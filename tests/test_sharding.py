@@ -0,0 +1,30 @@
+import multiprocessing
+
+import pytest
+
+from core import AccountNotFoundError
+from sharding import Shard, portable_error
+
+
+class TwoPartError(Exception):
+    def __init__(self, first, second):
+        super().__init__(f"{first}: {second}")
+
+
+def test_shard_reports_any_error_and_keeps_serving(tmp_path):
+    shard = Shard(multiprocessing.get_context('spawn'), 0, str(tmp_path / "bank_data.txt.shard0"), 10000)
+    try:
+        with pytest.raises(TypeError):
+            shard.call('deposit', "1000009")
+        with pytest.raises(AccountNotFoundError):
+            shard.call('deposit', "1000009", 100)
+        assert shard.call('account_count') == 0
+    finally:
+        shard.stop()
+
+
+def test_errors_that_cannot_be_unpickled_are_sent_as_their_repr():
+    error = portable_error(TwoPartError("a", "b"))
+    assert type(error) is RuntimeError
+    assert "TwoPartError" in str(error)
+    assert type(portable_error(ValueError("x"))) is ValueError
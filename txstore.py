@@ -0,0 +1,200 @@
+import bisect
+import datetime
+from array import array
+
+from money import format_money, to_cents
+from storage import to_epoch
+
+TRANSACTION_TYPES = ('account_creation', 'deposit', 'withdrawal', 'transfer_out', 'transfer_in', 'interest')
+TYPE_CODES = {name: code for code, name in enumerate(TRANSACTION_TYPES)}
+NO_ACCOUNT = -1
+
+DESCRIPTIONS = {
+    'account_creation': 'Account opened with initial deposit of ${amount}',
+    'deposit': 'Deposited ${amount}',
+    'withdrawal': 'Withdrew ${amount}',
+    'transfer_out': 'Transferred ${amount} to account {counterparty}',
+    'transfer_in': 'Received ${amount} from account {counterparty}',
+    'interest': 'Interest of ${amount} credited',
+}
+COUNTERPARTY_KEYS = {'transfer_out': 'target_account', 'transfer_in': 'source_account'}
+COLUMNS = ('types', 'accounts', 'counterparties', 'amounts', 'balances', 'timestamps', 'ids')
+# Rows recorded before transactions had ids (or read from an archive segment
+# written then) hold this instead.
+NO_ID = 0
+BALANCE_EFFECT = {
+    'account_creation': 1,
+    'deposit': 1,
+    'withdrawal': -1,
+    'transfer_out': -1,
+    'transfer_in': 1,
+    'interest': 1,
+}
+
+
+class TransactionRecord:
+    # A read-only, dict-like view of one row of a TransactionStore. Nothing is
+    # materialised until a field is asked for.
+    __slots__ = ('store', 'position')
+
+    def __init__(self, store, position):
+        self.store = store
+        self.position = position
+
+    @property
+    def type(self):
+        return TRANSACTION_TYPES[self.store.types[self.position]]
+
+    def keys(self):
+        keys = ['type', 'account_number', 'amount', 'balance_after', 'timestamp', 'description']
+        counterparty_key = COUNTERPARTY_KEYS.get(self.type)
+        if counterparty_key:
+            keys.insert(2, counterparty_key)
+        if self.store.ids[self.position] != NO_ID:
+            keys.insert(0, 'transaction_id')
+        return keys
+
+    def __getitem__(self, key):
+        store = self.store
+        i = self.position
+        if key == 'type':
+            return self.type
+        if key == 'transaction_id' and store.ids[i] != NO_ID:
+            return store.ids[i]
+        if key == 'account_number':
+            return str(store.accounts[i])
+        if key == 'amount':
+            return store.amounts[i]
+        if key == 'balance_after':
+            return store.balances[i]
+        if key == 'timestamp':
+            return datetime.datetime.fromtimestamp(store.timestamps[i])
+        if key == 'description':
+            return DESCRIPTIONS[self.type].format(amount=format_money(store.amounts[i]),
+                                                  counterparty=store.counterparties[i])
+        if key == COUNTERPARTY_KEYS.get(self.type):
+            return str(store.counterparties[i])
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"TransactionRecord({self.to_dict()!r})"
+
+
+class TransactionStore:
+    # Column-per-field storage: one typed array per attribute instead of one
+    # dict per transaction. Amounts and balances are integer cents, timestamps
+    # epoch seconds and account numbers integers. Each row has its own
+    # transaction id. `index` maps each account to its positions, in order.
+    #
+    # History that has been archived lives in `segments` (oldest first); the
+    # store then holds only the newer rows. account_rows() gives an account's
+    # whole history across both.
+    def __init__(self, segments=()):
+        self.types = array('B')
+        self.accounts = array('q')
+        self.counterparties = array('q')
+        self.amounts = array('q')
+        self.balances = array('q')
+        self.timestamps = array('q')
+        self.ids = array('q')
+        self.index = {}
+        self.segments = tuple(segments)
+
+    def append(self, transaction):
+        # Every field is converted before any column grows, and a value a
+        # column can't hold (e.g. too large) undoes the row, so the columns
+        # never end up at different lengths.
+        transaction_type = transaction['type']
+        counterparty_key = COUNTERPARTY_KEYS.get(transaction_type)
+        counterparty = transaction.get(counterparty_key) if counterparty_key else None
+        row = (TYPE_CODES[transaction_type], int(transaction['account_number']),
+               NO_ACCOUNT if counterparty is None else int(counterparty), to_cents(transaction['amount']),
+               to_cents(transaction['balance_after']), to_epoch(transaction['timestamp']),
+               int(transaction.get('transaction_id') or NO_ID))
+        columns = (self.types, self.accounts, self.counterparties, self.amounts, self.balances, self.timestamps,
+                   self.ids)
+        appended = 0
+        try:
+            for column, value in zip(columns, row):
+                column.append(value)
+                appended += 1
+        except (OverflowError, TypeError):
+            for column in columns[:appended]:
+                column.pop()
+            raise
+        return self._index(transaction['account_number'])
+
+    def _index(self, account_number):
+        position = len(self.types) - 1
+        positions = self.index.get(account_number)
+        if positions is None:
+            positions = self.index[account_number] = array('q')
+        positions.append(position)
+        return position
+
+    def account_rows(self, account_number):
+        # The account's history as (columns, rows) runs, oldest first: a row
+        # range in each segment holding some of it, then positions here.
+        # Either kind of columns can be indexed to get a TransactionRecord.
+        runs = []
+        for segment in self.segments:
+            rows = segment.account_rows(account_number)
+            if rows:
+                runs.append((segment, rows))
+        positions = self.index.get(account_number)
+        if positions:
+            runs.append((self, positions))
+        return runs
+
+    def archived(self, segment, stop, count):
+        # A new store for the same history once rows [0, stop) are in
+        # `segment`: rows [stop, count) are carried over and re-indexed.
+        store = TransactionStore(self.segments + (segment,))
+        for name in COLUMNS:
+            setattr(store, name, getattr(self, name)[stop:count])
+        for account_number, positions in self.index.items():
+            low = bisect.bisect_left(positions, stop)
+            high = bisect.bisect_left(positions, count)
+            if low < high:
+                store.index[account_number] = array('q', (position - stop for position in positions[low:high]))
+        return store
+
+    def copy_rows(self, source, start):
+        # Appends source's rows from `start` on, e.g. those committed while
+        # an archived() copy was being built.
+        for position in range(start, len(source)):
+            for name in COLUMNS:
+                getattr(self, name).append(getattr(source, name)[position])
+            self._index(str(source.accounts[position]))
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self.types)
+        if not 0 <= position < len(self.types):
+            raise IndexError("transaction index out of range")
+        return TransactionRecord(self, position)
+
+    def __iter__(self):
+        for position in range(len(self.types)):
+            yield TransactionRecord(self, position)